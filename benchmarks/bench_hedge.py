@@ -0,0 +1,89 @@
+"""Tail latency of searches with and without hedged requests, against
+simulated hosts: each answers in about --median seconds, but a fraction
+(--stall-rate) of requests stall for --stall seconds, the way a busy
+coordinating node does.  Prints p50/p99 latency and how many extra requests
+hedging sent."""
+
+import argparse
+import random
+import time
+
+from gracc_reporting.Hedging import HedgedTransport
+
+
+class SimulatedTransport(HedgedTransport):
+    """HedgedTransport whose hosts are simulated"""
+    def __init__(self, n_hosts, median, stall, stall_rate, seed=0):
+        super(SimulatedTransport, self).__init__(
+            [{'host': 'primary.example.com'}],
+            hedge_hosts=['https://host{0}.example.com'.format(i)
+                         for i in range(1, n_hosts)],
+            hedge_delay=median * 4)
+        self.median = median
+        self.stall = stall
+        self.stall_rate = stall_rate
+        self.rng = random.Random(seed)
+
+    def latency(self):
+        if self.rng.random() < self.stall_rate:
+            return self.stall
+        return self.median * self.rng.lognormvariate(0, 0.25)
+
+    def _send_to(self, i, method, url, *args, **kwargs):
+        seconds = self.latency()
+        start = time.perf_counter()
+        time.sleep(seconds)
+        if i == 0:
+            self._record_latency(url, time.perf_counter() - start)
+        return {}
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100.))]
+
+
+def bench_hedge(n_requests, n_hosts, median, stall, stall_rate):
+    """:return dict: {'single'/'hedged': (p50, p99)}, and the fraction of
+    requests that were hedged"""
+    results = {}
+    for name in ('single', 'hedged'):
+        transport = SimulatedTransport(n_hosts, median, stall, stall_rate)
+        latencies = []
+        for _ in range(n_requests):
+            start = time.perf_counter()
+            if name == 'single':
+                transport._send_to(0, 'POST', '/gracc.osg.raw-*/_search')
+            else:
+                transport.perform_request('POST', '/gracc.osg.raw-*/_search')
+            latencies.append(time.perf_counter() - start)
+        results[name] = (percentile(latencies, 50), percentile(latencies, 99))
+        results['hedged_fraction'] = \
+            transport.stats['hedged'] / float(n_requests)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("-n", "--requests", dest="n", type=int, default=300,
+                        help="searches to send")
+    parser.add_argument("--hosts", dest="hosts", type=int, default=2,
+                        help="hosts, including the primary")
+    parser.add_argument("--median", dest="median", type=float, default=0.02,
+                        help="typical seconds per search")
+    parser.add_argument("--stall", dest="stall", type=float, default=0.5,
+                        help="seconds a stalled search takes")
+    parser.add_argument("--stall-rate", dest="stall_rate", type=float,
+                        default=0.03, help="fraction of searches that stall")
+    args = parser.parse_args()
+
+    results = bench_hedge(args.n, args.hosts, args.median, args.stall,
+                          args.stall_rate)
+    for name in ('single', 'hedged'):
+        print("{0:<8} p50 {1:7.3f}s  p99 {2:7.3f}s".format(name,
+                                                            *results[name]))
+    print("hedged {0:.1%} of requests".format(results['hedged_fraction']))
+
+
+if __name__ == '__main__':
+    main()
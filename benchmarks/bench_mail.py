@@ -0,0 +1,51 @@
+"""Messages per second sent to a local SMTP server, with a new session per
+message (the old sendEmail behaviour) and with one MailTransport session.
+The local server is plain SMTP, so this doesn't include the TLS handshakes
+that make new sessions even more expensive against a real server."""
+
+import argparse
+import time
+
+from gracc_reporting.MailTransport import MailTransport, LocalSMTPServer
+
+FROM = 'nobody@example.com'
+TO = ['nobody1@example.com']
+MESSAGE = 'Subject: benchmark\r\n\r\n' + 'x' * 10000 + '\r\n'
+
+
+def bench_mail(n, server):
+    """Messages per second, (new session per message, one session)"""
+    def transport():
+        return MailTransport('127.0.0.1', server.port, 'user', 'password',
+                             ssl=False)
+
+    start = time.perf_counter()
+    for _ in range(n):
+        with transport() as t:
+            t.send(FROM, TO, MESSAGE)
+    per_message = n / (time.perf_counter() - start)
+
+    start = time.perf_counter()
+    with transport() as t:
+        t.send_many((FROM, TO, MESSAGE) for _ in range(n))
+    shared = n / (time.perf_counter() - start)
+    return per_message, shared
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("-n", "--messages", dest="n", type=int, default=500,
+                        help="number of messages")
+    args = parser.parse_args()
+
+    server = LocalSMTPServer().start()
+    try:
+        per_message, shared = bench_mail(args.n, server)
+    finally:
+        server.stop()
+    print("session per message {0:10,.0f} messages/s".format(per_message))
+    print("one session         {0:10,.0f} messages/s".format(shared))
+
+
+if __name__ == '__main__':
+    main()
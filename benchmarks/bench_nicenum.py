@@ -0,0 +1,39 @@
+"""NiceNum.niceNumArray against a loop over NiceNum.niceNum"""
+
+import argparse
+import time
+
+import numpy as np
+
+from gracc_reporting.NiceNum import niceNum, niceNumArray
+
+
+def bench_nicenum(n, precision=0):
+    """Seconds to format n floats with niceNum in a loop and with
+    niceNumArray"""
+    values = np.random.default_rng(0).uniform(0, 1e7, n)
+    values[::10] = np.nan
+    start = time.perf_counter()
+    [niceNum(v, precision) if not np.isnan(v) else '' for v in values.tolist()]
+    scalar = time.perf_counter() - start
+    start = time.perf_counter()
+    niceNumArray(values, precision)
+    array = time.perf_counter() - start
+    return scalar, array
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("-n", "--values", dest="values", type=int, nargs='+',
+                        default=[1000, 100000, 1000000],
+                        help="number of values")
+    args = parser.parse_args()
+
+    for n in args.values:
+        scalar, array = bench_nicenum(n)
+        print("{0:>10,} values  niceNum {1:8.3f}s  niceNumArray {2:8.3f}s  "
+              "({3:.1f}x)".format(n, scalar, array, scalar / array))
+
+
+if __name__ == '__main__':
+    main()
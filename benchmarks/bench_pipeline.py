@@ -0,0 +1,72 @@
+"""Throughput of the Pipeline stages, in records per second"""
+
+import argparse
+import io
+import time
+from collections import defaultdict
+
+from gracc_reporting import Pipeline
+
+from .datagen import raw_records
+
+COLUMNS = ['OIM_Site', 'VOName', 'CoreHours', 'Njobs']
+
+
+def _throughput(n, make_pipeline):
+    target = make_pipeline()
+    start = time.perf_counter()
+    Pipeline.feed(raw_records(n), target)
+    elapsed = time.perf_counter() - start
+    return n / elapsed
+
+
+def bench_filter_project(n):
+    return _throughput(n, lambda: Pipeline.filter_records(
+        lambda r: r['CoreHours'] > 1,
+        Pipeline.project(COLUMNS, Pipeline.dict_sink(defaultdict(list),
+                                                     COLUMNS))))
+
+
+def bench_group_by(n):
+    return _throughput(n, lambda: Pipeline.group_by(
+        ['OIM_Site', 'VOName'],
+        {'CoreHours': ('sum', 'CoreHours'), 'Njobs': ('count', None),
+         'MaxWall': ('max', 'WallDuration')},
+        Pipeline.dict_sink(defaultdict(list), COLUMNS)))
+
+
+def bench_top_n(n):
+    return _throughput(n, lambda: Pipeline.top_n(
+        100, 'CoreHours', Pipeline.dict_sink(defaultdict(list), COLUMNS)))
+
+
+def bench_csv_sink(n):
+    return _throughput(n, lambda: Pipeline.csv_sink(io.StringIO(), COLUMNS))
+
+
+def bench_dataframe_sink(n):
+    return _throughput(n, lambda: Pipeline.dataframe_sink([], COLUMNS))
+
+
+def bench_generate_only(n):
+    """Cost of generating the records, for reference"""
+    return _throughput(n, lambda: Pipeline.dict_sink(defaultdict(list), []))
+
+
+BENCHMARKS = [bench_generate_only, bench_filter_project, bench_group_by,
+              bench_top_n, bench_csv_sink, bench_dataframe_sink]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("-n", "--records", dest="n", type=int,
+                        default=1000000, help="number of records")
+    args = parser.parse_args()
+
+    for bench in BENCHMARKS:
+        print("{0:<24} {1:>12,.0f} records/s".format(bench.__name__,
+                                                     bench(args.n)))
+
+
+if __name__ == '__main__':
+    main()
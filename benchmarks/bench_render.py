@@ -0,0 +1,53 @@
+"""Rendering time of report tables: TableRenderer against tabulate"""
+
+import argparse
+import time
+
+import pandas as pd
+import tabulate
+
+from gracc_reporting.TableRenderer import render_table
+
+from .datagen import REPORT_HEADER as HEADER, report_content
+
+ALIGN = ['left', 'left', 'left', 'right']
+
+
+def report_frame(n):
+    """A report-sized table of n rows, converted like TextUtils does"""
+    content = report_content(n)
+    return pd.DataFrame.from_dict(content, orient='index').transpose()[HEADER]
+
+
+def _time(func, *args, **kwargs):
+    start = time.perf_counter()
+    func(*args, **kwargs)
+    return time.perf_counter() - start
+
+
+def bench_render(n, tablefmt):
+    """Seconds to render n rows with tabulate and with render_table"""
+    df = report_frame(n)
+    slow = _time(tabulate.tabulate, df, tablefmt=tablefmt, headers=HEADER,
+                 showindex=False, floatfmt=',.0f', colalign=ALIGN)
+    fast = _time(render_table, df, HEADER, tablefmt=tablefmt,
+                 colalign=ALIGN, floatfmt=',.0f')
+    return slow, fast
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("-n", "--rows", dest="rows", type=int, nargs='+',
+                        default=[1000, 10000, 100000], help="table sizes")
+    args = parser.parse_args()
+
+    for n in args.rows:
+        for tablefmt in ('grid', 'html'):
+            slow, fast = bench_render(n, tablefmt)
+            print("{0:>8,} rows {1:<5} tabulate {2:8.3f}s  render_table "
+                  "{3:8.3f}s  ({4:.1f}x)".format(n, tablefmt, slow, fast,
+                                                 slow / fast))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,167 @@
+"""End-to-end run time of a whole Reporter subclass (query, aggregation
+parsing, rendering and building the email), with the Elasticsearch
+responses replayed from a cassette instead of fetched from GRACC.
+
+By default the cassette is synthetic: one aggregation response with the
+CoreHours of the generated records, by site, VO and project.  Use -C to
+replay a cassette recorded from a real report with --record instead (the
+report's query has to match the one here for that)."""
+
+import argparse
+import os
+import shutil
+import tempfile
+import time
+from collections import defaultdict
+
+from opensearchpy import Search
+
+from gracc_reporting import ClientFactory
+from gracc_reporting.Cassette import Cassette
+from gracc_reporting.ReportUtils import Reporter
+
+from .datagen import raw_records
+
+INDEX = 'gracc.osg.summary'
+START = '2018-01-01 00:00'
+END = '2018-02-01 00:00'
+HEADER = ['Site', 'VO', 'Project', 'CoreHours']
+CONFIG = """
+[elasticsearch]
+    hostname = 'https://gracc.example.com/q'
+
+[email]
+    smtphost = 'smtp.example.com'
+    smtpport = 465
+    smtpuser = 'nobody'
+    smtppassword = 'nothing'
+
+    [email.from]
+        name = 'GRACC Operations'
+        email = 'nobody@example.com'
+
+    [email.test]
+        names = ['Test Recipient', ]
+        emails = ['nobody1@example.com', ]
+
+    [email.outbox]
+        directory = '{outbox}'
+
+[replaybench]
+    index_pattern = '{index}'
+    to_names = ['Recipient', ]
+    to_emails = ['nobody2@example.com', ]
+"""
+
+
+class ReplayBenchReport(Reporter):
+    """CoreHours by site, VO and project"""
+    def __init__(self, config_file, **kwargs):
+        super(ReplayBenchReport, self).__init__('replaybench', config_file,
+                                                START, END, **kwargs)
+        self.header = HEADER
+        self.title = 'Replay benchmark report'
+
+    def query(self):
+        s = Search(using=self.client, index=self.indexpattern) \
+            .filter('range', EndTime={'gte': self.start_time.isoformat(),
+                                      'lt': self.end_time.isoformat()})[0:0]
+        s.aggs.bucket('site', 'terms', field='OIM_Site', size=2 ** 31 - 1) \
+            .bucket('vo', 'terms', field='VOName', size=2 ** 31 - 1) \
+            .bucket('project', 'terms', field='ProjectName',
+                    size=2 ** 31 - 1) \
+            .metric('CoreHours', 'sum', field='CoreHours')
+        return s
+
+    def format_report(self):
+        report = defaultdict(list)
+        for site in self.results.site.buckets:
+            for vo in site.vo.buckets:
+                for project in vo.project.buckets:
+                    for column, value in zip(HEADER, (
+                            site.key, vo.key, project.key,
+                            project.CoreHours.value)):
+                        report[column].append(value)
+        return report
+
+    def run_report(self):
+        self.results = self.run_query()
+        self.send_report()
+
+
+def synthetic_response(n):
+    """Search response with the CoreHours of n generated records, by site,
+    VO and project"""
+    totals = defaultdict(lambda: defaultdict(lambda: defaultdict(float)))
+    for record in raw_records(n):
+        totals[record['OIM_Site']][record['VOName']][
+            record['ProjectName']] += record['CoreHours']
+
+    def buckets(items, make):
+        return {'buckets': [dict(key=key, doc_count=1, **make(value))
+                            for key, value in sorted(items.items())]}
+
+    aggs = {'site': buckets(totals, lambda vos: {'vo': buckets(
+        vos, lambda projects: {'project': buckets(
+            projects, lambda hours: {'CoreHours': {'value': hours}})})})}
+    return {'took': 10, 'timed_out': False,
+            '_shards': {'total': 1, 'successful': 1, 'skipped': 0,
+                        'failed': 0},
+            'hits': {'total': {'value': n, 'relation': 'eq'},
+                     'max_score': None, 'hits': []},
+            'aggregations': aggs}
+
+
+def write_synthetic_cassette(path, config_file, n):
+    """Record the benchmark report's query with a synthetic response"""
+    report = ReplayBenchReport(config_file, no_email=True)
+    Cassette(path).record('POST', '/{0}/_search'.format(INDEX), {},
+                          report.query().to_dict(), synthetic_response(n))
+
+
+def bench_replay(cassette, config_file, latency=0., spool=True):
+    """Seconds to run the report, and its Timings"""
+    ClientFactory.clear()
+    start = time.perf_counter()
+    report = ReplayBenchReport(config_file, replay=cassette,
+                               replay_latency=latency, spool=spool,
+                               no_email=not spool)
+    report.run_report()
+    return time.perf_counter() - start, report.timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("-n", "--records", dest="n", type=int,
+                        default=100000,
+                        help="records to aggregate into the synthetic "
+                             "response")
+    parser.add_argument("-C", "--cassette", dest="cassette", default=None,
+                        help="replay this cassette instead of a synthetic "
+                             "one")
+    parser.add_argument("-l", "--latency", dest="latency", type=float,
+                        default=0., help="simulated seconds per request")
+    args = parser.parse_args()
+
+    tmpdir = tempfile.mkdtemp()
+    try:
+        config_file = os.path.join(tmpdir, 'replaybench.toml')
+        with open(config_file, 'w') as f:
+            f.write(CONFIG.format(outbox=os.path.join(tmpdir, 'outbox'),
+                                  index=INDEX))
+        cassette = args.cassette
+        if cassette is None:
+            cassette = os.path.join(tmpdir, 'cassette.jsonl.gz')
+            write_synthetic_cassette(cassette, config_file, args.n)
+
+        seconds, timings = bench_replay(cassette, config_file, args.latency)
+        print("report {0:8.3f}s".format(seconds))
+        for phase, total in sorted(timings.totals().items(),
+                                   key=lambda item: -item[1]['seconds']):
+            print("  {0:<20} {1:8.3f}s".format(phase, total['seconds']))
+    finally:
+        shutil.rmtree(tmpdir)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,141 @@
+"""Startup time of a report: importing gracc_reporting.ReportUtils, building
+the command line parser with get_report_parser and constructing a Reporter,
+in a fresh interpreter, less the time the interpreter itself takes to
+start.  This is what every cron-launched report pays before its first
+query, and all of it is paid by --help and by reports that fail config
+validation.
+
+Exits with status 1 if startup takes longer than the budget, or if any of
+the heavy modules that are only needed later (pandas, opensearchpy, etc.)
+were imported."""
+
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+# Seconds, on top of interpreter startup
+DEFAULT_BUDGET = 0.25
+# Modules that importing ReportUtils and constructing a Reporter mustn't
+# import
+HEAVY_MODULES = ('pandas', 'numpy', 'opensearchpy', 'tabulate',
+                 'pkg_resources', 'smtplib', 'urllib3')
+
+CONFIG = """
+[elasticsearch]
+    hostname = 'https://gracc.example.com/q'
+
+[email]
+    smtphost = 'smtp.example.com'
+    smtpport = 465
+    smtpuser = 'nobody'
+    smtppassword = 'nothing'
+
+    [email.from]
+        name = 'GRACC Operations'
+        email = 'nobody@example.com'
+
+    [email.test]
+        names = ['Test Recipient', ]
+        emails = ['nobody1@example.com', ]
+
+[startupbench]
+    index_pattern = 'gracc.osg.raw-%Y.%m'
+    to_names = ['Recipient', ]
+    to_emails = ['nobody2@example.com', ]
+"""
+
+# Run in a fresh interpreter.  Prints the seconds taken and the heavy
+# modules imported, as JSON
+SCRIPT = """
+import json, sys, time
+start = time.perf_counter()
+import argparse
+from gracc_reporting.ReportUtils import Reporter, get_report_parser
+
+class StartupBenchReport(Reporter):
+    def query(self):
+        pass
+
+    def run_report(self):
+        pass
+
+parser = argparse.ArgumentParser(parents=[get_report_parser()])
+args = parser.parse_args(['-c', sys.argv[1], '-s', '2018-01-01',
+                          '-e', '2018-02-01', '-n'])
+StartupBenchReport('startupbench', args.config, args.start, args.end,
+                   no_email=args.no_email)
+seconds = time.perf_counter() - start
+print(json.dumps({'seconds': seconds,
+                  'imported': [m for m in sys.argv[2:] if m in sys.modules]}))
+"""
+
+
+def _run(code, *args):
+    """Wall time of running code in a new interpreter, and its output"""
+    start = time.perf_counter()
+    output = subprocess.run([sys.executable, '-c', code] + list(args),
+                            check=True, stdout=subprocess.PIPE,
+                            universal_newlines=True).stdout
+    return time.perf_counter() - start, output
+
+
+def bench_startup(config_file, repeats=5):
+    """Best startup time over repeats runs
+
+    :return tuple: (seconds over bare interpreter startup, seconds measured
+        inside the interpreter, heavy modules imported)
+    """
+    best = best_inside = None
+    imported = []
+    for _ in range(repeats):
+        bare, _ = _run('pass')
+        total, output = _run(SCRIPT, config_file, *HEAVY_MODULES)
+        result = json.loads(output.strip().splitlines()[-1])
+        imported = result['imported']
+        over = max(total - bare, 0.)
+        best = over if best is None else min(best, over)
+        best_inside = result['seconds'] if best_inside is None \
+            else min(best_inside, result['seconds'])
+    return best, best_inside, imported
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("-b", "--budget", dest="budget", type=float,
+                        default=DEFAULT_BUDGET,
+                        help="seconds startup may take on top of the "
+                             "interpreter's own startup")
+    parser.add_argument("-r", "--repeats", dest="repeats", type=int,
+                        default=5, help="runs to take the best of")
+    args = parser.parse_args()
+
+    tmpdir = tempfile.mkdtemp()
+    try:
+        config_file = os.path.join(tmpdir, 'startupbench.toml')
+        with open(config_file, 'w') as f:
+            f.write(CONFIG)
+        seconds, inside, imported = bench_startup(config_file, args.repeats)
+    finally:
+        shutil.rmtree(tmpdir)
+
+    print("startup {0:.3f}s over interpreter startup ({1:.3f}s measured "
+          "inside), budget {2:.3f}s".format(seconds, inside, args.budget))
+    failed = False
+    if imported:
+        print("STARTUP IMPORTS HEAVY MODULES: {0}".format(
+            ', '.join(imported)), file=sys.stderr)
+        failed = True
+    if seconds > args.budget:
+        print("STARTUP OVER BUDGET: {0:.3f}s > {1:.3f}s".format(
+            seconds, args.budget), file=sys.stderr)
+        failed = True
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,79 @@
+"""Bytes on the wire and parse time of a large aggregation response: the
+whole response as JSON, with filter_path=aggregations, and gzipped (what
+http_compress asks the host for), and the time to parse it with the json
+module and with FastJSONSerializer (orjson, if it's installed)."""
+
+import argparse
+import gzip
+import json
+import time
+
+from gracc_reporting.ClientFactory import FastJSONSerializer, orjson
+
+from .datagen import aggregation_response
+
+
+def full_response(n):
+    """A whole search response (with hits metadata and shard info) with an
+    aggregation of n innermost buckets"""
+    return {'took': 1234, 'timed_out': False,
+            '_shards': {'total': 120, 'successful': 120, 'skipped': 0,
+                        'failed': 0},
+            'hits': {'total': {'value': 10000, 'relation': 'gte'},
+                     'max_score': None, 'hits': []},
+            'aggregations': aggregation_response(n)}
+
+
+def _best_time(func, arg, repeats):
+    best = None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        func(arg)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def bench_wire(n, repeats=3):
+    """:return dict: bytes and seconds for each variant"""
+    response = full_response(n)
+    whole = json.dumps(response, separators=(',', ':')).encode('utf-8')
+    filtered = json.dumps(
+        {key: response[key] for key in ('took', 'timed_out', '_shards',
+                                        'aggregations')},
+        separators=(',', ':')).encode('utf-8')
+    serializer = FastJSONSerializer()
+    return {
+        'bytes_whole': len(whole),
+        'bytes_filtered': len(filtered),
+        'bytes_gzipped': len(gzip.compress(filtered, compresslevel=6)),
+        'seconds_json': _best_time(json.loads, whole, repeats),
+        'seconds_fast': _best_time(serializer.loads, whole, repeats),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("-n", "--buckets", dest="n", type=int,
+                        default=100000, help="innermost buckets")
+    parser.add_argument("-r", "--repeats", dest="repeats", type=int,
+                        default=3, help="runs to take the best of")
+    args = parser.parse_args()
+
+    result = bench_wire(args.n, args.repeats)
+    print("{0:,} buckets".format(args.n))
+    print("  whole response      {0:>14,} bytes".format(result['bytes_whole']))
+    print("  filter_path         {0:>14,} bytes".format(
+        result['bytes_filtered']))
+    print("  filter_path + gzip  {0:>14,} bytes ({1:.1%})".format(
+        result['bytes_gzipped'],
+        result['bytes_gzipped'] / float(result['bytes_whole'])))
+    print("  parse (json)        {0:14.3f}s".format(result['seconds_json']))
+    print("  parse ({0}) {1:14.3f}s ({2:.1f}x)".format(
+        'orjson    ' if orjson is not None else 'no orjson ',
+        result['seconds_fast'],
+        result['seconds_json'] / result['seconds_fast']))
+
+
+if __name__ == '__main__':
+    main()
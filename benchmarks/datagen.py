@@ -0,0 +1,135 @@
+"""Synthetic GRACC-shaped data for the benchmarks.  Everything is generated
+from a seeded random number generator, so runs are reproducible."""
+
+import random
+from calendar import timegm
+from datetime import datetime, timedelta
+
+SITES = ['Site{0:03d}'.format(i) for i in range(150)]
+VOS = ['vo{0:02d}'.format(i) for i in range(40)]
+PROJECTS = ['Project-{0:04d}'.format(i) for i in range(800)]
+START = datetime(2018, 1, 1)
+
+# Row counts of the benchmark suite's sizes
+SIZES = {'1k': 1000, '100k': 100000, '1M': 1000000}
+
+# Columns of a typical report table, as in Reporter.format_report
+REPORT_HEADER = ['OIM_Site', 'VOName', 'ProjectName', 'CoreHours']
+
+
+def raw_records(n, seed=0):
+    """Generate n raw job records, lazily
+
+    :param int n: Number of records
+    :param int seed: Random seed
+    :return generator: dicts with the fields GRACC raw records have
+    """
+    rng = random.Random(seed)
+    for i in range(n):
+        cores = rng.choice((1, 1, 1, 4, 8))
+        wall = rng.randint(60, 86400)
+        yield {
+            'OIM_Site': rng.choice(SITES),
+            'VOName': rng.choice(VOS),
+            'ProjectName': rng.choice(PROJECTS),
+            'Processors': cores,
+            'WallDuration': wall,
+            'CoreHours': cores * wall / 3600.,
+            'Njobs': 1,
+            'EndTime': START + timedelta(seconds=i),
+        }
+
+
+def report_content(n, seed=0):
+    """A report table of n rows, as the dict of columns that
+    Reporter.format_report returns and TextUtils.printAsTextTable takes
+
+    :return dict: {column: [values]} with the columns in REPORT_HEADER
+    """
+    content = {column: [] for column in REPORT_HEADER}
+    for record in raw_records(n, seed):
+        for column in REPORT_HEADER:
+            content[column].append(record[column])
+    return content
+
+
+def core_hours(n, seed=0):
+    """n CoreHours values, as floats"""
+    rng = random.Random(seed)
+    return [rng.choice((1, 1, 1, 4, 8)) * rng.randint(60, 86400) / 3600.
+            for _ in range(n)]
+
+
+def timestamps(n, seed=0):
+    """n timestamp strings in the formats reports get on the command line
+    and in config files"""
+    rng = random.Random(seed)
+    formats = ('%Y-%m-%d %H:%M', '%Y-%m-%d', '%Y/%m/%d %H:%M:%S')
+    return [(START + timedelta(seconds=rng.randint(0, 3 * 365 * 86400)))
+            .strftime(rng.choice(formats)) for _ in range(n)]
+
+
+def epochs(n, seed=0, unit='millisecond'):
+    """n epoch times in unit (second or millisecond), as in Elasticsearch
+    date histogram bucket keys"""
+    rng = random.Random(seed)
+    scale = 1000 if unit == 'millisecond' else 1
+    start = timegm(START.timetuple())
+    return [(start + rng.randint(0, 3 * 365 * 86400)) * scale
+            for _ in range(n)]
+
+
+def time_ranges(n, seed=0):
+    """n (start, end) datetime pairs, from an hour to a few months long"""
+    rng = random.Random(seed)
+    ranges = []
+    for _ in range(n):
+        start = START + timedelta(seconds=rng.randint(0, 3 * 365 * 86400))
+        length = timedelta(hours=rng.choice((1, 24, 24 * 7, 24 * 31,
+                                             24 * 92)))
+        ranges.append((start, start + length))
+    return ranges
+
+
+# The aggs of the query that aggregation_response answers: CoreHours and
+# jobs by site, VO and day
+AGGREGATION_DEFS = {
+    'OIM_Site': {
+        'terms': {'field': 'OIM_Site', 'size': 2 ** 31 - 1},
+        'aggs': {'VOName': {
+            'terms': {'field': 'VOName', 'size': 2 ** 31 - 1},
+            'aggs': {'EndTime': {
+                'date_histogram': {'field': 'EndTime',
+                                   'calendar_interval': 'day'},
+                'aggs': {'CoreHours': {'sum': {'field': 'CoreHours'}},
+                         'Njobs': {'sum': {'field': 'Njobs'}}}}}}}}}
+DAYS = 30
+
+
+def aggregation_response(n, seed=0):
+    """The aggregations part of a raw search response with n innermost
+    buckets, answering AGGREGATION_DEFS: DAYS daily buckets under each VO,
+    len(VOS) VOs under each site, and as many sites as it takes"""
+    rng = random.Random(seed)
+    start = timegm(START.timetuple()) * 1000
+    days = [start + day * 86400000 for day in range(DAYS)]
+    sites = []
+    remaining = n
+    while remaining > 0:
+        vos = []
+        for vo in VOS:
+            if remaining <= 0:
+                break
+            buckets = [{'key': key,
+                        'key_as_string': str(key),
+                        'doc_count': 1,
+                        'CoreHours': {'value': rng.randint(1, 86400) / 3600.},
+                        'Njobs': {'value': float(rng.randint(1, 100))}}
+                       for key in days[:remaining]]
+            remaining -= len(buckets)
+            vos.append({'key': vo, 'doc_count': len(buckets),
+                        'EndTime': {'buckets': buckets}})
+        sites.append({'key': 'Site{0:04d}'.format(len(sites)),
+                      'doc_count': len(vos),
+                      'VOName': {'buckets': vos}})
+    return {'OIM_Site': {'buckets': sites}}
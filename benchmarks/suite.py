@@ -0,0 +1,256 @@
+"""Benchmark suite for the hot paths of a report: rendering the tables
+(TextUtils), formatting numbers (NiceNum), converting timestamps
+(TimeUtils), generating index patterns (IndexPattern) and turning
+aggregation responses into tables (Aggregations), on synthetic GRACC-shaped
+data at 1k, 100k and 1M rows (or buckets).
+
+    python -m benchmarks                  # 1k and 100k, check the baselines
+    python -m benchmarks -s 1M -k render  # 1M rows, rendering cases only
+    python -m benchmarks --save           # record new baselines
+
+Times are compared with the baselines stored in benchmarks/baselines.json,
+and the run fails (exit status 1) if any case is more than --tolerance
+(default 2) times slower than its baseline.  So that the baselines carry
+over between machines, every time is divided by the time of a fixed
+calibration workload run just before, on the same machine, and the
+baselines store those relative times.
+"""
+
+import argparse
+import fnmatch
+import json
+import os
+import platform
+import sys
+import time
+
+from gracc_reporting import Aggregations, NiceNum, TimeUtils
+from gracc_reporting.IndexPattern import indexpattern_generate
+from gracc_reporting.TextUtils import TextUtils
+
+from . import datagen
+
+BASELINES = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                         'baselines.json')
+DEFAULT_SIZES = ['1k', '100k']
+DEFAULT_TOLERANCE = 2.
+# Times shorter than this are too noisy to call a regression
+MIN_SECONDS = 0.005
+# Times each case is run at each size; the best time is kept
+REPEATS = {'1k': 5, '100k': 3, '1M': 1}
+INDEX_PATTERN = 'gracc.osg.raw-%Y.%m'
+
+
+class Case(object):
+    """One benchmark
+
+    :param str name: Name of the case
+    :param setup: Function of the number of rows returning the input, which
+        isn't timed
+    :param run: Function of the input that's timed
+    :param str max_size: Largest size to run the case at (for cases that
+        would take minutes at 1M)
+    """
+    def __init__(self, name, setup, run, max_size='1M'):
+        self.name = name
+        self.setup = setup
+        self.run = run
+        self.max_size = max_size
+
+    def runs_at(self, size):
+        return datagen.SIZES[size] <= datagen.SIZES[self.max_size]
+
+
+def _render(format_types):
+    def run(content):
+        utils = TextUtils(datagen.REPORT_HEADER)
+        if len(format_types) == 1:
+            return utils.printAsTextTable(format_types[0], content)
+        return utils.printAsTextTables(format_types, content)
+    return run
+
+
+def _walk_aggregations(aggregations):
+    """Build the columns of an aggregation_response the way reports do,
+    through the AttrDict wrappers run_query returns"""
+    from opensearchpy import AttrDict
+
+    results = AttrDict(aggregations)
+    columns = {'OIM_Site': [], 'VOName': [], 'EndTime': [], 'CoreHours': [],
+               'Njobs': []}
+    for site in results.OIM_Site.buckets:
+        for vo in site.VOName.buckets:
+            for day in vo.EndTime.buckets:
+                columns['OIM_Site'].append(site.key)
+                columns['VOName'].append(vo.key)
+                columns['EndTime'].append(
+                    TimeUtils.epoch_to_datetime(day.key, 'millisecond'))
+                columns['CoreHours'].append(day.CoreHours.value)
+                columns['Njobs'].append(day.Njobs.value)
+    return columns
+
+
+CASES = [
+    Case('render_text', datagen.report_content, _render(['text'])),
+    Case('render_html', datagen.report_content, _render(['html'])),
+    Case('render_csv', datagen.report_content, _render(['csv'])),
+    Case('render_all', datagen.report_content,
+         _render(['text', 'csv', 'html'])),
+    Case('niceNum', datagen.core_hours,
+         lambda values: [NiceNum.niceNum(v) for v in values]),
+    Case('niceNumArray', datagen.core_hours, NiceNum.niceNumArray),
+    Case('parse_datetime', datagen.timestamps,
+         lambda stamps: [TimeUtils.parse_datetime(t) for t in stamps],
+         max_size='100k'),
+    Case('epoch_to_datetime', datagen.epochs,
+         lambda epochs: [TimeUtils.epoch_to_datetime(e, 'millisecond')
+                         for e in epochs]),
+    Case('epoch_to_datetime_array', datagen.epochs,
+         lambda epochs: TimeUtils.epoch_to_datetime_array(epochs,
+                                                          'millisecond')),
+    Case('indexpattern_generate', datagen.time_ranges,
+         lambda ranges: [indexpattern_generate(INDEX_PATTERN, start, end)
+                         for start, end in ranges],
+         max_size='100k'),
+    Case('walk_aggregations', datagen.aggregation_response,
+         _walk_aggregations, max_size='100k'),
+    Case('flatten_aggregations', datagen.aggregation_response,
+         Aggregations.flatten_aggregations),
+    Case('aggregations_to_dataframe', datagen.aggregation_response,
+         lambda aggregations: Aggregations.aggregations_to_dataframe(
+             aggregations, datagen.AGGREGATION_DEFS)),
+]
+
+
+def calibrate(repeats=5):
+    """Seconds taken by a fixed mix of string formatting, sorting and
+    arithmetic, the kind of work the cases do.  Best of repeats runs."""
+    def workload():
+        values = [i * 7919 % 100003 / 7. for i in range(200000)]
+        strings = sorted('{0:,.2f}'.format(v) for v in values)
+        return sum(len(s) for s in strings)
+    return _best_time(workload, (), repeats)
+
+
+def _best_time(func, args, repeats):
+    best = None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        func(*args)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def run_cases(cases, sizes, calibration):
+    """Run the cases at the sizes
+
+    :return dict: {'case@size': {'seconds': s, 'relative': s / calibration}}
+    """
+    results = {}
+    for size in sizes:
+        n = datagen.SIZES[size]
+        for case in cases:
+            if not case.runs_at(size):
+                continue
+            data = case.setup(n)
+            seconds = _best_time(case.run, (data,), REPEATS[size])
+            key = '{0}@{1}'.format(case.name, size)
+            results[key] = {'seconds': seconds,
+                            'relative': seconds / calibration}
+            print("{0:<30} {1:10.4f}s  {2:>14,.0f} rows/s".format(
+                key, seconds, n / seconds))
+    return results
+
+
+def load_baselines(path=BASELINES):
+    """:return dict: {'case@size': relative time}"""
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)['results']
+    except FileNotFoundError:
+        return {}
+
+
+def save_baselines(results, path=BASELINES):
+    """Add results to the baselines in path, replacing those for the same
+    cases and sizes"""
+    baselines = load_baselines(path)
+    baselines.update((key, round(result['relative'], 4))
+                     for key, result in results.items())
+    with open(path, 'w') as f:
+        json.dump({'python': platform.python_version(),
+                   'results': baselines}, f, indent=4, sort_keys=True)
+        f.write('\n')
+
+
+def find_regressions(results, baselines, tolerance=DEFAULT_TOLERANCE,
+                     calibration=1.):
+    """Cases more than tolerance times slower than their baseline
+
+    :param dict results: From run_cases
+    :param dict baselines: From load_baselines
+    :param float calibration: Calibration time results were divided by
+    :return list: (case@size, times slower) for each regression
+    """
+    regressions = []
+    for key, result in sorted(results.items()):
+        if key not in baselines or result['seconds'] < MIN_SECONDS:
+            continue
+        # Don't count baselines that were under MIN_SECONDS as that fast
+        baseline = max(baselines[key], MIN_SECONDS / calibration)
+        ratio = result['relative'] / baseline
+        if ratio > tolerance:
+            regressions.append((key, ratio))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m benchmarks',
+        description="Benchmark the report hot paths and compare them with "
+                    "the stored baselines")
+    parser.add_argument("-s", "--size", dest="sizes", nargs='+',
+                        choices=list(datagen.SIZES), default=DEFAULT_SIZES,
+                        help="data sizes to run")
+    parser.add_argument("-k", "--cases", dest="cases", default='*',
+                        help="only run cases matching this glob pattern")
+    parser.add_argument("-t", "--tolerance", dest="tolerance", type=float,
+                        default=DEFAULT_TOLERANCE,
+                        help="fail if a case is this many times slower than "
+                             "its baseline")
+    parser.add_argument("--save", dest="save", action="store_true",
+                        help="store the results as the new baselines")
+    parser.add_argument("-b", "--baselines", dest="baselines",
+                        default=BASELINES, help="baselines file")
+    args = parser.parse_args(argv)
+
+    cases = [case for case in CASES
+             if fnmatch.fnmatch(case.name, args.cases)]
+    calibration = calibrate()
+    print("calibration {0:.4f}s".format(calibration))
+    results = run_cases(cases, args.sizes, calibration)
+
+    if args.save:
+        save_baselines(results, args.baselines)
+        print("Saved baselines to {0}".format(args.baselines))
+        return 0
+
+    baselines = load_baselines(args.baselines)
+    missing = sorted(set(results) - set(baselines))
+    if missing:
+        print("No baselines for {0}".format(', '.join(missing)))
+    regressions = find_regressions(results, baselines, args.tolerance,
+                                   calibration)
+    if regressions:
+        print("\nPERFORMANCE REGRESSION", file=sys.stderr)
+        for key, ratio in regressions:
+            print("  {0} is {1:.1f}x slower than its baseline".format(
+                key, ratio), file=sys.stderr)
+        return 1
+    print("All cases within {0}x of their baselines".format(args.tolerance))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,186 @@
+"""Adaptive aggregation queries.  The query is run over the whole range
+first, and if it times out or trips the cluster's search.max_buckets limit,
+the time range is cut in half and each half is run the same way, down to a
+minimum window.  A window that still fails at the minimum size has its
+top-level terms aggregation split into hash partitions instead.  The partial
+aggregations are merged back into the result of the whole query, so large
+ranges finish more slowly instead of not finishing."""
+
+from datetime import timedelta
+
+from . import Aggregations
+from . import TimeSlice
+
+DEFAULT_MIN_WINDOW = timedelta(hours=1)
+DEFAULT_MAX_PARTITIONS = 64
+
+# Errors from the cluster that mean the request was too big, not that
+# something's wrong with it
+_TOO_BIG_ERRORS = ('too_many_buckets_exception',)
+
+
+class QueryTooBigError(Exception):
+    """A response that timed out on the cluster, or had shards fail for being
+    too big"""
+    pass
+
+
+def is_too_big(error):
+    """Whether error means the request would work if it covered less
+
+    :param Exception error: Raised by client.search
+    :return bool: True for client timeouts, too_many_buckets errors and
+        QueryTooBigError
+    """
+    from opensearchpy.exceptions import ConnectionTimeout, TransportError
+
+    if isinstance(error, (QueryTooBigError, ConnectionTimeout)):
+        return True
+    if isinstance(error, TransportError):
+        # (status, error, info), but info is often left out
+        details = ' '.join(str(arg) for arg in error.args[1:])
+        return any(marker in details for marker in _TOO_BIG_ERRORS)
+    return False
+
+
+def _check_too_big(response):
+    """Raise QueryTooBigError if a raw response timed out or had shards fail
+    for being too big"""
+    failures = response.get('_shards', {}).get('failures', [])
+    if response.get('timed_out') or \
+            any(marker in str(failures) for marker in _TOO_BIG_ERRORS):
+        raise QueryTooBigError("Response timed out or hit search.max_buckets")
+    return response
+
+
+def partition_body(body, partition, num_partitions):
+    """Return a copy of a query body whose one top-level aggregation, a
+    terms aggregation, only covers one hash partition of its terms.  Each
+    partition has a disjoint set of terms, so merging the partitions gives
+    the result of the whole query.
+
+    Partition p of n is the union of partitions p and p + n of 2n, so a
+    partition that's still too big can be split again.
+
+    :param dict body: Query body (Search.to_dict())
+    :param int partition: Which partition, from 0 to num_partitions - 1
+    :param int num_partitions: Number of partitions
+    :return dict: New query body
+    """
+    aggs = Aggregations.get_aggs(body)
+    if len(aggs) != 1:
+        raise Aggregations.AggregationError(
+            "Only queries with exactly one top-level aggregation can be "
+            "partitioned.  Found {0}".format(len(aggs)))
+    name, agg_def = next(iter(aggs.items()))
+    agg_type, options = Aggregations._split_agg(agg_def)
+    if agg_type != 'terms' or 'include' in options:
+        raise Aggregations.AggregationError(
+            "Aggregation {0} of type {1} can't be partitioned".format(
+                name, agg_type))
+
+    new_body = {key: value for key, value in body.items()
+                if key not in ('aggs', 'aggregations')}
+    new_agg = dict(agg_def)
+    new_agg['terms'] = dict(options, include={'partition': partition,
+                                              'num_partitions': num_partitions})
+    new_body['aggs'] = {name: new_agg}
+    return new_body
+
+
+class _Stats(object):
+    """How much a query had to be split"""
+    def __init__(self):
+        self.requests = 0
+        self.splits = 0
+        self.depth = 0
+
+    def as_dict(self):
+        return {'requests': self.requests, 'splits': self.splits,
+                'depth': self.depth}
+
+
+def run_adaptive(client, body, start, end, index_for_window,
+                 min_window=DEFAULT_MIN_WINDOW,
+                 max_partitions=DEFAULT_MAX_PARTITIONS,
+                 time_field=TimeSlice.DEFAULT_TIME_FIELD, logger=None,
+                 **search_kwargs):
+    """Run body over [start, end), splitting it whenever a request is too
+    big (see is_too_big): first in time, by halves, while the halves are at
+    least min_window long, then into hash partitions of the top-level terms
+    aggregation, up to max_partitions.  The pieces run one after the other,
+    since the cluster was already struggling with the whole query.
+
+    :param client: opensearchpy.OpenSearch client
+    :param dict body: Query body (Search.to_dict())
+    :param datetime start: tz-aware UTC start of the range
+    :param datetime end: tz-aware UTC end of the range
+    :param function index_for_window: Called with (start, end), returns the
+        index pattern to query for that window
+    :param timedelta min_window: Don't split the time range into windows
+        shorter than this
+    :param int max_partitions: Don't split the terms into more partitions
+        than this.  0 or 1 turns off partitioning
+    :param str time_field: Name of the field the range filter is on
+    :param logging.Logger logger: Logs each split, if given
+    :param search_kwargs: Extra keyword arguments for client.search
+    :return tuple: (combined raw response, dict with the number of
+        requests, splits and the deepest split depth)
+    """
+    stats = _Stats()
+
+    def _search(piece_start, piece_end, partition):
+        stats.requests += 1
+        piece_body = TimeSlice.retime_body(body, piece_start, piece_end,
+                                           time_field)
+        if partition is not None:
+            piece_body = partition_body(piece_body, *partition)
+        response = client.search(
+            index=index_for_window(piece_start, piece_end), body=piece_body,
+            **search_kwargs)
+        return Aggregations.check_response(_check_too_big(response))
+
+    def _run(piece_start, piece_end, partition, depth):
+        stats.depth = max(stats.depth, depth)
+        try:
+            return _search(piece_start, piece_end, partition)
+        except Exception as e:
+            if not is_too_big(e):
+                raise
+            error = e
+
+        half = timedelta(seconds=int((piece_end - piece_start)
+                                     .total_seconds() // 2))
+        if partition is None and half >= min_window:
+            middle = piece_start + half
+            pieces = [(piece_start, middle, None), (middle, piece_end, None)]
+            what = 'time range'
+        else:
+            part, num_partitions = partition or (0, 1)
+            if num_partitions * 2 > max_partitions:
+                raise error
+            try:
+                partition_body(body, 0, 2)
+            except Aggregations.AggregationError:
+                raise error
+            pieces = [(piece_start, piece_end, (part, num_partitions * 2)),
+                      (piece_start, piece_end,
+                       (part + num_partitions, num_partitions * 2))]
+            what = 'terms'
+
+        stats.splits += 1
+        if logger is not None:
+            logger.info('Query over [{0}, {1}){2} was too big ({3}).  '
+                        'Splitting the {4} at depth {5}'.format(
+                            piece_start, piece_end,
+                            '' if partition is None else
+                            ' partition {0}/{1}'.format(*partition),
+                            type(error).__name__, what, depth + 1))
+        responses = [_run(*piece, depth=depth + 1) for piece in pieces]
+        combined = TimeSlice.combine_responses(body, responses)
+        if what == 'terms':
+            # The partitions all matched the same documents
+            combined['hits'] = responses[0].get('hits', combined['hits'])
+        return combined
+
+    return _run(start, end, None, 0), stats.as_dict()
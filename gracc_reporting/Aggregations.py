@@ -0,0 +1,672 @@
+"""Helpers for working with the aggregation part of GRACC queries and
+responses.  These operate on the plain dict form of a query (Search.to_dict())
+and of the response body, so they can be used with any Search object or raw
+client call."""
+
+import copy
+import logging
+
+DEFAULT_PAGE_SIZE = 1000
+
+# Bucket aggregations that can be turned into a composite aggregation source,
+# along with the options of each that composite sources understand
+_COMPOSITE_SOURCE_OPTIONS = {
+    'terms': ('field', 'script', 'value_type'),
+    'histogram': ('field', 'script', 'interval', 'value_type'),
+    'date_histogram': ('field', 'script', 'interval', 'calendar_interval',
+                       'fixed_interval', 'format', 'time_zone', 'offset',
+                       'value_type'),
+}
+
+
+class AggregationError(ValueError):
+    pass
+
+
+logger = logging.getLogger(__name__)
+
+
+def get_aggs(body):
+    """Return the aggs dict of a query body or aggregation, whichever key
+    (aggs or aggregations) it uses
+
+    :param dict body: Query body or aggregation definition
+    :return dict: Sub-aggregations (empty if there are none)
+    """
+    return body.get('aggs', body.get('aggregations', {}))
+
+
+def _split_agg(agg_def):
+    """Split an aggregation definition into its type and options
+
+    :param dict agg_def: e.g. {"terms": {...}, "aggs": {...}}
+    :return tuple: (agg type, agg options)
+    """
+    types = [key for key in agg_def if key not in ('aggs', 'aggregations', 'meta')]
+    if len(types) != 1:
+        raise AggregationError("Could not determine the type of aggregation "
+                               "{0}".format(agg_def))
+    return types[0], agg_def[types[0]]
+
+
+def terms_to_composite(body, page_size=DEFAULT_PAGE_SIZE):
+    """Rewrite a query body whose aggregation is a chain of nested bucket
+    aggregations (terms, histogram, date_histogram), each with at most one
+    bucket sub-aggregation, into a single composite aggregation.  The bucket
+    aggregations become the composite sources, in order, and the metric
+    aggregations at the bottom of the chain become the sub-aggregations of the
+    composite aggregation.
+
+    For example, OIM_Site(terms) -> VOName(terms) -> CoreHours(sum) becomes
+    OIM_Site(composite, sources=[OIM_Site, VOName]) -> CoreHours(sum)
+
+    Options that composite sources don't support (size, min_doc_count, etc.)
+    are dropped.  A 'missing' value becomes missing_bucket, so documents
+    without the field show up with a key of None (iter_composite_buckets
+    puts the missing value back).  An order by key becomes the source's
+    order; any other order is dropped with a warning, since composite
+    buckets always come in key order.
+
+    :param dict body: Query body (Search.to_dict()).  Not modified.
+    :param int page_size: Number of composite buckets per page
+    :return tuple: (new query body, name of the composite aggregation)
+    """
+    new_body, composite_name, _ = _to_composite(body, page_size)
+    return new_body, composite_name
+
+
+def _key_order(order):
+    """Direction of a bucket aggregation's order if it orders by key only
+
+    :param order: The order option, e.g. {"_key": "asc"} or a list of those
+    :return str: 'asc' or 'desc', or None if it orders by anything else
+    """
+    orders = order if isinstance(order, list) else [order]
+    if len(orders) == 1 and isinstance(orders[0], dict) and \
+            len(orders[0]) == 1:
+        (key, direction), = orders[0].items()
+        if key in ('_key', '_term'):
+            return direction
+    return None
+
+
+def _to_composite(body, page_size):
+    """terms_to_composite, also returning the 'missing' values of the
+    sources, {source name: value}"""
+    aggs = get_aggs(body)
+    if len(aggs) != 1:
+        raise AggregationError("Paginated queries must have exactly one "
+                               "top-level aggregation.  Found {0}".format(
+                                   len(aggs)))
+
+    name, agg_def = next(iter(aggs.items()))
+    composite_name = name
+    sources = []
+    metrics = {}
+    missing = {}
+
+    while agg_def is not None:
+        agg_type, options = _split_agg(agg_def)
+        if agg_type not in _COMPOSITE_SOURCE_OPTIONS:
+            raise AggregationError("Aggregation {0} of type {1} can't be used "
+                                   "as a composite source".format(name, agg_type))
+
+        source = {key: value for key, value in options.items()
+                  if key in _COMPOSITE_SOURCE_OPTIONS[agg_type]}
+        if 'missing' in options:
+            source['missing_bucket'] = True
+            missing[name] = options['missing']
+        if 'order' in options:
+            direction = _key_order(options['order'])
+            if direction is not None:
+                source['order'] = direction
+            else:
+                logger.warning(
+                    "Dropping order {0} of aggregation {1}: composite buckets "
+                    "are in key order".format(options['order'], name))
+        sources.append({name: {agg_type: source}})
+
+        next_agg = None
+        for sub_name, sub_def in get_aggs(agg_def).items():
+            sub_type, _ = _split_agg(sub_def)
+            if sub_type in _COMPOSITE_SOURCE_OPTIONS:
+                if next_agg is not None:
+                    raise AggregationError(
+                        "Aggregation {0} has more than one bucket "
+                        "sub-aggregation".format(name))
+                next_agg = (sub_name, sub_def)
+            elif get_aggs(sub_def):
+                raise AggregationError("Sub-aggregation {0} of type {1} can't "
+                                       "be paginated".format(sub_name, sub_type))
+            else:
+                metrics[sub_name] = copy.deepcopy(sub_def)
+
+        if next_agg is not None and metrics:
+            raise AggregationError("Aggregation {0} mixes metric and bucket "
+                                   "sub-aggregations".format(name))
+        name, agg_def = next_agg if next_agg is not None else (name, None)
+
+    composite = {'composite': {'size': page_size, 'sources': sources}}
+    if metrics:
+        composite['aggs'] = metrics
+
+    new_body = {key: copy.deepcopy(value) for key, value in body.items()
+                if key not in ('aggs', 'aggregations')}
+    new_body['size'] = 0
+    new_body['aggs'] = {composite_name: composite}
+    return new_body, composite_name, missing
+
+
+def check_response(response):
+    """Make sure a raw search response completed on every shard
+
+    :param dict response: Raw search response body
+    :return dict: The same response
+    """
+    shards = response.get('_shards', {})
+    if response.get('timed_out') or \
+            shards.get('total') != shards.get('successful'):
+        raise Exception("Error accessing Elasticsearch")
+    return response
+
+
+def iter_composite_buckets(client, index, body, page_size=DEFAULT_PAGE_SIZE,
+                           **search_kwargs):
+    """Generator that runs a query as a composite aggregation one page at a
+    time, following after_key, and yields each bucket.  Only one page of
+    buckets is held in memory at a time.
+
+    Each bucket is an AttrDict like {"key": {"OIM_Site": ..., "VOName": ...},
+    "doc_count": ..., "CoreHours": {"value": ...}}.  Keys of documents
+    without a field are its aggregation's 'missing' value, as they would be
+    with the original aggregations.
+
+    :param client: opensearchpy.OpenSearch client
+    :param str index: Index pattern to query
+    :param dict body: Query body with nested bucket aggregations.  See
+        terms_to_composite
+    :param int page_size: Number of buckets to request per page
+    :param search_kwargs: Extra keyword arguments for client.search.  A
+        filter_path always keeps the after_key and the bucket keys, which
+        paging needs
+    :return generator: AttrDict buckets
+    """
+    from opensearchpy import AttrDict
+
+    page_body, name, missing = _to_composite(body, page_size)
+    composite = page_body['aggs'][name]['composite']
+    if search_kwargs.get('filter_path'):
+        search_kwargs['filter_path'] = _paging_filter_path(
+            search_kwargs['filter_path'], name)
+
+    while True:
+        response = check_response(
+            client.search(index=index, body=page_body, **search_kwargs))
+        agg = response['aggregations'][name]
+
+        for bucket in agg['buckets']:
+            key = bucket['key']
+            if any(key.get(source) is None for source in missing):
+                # A copy, since after_key has to keep the None
+                bucket['key'] = dict(key)
+                for source, value in missing.items():
+                    if key.get(source) is None:
+                        bucket['key'][source] = value
+            yield AttrDict(bucket)
+
+        after_key = agg.get('after_key')
+        if not agg['buckets']:
+            return
+        if after_key is None:
+            if len(agg['buckets']) >= page_size:
+                raise AggregationError(
+                    "A full page of {0} buckets came back without an "
+                    "after_key, so the rest can't be fetched".format(name))
+            return
+        composite['after'] = after_key
+
+
+def _paging_filter_path(filter_path, name):
+    """filter_path, plus the parts of composite aggregation name that
+    iter_composite_buckets needs to page: the after_key and the bucket keys
+
+    :param filter_path: Comma-separated string or list of paths
+    :param str name: Name of the composite aggregation
+    :return str: New filter_path
+    """
+    if isinstance(filter_path, str):
+        filter_path = filter_path.split(',')
+    needed = ['aggregations.{0}.after_key'.format(name),
+              'aggregations.{0}.buckets.key'.format(name)]
+    return ','.join(list(filter_path) +
+                    [path for path in needed if path not in filter_path])
+
+
+# Bucket aggregations whose buckets can be merged by key, and single-bucket
+# aggregations whose doc_count and sub-aggregations can be merged
+_MULTI_BUCKET_TYPES = ('terms', 'composite', 'histogram', 'date_histogram')
+_SINGLE_BUCKET_TYPES = ('filter', 'missing', 'global')
+
+
+def _merge_metric(agg_type, results):
+    """Merge the results of one metric aggregation run over disjoint sets of
+    documents
+
+    :param str agg_type: Metric aggregation type (sum, min, etc.)
+    :param list results: Metric results, e.g. [{"value": 1.0}, {"value": 2.0}]
+    :return dict: Merged metric result
+    """
+    if agg_type in ('sum', 'value_count'):
+        return {'value': sum(r['value'] for r in results
+                             if r.get('value') is not None)}
+    elif agg_type in ('min', 'max'):
+        values = [r['value'] for r in results if r.get('value') is not None]
+        func = min if agg_type == 'min' else max
+        return {'value': func(values) if values else None}
+    elif agg_type == 'stats':
+        counts = sum(r['count'] for r in results)
+        mins = [r['min'] for r in results if r.get('min') is not None]
+        maxes = [r['max'] for r in results if r.get('max') is not None]
+        total = sum(r['sum'] for r in results)
+        return {'count': counts,
+                'min': min(mins) if mins else None,
+                'max': max(maxes) if maxes else None,
+                'sum': total,
+                'avg': total / counts if counts else None}
+    else:
+        raise AggregationError("Can't merge results of {0} aggregations".format(
+            agg_type))
+
+
+def _bucket_key(bucket):
+    """Hashable key for a bucket (composite keys are dicts)"""
+    key = bucket['key']
+    if isinstance(key, dict):
+        return tuple(sorted(key.items()))
+    return key
+
+
+def _sort_merged_buckets(agg_type, options, buckets):
+    """Sort merged buckets the way the cluster would have"""
+    if agg_type != 'terms':
+        return sorted(buckets, key=_bucket_key)
+
+    order = options.get('order', {'_count': 'desc'})
+    if isinstance(order, list):
+        order = order[0] if order else {'_count': 'desc'}
+    field, direction = next(iter(order.items()))
+    reverse = direction == 'desc'
+
+    if field in ('_key', '_term'):
+        buckets = sorted(buckets, key=_bucket_key, reverse=reverse)
+    elif field == '_count':
+        # Ties are broken by ascending key
+        buckets = sorted(buckets, key=_bucket_key)
+        buckets = sorted(buckets, key=lambda b: b['doc_count'], reverse=reverse)
+    else:
+        # Order by a metric sub-aggregation, e.g. {"CoreHours": "desc"}
+        metric_name, _, metric_key = field.partition('.')
+        metric_key = metric_key or 'value'
+        buckets = sorted(buckets,
+                         key=lambda b: b[metric_name].get(metric_key) or 0,
+                         reverse=reverse)
+    if 'size' in options:
+        buckets = buckets[:options['size']]
+    return buckets
+
+
+def _merge_agg(agg_def, results):
+    """Merge the results of a single aggregation (and its sub-aggregations)
+
+    :param dict agg_def: Aggregation definition from the query body
+    :param list results: That aggregation's result from each response
+    :return dict: Merged result
+    """
+    agg_type, options = _split_agg(agg_def)
+    sub_defs = get_aggs(agg_def)
+
+    if agg_type in _MULTI_BUCKET_TYPES:
+        merged = {}
+        for result in results:
+            for bucket in result['buckets']:
+                merged.setdefault(_bucket_key(bucket), []).append(bucket)
+
+        buckets = []
+        for bucket_list in merged.values():
+            bucket = {k: v for k, v in bucket_list[0].items()
+                      if k not in sub_defs}
+            bucket['doc_count'] = sum(b['doc_count'] for b in bucket_list)
+            bucket.update(merge_aggregations(sub_defs, bucket_list))
+            buckets.append(bucket)
+
+        merged_result = {'buckets': _sort_merged_buckets(agg_type, options,
+                                                         buckets)}
+        for counter in ('sum_other_doc_count', 'doc_count_error_upper_bound'):
+            if any(counter in r for r in results):
+                merged_result[counter] = sum(r.get(counter, 0) for r in results)
+        if agg_type == 'composite' and merged_result['buckets']:
+            merged_result['after_key'] = merged_result['buckets'][-1]['key']
+        return merged_result
+    elif agg_type in _SINGLE_BUCKET_TYPES:
+        merged_result = {'doc_count': sum(r['doc_count'] for r in results)}
+        merged_result.update(merge_aggregations(sub_defs, results))
+        return merged_result
+    else:
+        return _merge_metric(agg_type, results)
+
+
+def merge_aggregations(agg_defs, agg_results):
+    """Merge the aggregation results of the same query run over disjoint sets
+    of documents (different time ranges, for example) into the result that
+    running the query once over all of those documents would give.
+
+    Bucket aggregations (terms, composite, histogram, date_histogram, filter,
+    missing, global) are merged bucket-by-bucket by key, and the sum,
+    value_count, min, max and stats metrics are combined.  Other metrics
+    (avg, cardinality, percentiles, etc.) can't be combined exactly from
+    partial results, and raise an AggregationError.
+
+    :param dict agg_defs: The aggs part of the query body, {name: definition}
+    :param list agg_results: The aggregations part of each response
+    :return dict: Merged aggregations, in the same form as a response's
+    """
+    return {name: _merge_agg(agg_def, [r[name] for r in agg_results
+                                       if name in r])
+            for name, agg_def in agg_defs.items()}
+
+
+def count_buckets(aggregations):
+    """Count the buckets in the aggregations part of a response, at every
+    level of nesting
+
+    :param dict aggregations: Aggregations part of a response (raw dict)
+    :return int: Number of buckets
+    """
+    count = 0
+    for result in aggregations.values():
+        if not isinstance(result, dict):
+            continue
+        buckets = result.get('buckets')
+        if isinstance(buckets, dict):
+            buckets = list(buckets.values())     # keyed buckets
+        if isinstance(buckets, list):
+            count += len(buckets)
+            for bucket in buckets:
+                count += count_buckets(bucket)
+        else:
+            count += count_buckets(result)   # single-bucket aggregations
+    return count
+
+
+# Keys of a bucket that aren't sub-aggregations
+_BUCKET_FIELDS = frozenset(('key', 'key_as_string', 'doc_count', 'from',
+                            'from_as_string', 'to', 'to_as_string'))
+
+
+def _is_bucket_agg(result):
+    return isinstance(result, dict) and 'buckets' in result
+
+
+def _leaf_paths(results, skip=(), prefix='', path=()):
+    """Columns for the metric and single-bucket aggregation results in a
+    bucket (or the top level of a response), and the one multi-bucket
+    aggregation in it, if any, looking through single-bucket aggregations
+
+    :param dict results: {agg name: result}
+    :param skip: Keys of results that aren't aggregations
+    :return tuple: ([(column, path to the value)], (column prefix, path to
+        the multi-bucket result) or None)
+    """
+    columns = []
+    child = None
+    for name, result in results.items():
+        if name in skip or not isinstance(result, dict):
+            continue
+        column = prefix + name
+        if 'buckets' in result:
+            if child is not None:
+                raise AggregationError(
+                    "Can't flatten sibling bucket aggregations {0} and "
+                    "{1}".format(child[0], column))
+            child = (column, path + (name,))
+        elif 'doc_count' in result:
+            # Single-bucket aggregation (filter, missing, global, ...)
+            columns.append((column + '.doc_count',
+                            path + (name, 'doc_count')))
+            sub_columns, sub_child = _leaf_paths(
+                result, _BUCKET_FIELDS, column + '.', path + (name,))
+            columns.extend(sub_columns)
+            if sub_child is not None:
+                if child is not None:
+                    raise AggregationError(
+                        "Can't flatten sibling bucket aggregations {0} and "
+                        "{1}".format(child[0], sub_child[0]))
+                child = sub_child
+        elif 'value' in result:
+            columns.append((column, path + (name, 'value')))
+        else:
+            # stats, extended_stats, percentiles ({"values": {...}}), etc.
+            for field, value in result.items():
+                if field.endswith('_as_string'):
+                    continue
+                if isinstance(value, dict):
+                    columns.extend((column + '.' + sub_field,
+                                    path + (name, field, sub_field))
+                                   for sub_field, sub_value in value.items()
+                                   if not isinstance(sub_value, (dict, list)))
+                elif not isinstance(value, list):
+                    columns.append((column + '.' + field,
+                                    path + (name, field)))
+    return columns, child
+
+
+def _dig(obj, path):
+    for step in path:
+        try:
+            obj = obj[step]
+        except (KeyError, TypeError):
+            return None
+    return obj
+
+
+def _column_values(items, path):
+    """Values at path in each of items, None where there's nothing there"""
+    try:
+        if len(path) == 1:
+            return [item[path[0]] for item in items]
+        if len(path) == 2:
+            first, second = path
+            return [item[first][second] for item in items]
+    except (KeyError, TypeError):
+        pass
+    return [_dig(item, path) for item in items]
+
+
+def _bucket_list(result):
+    """(keys, buckets) of a multi-bucket aggregation result.  Keyed buckets
+    (keyed=True) are dicts of buckets by key"""
+    buckets = result['buckets']
+    if isinstance(buckets, dict):
+        return list(buckets), list(buckets.values())
+    return [bucket.get('key') for bucket in buckets], buckets
+
+
+class _Columns(object):
+    """Columns of equal length, built a batch of rows at a time.  Columns
+    first seen part of the way through are padded with None"""
+    def __init__(self):
+        self.columns = {}
+        self.rows = 0
+
+    def extend(self, batch, n):
+        """:param dict batch: {column: list of n values (or a single value
+        for all n rows)}"""
+        for name, values in batch.items():
+            if not isinstance(values, list):
+                values = [values] * n
+            column = self.columns.get(name)
+            if column is None:
+                column = self.columns[name] = [None] * self.rows
+            column.extend(values)
+        self.rows += n
+        for column in self.columns.values():
+            if len(column) < self.rows:
+                column.extend([None] * (self.rows - len(column)))
+
+
+def _flatten_buckets(name, result, row, columns):
+    """Add the rows for a multi-bucket aggregation result to columns
+
+    :param str name: Column name for the bucket keys
+    :param dict result: The aggregation result, {"buckets": ...}
+    :param dict row: {column: value} of the enclosing buckets, repeated on
+        each row
+    :param _Columns columns: Where the rows go
+    """
+    keys, buckets = _bucket_list(result)
+    if not buckets:
+        return
+
+    # The first bucket decides the columns of the whole list
+    leaf_columns, child = _leaf_paths(buckets[0], _BUCKET_FIELDS)
+    if isinstance(keys[0], dict):
+        # Composite buckets get a column per source
+        key_columns = {source: [key.get(source) for key in keys]
+                       for source in keys[0]}
+    else:
+        key_columns = {name: keys}
+
+    if child is None:
+        # Innermost buckets: one row each, built a column at a time
+        batch = dict(row)
+        batch.update(key_columns)
+        batch['doc_count'] = _column_values(buckets, ('doc_count',))
+        for column, path in leaf_columns:
+            batch[column] = _column_values(buckets, path)
+        columns.extend(batch, len(buckets))
+        return
+
+    child_name, child_path = child
+    for i, bucket in enumerate(buckets):
+        bucket_row = dict(row)
+        for column, values in key_columns.items():
+            bucket_row[column] = values[i]
+        for column, path in leaf_columns:
+            bucket_row[column] = _dig(bucket, path)
+        child_result = _dig(bucket, child_path)
+        if child_result is not None:
+            _flatten_buckets(child_name, child_result, bucket_row, columns)
+
+
+def _typed(values):
+    """numpy array of values: int64 or float64 (None is NaN) for numbers,
+    bool, or object for anything else"""
+    import numpy as np
+
+    types = set(map(type, values))
+    if not types or types == {int}:
+        return np.array(values, dtype=np.int64)
+    if types <= {int, float, type(None)}:
+        return np.array(values, dtype=np.float64)
+    if types == {bool}:
+        return np.array(values, dtype=bool)
+    array = np.empty(len(values), dtype=object)
+    array[:] = values
+    return array
+
+
+def flatten_aggregations(aggregations):
+    """Flatten the aggregations part of a response, with any nesting of
+    multi-bucket aggregations (terms, composite, histogram, date_histogram,
+    etc.) and metric aggregations, into columns, with one row per innermost
+    bucket.  The raw dicts are read directly, without wrapping each bucket in
+    an AttrDict.
+
+    Columns are:
+        * the bucket keys, named after the aggregation (composite
+          aggregations get one column per source, named after the source)
+        * doc_count of the innermost buckets
+        * metrics, named after the aggregation for single-value metrics
+          ({"value": ...}), and name.field for the others (stats, etc.)
+        * single-bucket aggregations (filter, etc.), as name.doc_count and
+          name.<sub-aggregation>
+
+    Metrics of outer buckets are repeated on each of their rows.  Buckets
+    whose sub-aggregation has no buckets don't produce rows.  Each bucket can
+    have at most one multi-bucket sub-aggregation.
+
+    :param dict aggregations: Aggregations part of a response (raw dict, or
+        the Response.aggregations that run_query returns)
+    :return dict: {column: numpy array}, typed int64, float64 (with NaN for
+        missing values), bool or object
+    """
+    if hasattr(aggregations, 'to_dict'):
+        aggregations = aggregations.to_dict()
+
+    columns = _Columns()
+    leaf_columns, child = _leaf_paths(aggregations)
+    row = {column: _dig(aggregations, path) for column, path in leaf_columns}
+    if child is None:
+        if row:
+            columns.extend(row, 1)
+    else:
+        name, path = child
+        _flatten_buckets(name, _dig(aggregations, path), row, columns)
+
+    return {name: _typed(values) for name, values in columns.columns.items()}
+
+
+# Single-bucket aggregations, whose sub-aggregations flatten_aggregations
+# names with a prefix (see _leaf_paths)
+_PREFIXED_TYPES = _SINGLE_BUCKET_TYPES + (
+    'nested', 'reverse_nested', 'children', 'parent', 'sampler',
+    'diversified_sampler')
+_DATE_HISTOGRAM_TYPES = ('date_histogram', 'auto_date_histogram')
+
+
+def _date_histogram_columns(agg_defs, prefix=''):
+    """Columns of flatten_aggregations that hold date_histogram keys
+
+    :param dict agg_defs: {agg name: definition}
+    :param str prefix: Prefix of the columns at this level, from enclosing
+        single-bucket aggregations
+    :return set: Column names
+    """
+    names = set()
+    for name, agg_def in agg_defs.items():
+        agg_type, options = _split_agg(agg_def)
+        column = prefix + name
+        sub_prefix = ''
+        if agg_type in _DATE_HISTOGRAM_TYPES:
+            names.add(column)
+        elif agg_type == 'composite':
+            for source in options.get('sources', []):
+                for source_name, source_def in source.items():
+                    if 'date_histogram' in source_def:
+                        names.add(source_name)
+        elif agg_type in _PREFIXED_TYPES:
+            sub_prefix = column + '.'
+        names.update(_date_histogram_columns(get_aggs(agg_def), sub_prefix))
+    return names
+
+
+def aggregations_to_dataframe(aggregations, agg_defs=None):
+    """flatten_aggregations, as a pandas DataFrame
+
+    :param dict aggregations: Aggregations part of a response (raw dict, or
+        the Response.aggregations that run_query returns)
+    :param dict agg_defs: The aggs part of the query body.  If given,
+        date_histogram keys (epoch milliseconds) are converted to UTC
+        datetimes
+    :return pandas.DataFrame: One row per innermost bucket
+    """
+    import pandas as pd
+
+    from .TimeUtils import epoch_to_datetime_array
+
+    columns = flatten_aggregations(aggregations)
+    if agg_defs:
+        for name in _date_histogram_columns(agg_defs) & set(columns):
+            columns[name] = epoch_to_datetime_array(columns[name],
+                                                    'millisecond')
+    return pd.DataFrame(columns, copy=False)
@@ -0,0 +1,147 @@
+"""asyncio counterpart of ReportUtils.Reporter.  AsyncReporter keeps all of
+Reporter's synchronous methods, and adds coroutine versions of the query and
+email methods built on opensearch-py's AsyncOpenSearch client, so that a report
+can run many independent queries (per VO, per time window, etc.) concurrently
+from one event loop.  Needs the async extra (pip install
+'gracc-reporting[async]')."""
+
+import abc
+import asyncio
+import functools
+import inspect
+
+from opensearchpy.helpers.response import Response
+
+from . import ClientFactory
+from .ReportUtils import Reporter
+
+__all__ = ['AsyncReporter', 'execute_async']
+
+
+async def execute_async(client, s):
+    """Run a Search object's query on an asyncio client
+
+    :param client: opensearchpy.AsyncOpenSearch client
+    :param Search s: Search object to run.  Its client (using) is ignored
+    :return Response: Response wrapping the results, like Search.execute
+    """
+    raw = await client.search(index=s._index, body=s.to_dict(), **s._params)
+    return Response(s, raw)
+
+
+class AsyncReporter(Reporter, metaclass=abc.ABCMeta):
+    """Base class for reports that query asynchronously.  Takes the same
+    arguments as Reporter.
+
+    Subclasses implement run_report_async (instead of run_report), and query
+    as usual.  They can also override query_async if building the query itself
+    needs to await something.  run_report runs run_report_async in a new event
+    loop, so reports are started the same way as synchronous ones.
+    """
+    def __init__(self, *args, **kwargs):
+        super(AsyncReporter, self).__init__(*args, **kwargs)
+        self.async_client = None
+
+    @abc.abstractmethod
+    async def run_report_async(self):
+        """Coroutine that runs the report.  Must be overridden."""
+        pass
+
+    def run_report(self):
+        """Run run_report_async in a new event loop, closing the asyncio
+        client afterwards"""
+        async def _run():
+            try:
+                await self.run_report_async()
+            finally:
+                await self.aclose()
+
+        asyncio.run(_run())
+
+    async def query_async(self):
+        """Coroutine version of query.  By default, just calls query."""
+        return self.query()
+
+    async def get_async_client(self):
+        """Create the asyncio client on first use, and make sure the cluster
+        is healthy (using the same cached status as the synchronous client)
+
+        :return opensearchpy.AsyncOpenSearch: client
+        """
+        hostname, settings = self._es_client_settings()
+        if hostname is None:
+            hostname = ClientFactory.DEFAULT_HOST
+        if self.async_client is None:
+            self.async_client = ClientFactory.get_async_client(
+                hostname,
+                timeout=settings.get('timeout', ClientFactory.DEFAULT_TIMEOUT),
+                pool_maxsize=settings.get('pool_maxsize',
+                                          ClientFactory.DEFAULT_POOL_MAXSIZE),
+                http_compress=settings.get(
+                    'http_compress', ClientFactory.DEFAULT_HTTP_COMPRESS))
+        await ClientFactory.check_health_async(
+            self.async_client, hostname,
+            ok_statuses=settings.get('ok_statuses',
+                                     ClientFactory.DEFAULT_OK_STATUSES),
+            health_ttl=settings.get('health_ttl',
+                                    ClientFactory.DEFAULT_HEALTH_TTL))
+        return self.async_client
+
+    async def run_query_async(self, overridequery=None):
+        """Coroutine version of run_query.  The query cache and pagination
+        options of run_query aren't supported here.
+
+        :param overridequery: Function or coroutine function to call instead
+            of self.query_async to get the Search object
+        :return Response.aggregations OR ES Search object: Same as run_query
+        """
+        s = overridequery() if overridequery is not None \
+            else self.query_async()
+        if inspect.isawaitable(s):
+            s = await s
+        original = s
+        s = self._apply_filter_path(s)
+
+        self._log_query(s.to_dict())
+
+        try:
+            response = await execute_async(await self.get_async_client(), s)
+            if not response.success():
+                raise Exception("Error accessing Elasticsearch")
+            self._log_response(response.to_dict())
+
+            if hasattr(response, 'aggregations') and response.aggregations:
+                results = response.aggregations
+            else:
+                results = original
+
+            self.logger.info('Ran elasticsearch query successfully')
+            return results
+        except Exception as e:
+            self.logger.exception(e)
+            raise
+
+    async def run_queries_async(self, *overridequeries):
+        """Run several queries concurrently
+
+        :param overridequeries: Functions or coroutine functions that return
+            Search objects
+        :return list: Result of run_query_async for each query, in order
+        """
+        return await asyncio.gather(
+            *(self.run_query_async(q) for q in overridequeries))
+
+    async def send_report_async(self, title=None, successmessage=None):
+        """Coroutine version of send_report.  smtplib is blocking, so the
+        email is sent from the event loop's default thread pool, leaving the
+        loop free for other reports' queries."""
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(
+            None, functools.partial(self.send_report, title=title,
+                                    successmessage=successmessage))
+
+    async def aclose(self):
+        """Close the asyncio client, if it was opened"""
+        if self.async_client is not None:
+            await self.async_client.close()
+            self.async_client = None
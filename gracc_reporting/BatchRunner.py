@@ -0,0 +1,151 @@
+"""Run a batch of reports in one process.  The reports share the imports, the
+parsed config files, the Elasticsearch clients (see ReportUtils) and the SMTP
+sessions (see TextUtils.shared_smtp_sessions), so each report after the first
+only pays for its own queries and emails.  Per-report timings are reported at
+the end.
+
+Batches can be run from python:
+
+    runner = BatchRunner()
+    runner.add(MyReport, config_file='my.toml', start=start, end=end)
+    runner.add(MyOtherReport, config_file='my.toml', start=start, end=end,
+               vo='myvo')
+    runner.run()
+
+or from the command line with a toml batch file:
+
+    python -m gracc_reporting.BatchRunner -b batch.toml
+
+where batch.toml has one [[report]] table per report:
+
+    [[report]]
+        class = 'my_reports.MyReport:MyReport'
+        [report.kwargs]
+            config_file = 'my.toml'
+            start = '2018-08-20 00:00'
+            end = '2018-08-21 00:00'
+"""
+
+import argparse
+import importlib
+import sys
+import time
+import traceback
+from collections import namedtuple
+
+import toml
+
+from . import TextUtils
+
+__all__ = ['BatchRunner', 'BatchResult']
+
+BatchResult = namedtuple('BatchResult',
+                         ['name', 'ok', 'setup_seconds', 'run_seconds', 'error'])
+
+
+class BatchRunner(object):
+    """Runs Reporter subclasses one after another in this process
+
+    :param bool stop_on_error: If True, stop the batch at the first report
+        that raises an exception.  Otherwise, record the error and go on to
+        the next report.
+    """
+    def __init__(self, stop_on_error=False):
+        self.stop_on_error = stop_on_error
+        self.jobs = []
+        self.results = []
+
+    def add(self, report_class, *args, **kwargs):
+        """Add a report to the batch
+
+        :param report_class: Reporter subclass
+        :param args: Positional arguments to instantiate report_class with
+        :param kwargs: Keyword arguments to instantiate report_class with
+        """
+        self.jobs.append((report_class, args, kwargs))
+
+    def run(self):
+        """Run every report in the batch, and print a table of timings
+
+        :return list: BatchResult for each report, in order
+        """
+        self.results = []
+        with TextUtils.shared_smtp_sessions():
+            for report_class, args, kwargs in self.jobs:
+                name = report_class.__name__
+                if kwargs.get('vo') is not None:
+                    name = '{0} ({1})'.format(name, kwargs['vo'])
+
+                setup_seconds = run_seconds = 0.
+                start = time.time()
+                try:
+                    report = report_class(*args, **kwargs)
+                    setup_seconds = time.time() - start
+                    report.run_report()
+                    run_seconds = time.time() - start - setup_seconds
+                except (Exception, SystemExit) as e:
+                    elapsed = time.time() - start
+                    if setup_seconds:
+                        run_seconds = elapsed - setup_seconds
+                    else:
+                        setup_seconds = elapsed
+                    self.results.append(BatchResult(
+                        name, False, setup_seconds, run_seconds,
+                        traceback.format_exc()))
+                    print("Report {0} failed: {1}".format(name, e),
+                          file=sys.stderr)
+                    if self.stop_on_error:
+                        break
+                else:
+                    self.results.append(BatchResult(name, True, setup_seconds,
+                                                    run_seconds, None))
+
+        print(self.timings_table())
+        return self.results
+
+    def timings_table(self):
+        """Format the results of the last run as a text table
+
+        :return str: Table of report name, status, setup and run times
+        """
+        header = ['Report', 'Status', 'Setup (ms)', 'Run (ms)', 'Total (ms)']
+        content = {column: [] for column in header}
+        for result in self.results:
+            content['Report'].append(result.name)
+            content['Status'].append('OK' if result.ok else 'FAILED')
+            content['Setup (ms)'].append(result.setup_seconds * 1000)
+            content['Run (ms)'].append(result.run_seconds * 1000)
+            content['Total (ms)'].append(
+                (result.setup_seconds + result.run_seconds) * 1000)
+        return TextUtils.TextUtils(header).printAsTextTable('text', content)
+
+
+def _import_class(path):
+    """Import a class given as 'package.module:ClassName'"""
+    module_name, _, class_name = path.partition(':')
+    return getattr(importlib.import_module(module_name), class_name)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a batch of reports in "
+                                                 "one process")
+    parser.add_argument("-b", "--batch", dest="batch", required=True,
+                        help="toml file listing the reports to run")
+    parser.add_argument("-x", "--stop-on-error", dest="stop_on_error",
+                        action="store_true", default=False,
+                        help="stop at the first report that fails")
+    args = parser.parse_args()
+
+    with open(args.batch, 'r') as f:
+        batch = toml.loads(f.read())
+
+    runner = BatchRunner(stop_on_error=args.stop_on_error)
+    for entry in batch.get('report', []):
+        runner.add(_import_class(entry['class']), **entry.get('kwargs', {}))
+
+    results = runner.run()
+    sys.exit(0 if all(result.ok for result in results) else 1)
+
+
+if __name__ == '__main__':
+    main()
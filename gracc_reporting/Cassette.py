@@ -0,0 +1,175 @@
+"""Record and replay the Elasticsearch requests of a report, so it can be
+rerun (profiled, tuned, benchmarked) without GRACC.
+
+Run a report with --record FILE, and every request the client makes
+(method, url with the index, params and body) is saved in the cassette FILE
+with the response.  Run it again with --replay FILE, and the client is given
+a stand-in transport that answers each request from the cassette instead of
+the network, after an optional simulated latency (--replay-latency).
+
+A cassette is a gzip-compressed file with one JSON object per line (one per
+request).  Identical requests are answered with their recorded responses in
+order, repeating the last one.  Errors (HTTP status >= 400) are recorded
+too, and replayed as the same exception.
+"""
+
+import gzip
+import json
+import threading
+import time
+from collections import defaultdict
+
+from opensearchpy import Transport
+from opensearchpy.exceptions import HTTP_EXCEPTIONS, TransportError
+
+from .ClientFactory import HealthCheckedTransport
+
+__all__ = ['Cassette', 'RecordingTransport', 'ReplayTransport',
+           'CassetteMissError']
+
+# Request params that don't change the response
+_IGNORED_PARAMS = ('request_timeout', 'ignore')
+
+
+class CassetteMissError(KeyError):
+    """Raised when a request being replayed isn't in the cassette"""
+    pass
+
+
+def _plain(value):
+    """value as it is after a trip through JSON"""
+    return json.loads(json.dumps(value, default=str))
+
+
+def _canonical(value):
+    return json.dumps(value, sort_keys=True, default=str)
+
+
+def _request(method, url, params, body):
+    """The request as it's saved in a cassette"""
+    params = {key: value for key, value in (params or {}).items()
+              if key not in _IGNORED_PARAMS}
+    if isinstance(body, bytes):
+        body = body.decode('utf-8')
+    return {'method': method, 'url': url, 'params': _plain(params),
+            'body': _plain(body)}
+
+
+def _key(request):
+    return (request['method'], request['url'], _canonical(request['params']),
+            _canonical(request['body']))
+
+
+class Cassette(object):
+    """Recorded requests and responses, in a file
+
+    :param str path: Cassette file.  Loaded if it exists
+    """
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        # {request key: [interactions]}, and how many of each were replayed
+        self._interactions = defaultdict(list)
+        self._played = defaultdict(int)
+        try:
+            with gzip.open(path, 'rt') as f:
+                for line in f:
+                    interaction = json.loads(line)
+                    self._interactions[_key(interaction['request'])].append(
+                        interaction)
+        except FileNotFoundError:
+            pass
+
+    def __len__(self):
+        return sum(len(v) for v in self._interactions.values())
+
+    def record(self, method, url, params, body, response=None, error=None):
+        """Save a request and its response (or the TransportError it raised)
+        to the cassette file"""
+        interaction = {'request': _request(method, url, params, body)}
+        if error is not None:
+            interaction['error'] = {'status': error.status_code,
+                                    'message': _plain(error.error),
+                                    'info': _plain(error.info)}
+        else:
+            interaction['response'] = _plain(response)
+        line = json.dumps(interaction, sort_keys=True) + '\n'
+        with self._lock:
+            self._interactions[_key(interaction['request'])].append(
+                interaction)
+            # Each write is its own gzip member, so the file is always
+            # complete, even if the report dies
+            with gzip.open(self.path, 'at') as f:
+                f.write(line)
+
+    def play(self, method, url, params, body):
+        """The recorded response to a request
+
+        :raise CassetteMissError: If it wasn't recorded
+        :raise TransportError: If that's what the request raised when it was
+            recorded
+        """
+        request = _request(method, url, params, body)
+        key = _key(request)
+        with self._lock:
+            interactions = self._interactions.get(key)
+            if not interactions:
+                raise CassetteMissError(
+                    "{0} {1} with body {2} isn't in the cassette "
+                    "{3}".format(method, url, _canonical(request['body']),
+                                 self.path))
+            played = self._played[key]
+            self._played[key] = played + 1
+        interaction = interactions[min(played, len(interactions) - 1)]
+
+        if 'error' in interaction:
+            error = interaction['error']
+            raise HTTP_EXCEPTIONS.get(error['status'], TransportError)(
+                error['status'], error['message'], error['info'])
+        return _plain(interaction['response'])
+
+
+class RecordingTransport(HealthCheckedTransport):
+    """HealthCheckedTransport that saves every request and its response in
+    a cassette
+
+    :param Cassette cassette: Cassette to record into
+    """
+    def __init__(self, hosts, cassette=None, **kwargs):
+        super(RecordingTransport, self).__init__(hosts, **kwargs)
+        self.cassette = cassette
+
+    def perform_request(self, method, url, params=None, body=None, *args,
+                        **kwargs):
+        try:
+            response = super(RecordingTransport, self).perform_request(
+                method, url, params, body, *args, **kwargs)
+        except TransportError as e:
+            if isinstance(e.status_code, int):  # Not a connection error
+                self.cassette.record(method, url, params, body, error=e)
+            raise
+        self.cassette.record(method, url, params, body, response)
+        return response
+
+
+class ReplayTransport(Transport):
+    """Transport that answers requests from a cassette, without touching the
+    network.  The cluster health check requests made when recording are
+    answered from the cassette too.
+
+    :param Cassette cassette: Cassette to replay
+    :param float latency: Seconds to wait before answering each request
+    """
+    def __init__(self, hosts, cassette=None, latency=0., **kwargs):
+        # Settings only the real transport understands
+        for key in ('ok_statuses', 'health_ttl', 'health_key'):
+            kwargs.pop(key, None)
+        super(ReplayTransport, self).__init__(hosts, **kwargs)
+        self.cassette = cassette
+        self.latency = latency
+
+    def perform_request(self, method, url, params=None, body=None, *args,
+                        **kwargs):
+        if self.latency:
+            time.sleep(self.latency)
+        return self.cassette.play(method, url, params, body)
@@ -0,0 +1,278 @@
+"""Process-wide factory for the Elasticsearch (OpenSearch) clients used by
+gracc-reporting.  Clients are shared by every Reporter in the process that
+talks to the same host with the same settings, so they share one connection
+pool (and its kept-alive connections).  Creating a client doesn't touch the
+network: the cluster health check runs right before the client's first
+request, and its result is cached per host for health_ttl seconds."""
+
+import threading
+import time
+
+from opensearchpy import OpenSearch, Transport
+from opensearchpy.exceptions import SerializationError
+from opensearchpy.serializer import JSONSerializer
+
+from . import Timing
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+DEFAULT_HOST = 'https://gracc.opensciencegrid.org/q'
+DEFAULT_OK_STATUSES = ['green', 'yellow']
+DEFAULT_TIMEOUT = 60
+DEFAULT_POOL_MAXSIZE = 10
+DEFAULT_HEALTH_TTL = 300    # seconds
+# gzip request bodies, and ask for gzipped responses
+DEFAULT_HTTP_COMPRESS = True
+
+# {hostname: (time checked, status)}
+_health_cache = {}
+# {(hostname, settings...): OpenSearch}
+_clients = {}
+# {path: Cassette}
+_cassettes = {}
+_lock = threading.Lock()
+
+
+class UnhealthyClusterError(Exception):
+    pass
+
+
+class FastJSONSerializer(JSONSerializer):
+    """JSONSerializer that uses orjson, if it's installed, which encodes and
+    decodes large aggregation responses several times faster than the json
+    module.  Without orjson, it's the same as JSONSerializer."""
+    if orjson is not None:
+        _OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+    def loads(self, s):
+        if orjson is None:
+            return super(FastJSONSerializer, self).loads(s)
+        try:
+            return orjson.loads(s)
+        except (ValueError, TypeError) as e:
+            raise SerializationError(s, e)
+
+    def dumps(self, data):
+        if orjson is None or isinstance(data, str):
+            return super(FastJSONSerializer, self).dumps(data)
+        try:
+            return orjson.dumps(data, default=self.default,
+                                option=self._OPTIONS).decode('utf-8')
+        except TypeError:
+            # e.g. integers too big for orjson.  json can handle those
+            return super(FastJSONSerializer, self).dumps(data)
+
+
+class TimedJSONSerializer(FastJSONSerializer):
+    """JSONSerializer that records serialize and deserialize spans (with
+    bytes_out and bytes_in) in the active Timings (see Timing), so the time
+    a request spends decoding the response can be told apart from the time
+    on the wire"""
+    def loads(self, s):
+        with Timing.span('deserialize', bytes_in=len(s)):
+            return super(TimedJSONSerializer, self).loads(s)
+
+    def dumps(self, data):
+        with Timing.span('serialize') as record:
+            result = super(TimedJSONSerializer, self).dumps(data)
+            record['bytes_out'] = len(result)
+        return result
+
+
+class HealthCheckedTransport(Transport):
+    """Transport that makes sure the cluster status is one of ok_statuses
+    before sending any request.  The status is cached per host for health_ttl
+    seconds.
+
+    :param list ok_statuses: Cluster statuses we're OK querying
+    :param int health_ttl: Seconds to cache the cluster status for
+    :param str health_key: Key to cache the cluster status under (hostname)
+    """
+    def __init__(self, hosts, ok_statuses=DEFAULT_OK_STATUSES,
+                 health_ttl=DEFAULT_HEALTH_TTL, health_key=None, **kwargs):
+        super(HealthCheckedTransport, self).__init__(hosts, **kwargs)
+        self.ok_statuses = ok_statuses
+        self.health_ttl = health_ttl
+        self.health_key = health_key if health_key is not None else repr(hosts)
+        self._in_health_check = threading.local()
+
+    def perform_request(self, method, url, *args, **kwargs):
+        if not getattr(self._in_health_check, 'active', False):
+            self.check_health()
+        return super(HealthCheckedTransport, self).perform_request(
+            method, url, *args, **kwargs)
+
+    def cluster_status(self):
+        """Return the cluster status, from the cache if it's recent enough
+
+        :return str: Cluster status (green, yellow, red)
+        """
+        cached = _health_cache.get(self.health_key)
+        if cached is not None and time.time() - cached[0] < self.health_ttl:
+            return cached[1]
+
+        self._in_health_check.active = True
+        try:
+            status = self.perform_request('GET', '/_cat/health',
+                                          params={'h': 'status'}).strip()
+        finally:
+            self._in_health_check.active = False
+        _health_cache[self.health_key] = (time.time(), status)
+        return status
+
+    def check_health(self):
+        """Raise UnhealthyClusterError if the cluster status isn't OK"""
+        status = self.cluster_status()
+        if status not in self.ok_statuses:
+            raise UnhealthyClusterError(
+                "Cluster at {0} has status {1}.  Allowed statuses are "
+                "{2}".format(self.health_key, status,
+                             ', '.join(self.ok_statuses)))
+
+
+def get_client(hostname=DEFAULT_HOST, ok_statuses=DEFAULT_OK_STATUSES,
+               timeout=DEFAULT_TIMEOUT, pool_maxsize=DEFAULT_POOL_MAXSIZE,
+               health_ttl=DEFAULT_HEALTH_TTL,
+               http_compress=DEFAULT_HTTP_COMPRESS, hedge_hosts=None,
+               hedge_percentile=None, hedge_delay=None, record=None,
+               replay=None, replay_latency=0., **client_kwargs):
+    """Return the shared client for hostname and these settings, creating it
+    if needed.  No network requests are made here.
+
+    :param str hostname: URL of the Elasticsearch host
+    :param list ok_statuses: Cluster statuses we're OK querying
+    :param int timeout: Request timeout in seconds
+    :param int pool_maxsize: Maximum number of connections kept open to the
+        host (set this to at least the number of threads querying at once)
+    :param int health_ttl: Seconds to cache the cluster status for
+    :param bool http_compress: gzip request bodies and ask the host for
+        gzipped responses.  Aggregation responses are mostly repeated keys,
+        so they compress to a small fraction of their size
+    :param list hedge_hosts: URLs of other hosts to send searches to if
+        hostname is slow to answer (see Hedging).  Ignored when recording or
+        replaying
+    :param float hedge_percentile: Percentile of hostname's recent
+        latencies to wait for before hedging (default
+        Hedging.DEFAULT_PERCENTILE)
+    :param float hedge_delay: Seconds to wait before hedging until there
+        are enough latencies (default Hedging.DEFAULT_DELAY)
+    :param str record: Cassette file to record every request and response
+        in (see Cassette)
+    :param str replay: Cassette file to answer requests from, instead of
+        the host
+    :param float replay_latency: Seconds to wait before answering each
+        replayed request
+    :param client_kwargs: Other keyword arguments for opensearchpy.OpenSearch
+    :return opensearchpy.OpenSearch: client
+    """
+    key = (hostname, tuple(ok_statuses), timeout, pool_maxsize, health_ttl,
+           http_compress, tuple(hedge_hosts or ()), hedge_percentile,
+           hedge_delay, record, replay, replay_latency,
+           tuple(sorted((k, repr(v)) for k, v in client_kwargs.items())))
+
+    with _lock:
+        if key not in _clients:
+            client_kwargs.setdefault('verify_certs', False)
+            # Records (de)serialization time in the active report's timings
+            client_kwargs.setdefault('serializer', TimedJSONSerializer())
+            transport_class = HealthCheckedTransport
+            if record is not None or replay is not None:
+                from . import Cassette
+                if replay is not None:
+                    transport_class = Cassette.ReplayTransport
+                    client_kwargs['cassette'] = _get_cassette(replay)
+                    client_kwargs['latency'] = replay_latency
+                else:
+                    transport_class = Cassette.RecordingTransport
+                    client_kwargs['cassette'] = _get_cassette(record)
+            elif hedge_hosts:
+                from . import Hedging
+                transport_class = Hedging.HedgedTransport
+                client_kwargs['hedge_hosts'] = list(hedge_hosts)
+                if hedge_percentile is not None:
+                    client_kwargs['hedge_percentile'] = hedge_percentile
+                if hedge_delay is not None:
+                    client_kwargs['hedge_delay'] = hedge_delay
+            _clients[key] = OpenSearch(hostname,
+                                       timeout=timeout,
+                                       pool_maxsize=pool_maxsize,
+                                       http_compress=http_compress,
+                                       transport_class=transport_class,
+                                       ok_statuses=list(ok_statuses),
+                                       health_ttl=health_ttl,
+                                       health_key=hostname,
+                                       **client_kwargs)
+        return _clients[key]
+
+
+def _get_cassette(path):
+    """The shared Cassette for path, so clients recording to (or replaying)
+    the same file use the same one"""
+    from .Cassette import Cassette
+    if path not in _cassettes:
+        _cassettes[path] = Cassette(path)
+    return _cassettes[path]
+
+
+def clear():
+    """Forget all of the shared clients, cassettes and cached cluster
+    statuses"""
+    with _lock:
+        _clients.clear()
+        _cassettes.clear()
+        _health_cache.clear()
+
+
+def get_async_client(hostname=DEFAULT_HOST, timeout=DEFAULT_TIMEOUT,
+                     pool_maxsize=DEFAULT_POOL_MAXSIZE,
+                     http_compress=DEFAULT_HTTP_COMPRESS, **client_kwargs):
+    """Create an asyncio client for hostname.  Unlike get_client, these
+    aren't shared, since each one belongs to the event loop it's used in.
+    Needs opensearch-py's async extra (aiohttp).  Close it with
+    await client.close()
+
+    :param str hostname: URL of the Elasticsearch host
+    :param int timeout: Request timeout in seconds
+    :param int pool_maxsize: Maximum number of connections kept open to the
+        host
+    :param bool http_compress: gzip requests and responses
+    :param client_kwargs: Other keyword arguments for
+        opensearchpy.AsyncOpenSearch
+    :return opensearchpy.AsyncOpenSearch: client
+    """
+    try:
+        from opensearchpy import AsyncOpenSearch
+    except ImportError:
+        raise ImportError("The asyncio client needs aiohttp.  Install it with "
+                          "pip install 'gracc-reporting[async]'")
+
+    client_kwargs.setdefault('verify_certs', False)
+    client_kwargs.setdefault('serializer', FastJSONSerializer())
+    return AsyncOpenSearch(hostname, timeout=timeout, maxsize=pool_maxsize,
+                           http_compress=http_compress, **client_kwargs)
+
+
+async def check_health_async(client, hostname, ok_statuses=DEFAULT_OK_STATUSES,
+                             health_ttl=DEFAULT_HEALTH_TTL):
+    """asyncio version of HealthCheckedTransport.check_health, sharing the
+    same per-host status cache
+
+    :param client: opensearchpy.AsyncOpenSearch client
+    :param str hostname: Host the client connects to
+    :param list ok_statuses: Cluster statuses we're OK querying
+    :param int health_ttl: Seconds to cache the cluster status for
+    """
+    cached = _health_cache.get(hostname)
+    if cached is not None and time.time() - cached[0] < health_ttl:
+        status = cached[1]
+    else:
+        status = (await client.cat.health(h='status')).strip()
+        _health_cache[hostname] = (time.time(), status)
+
+    if status not in ok_statuses:
+        raise UnhealthyClusterError(
+            "Cluster at {0} has status {1}.  Allowed statuses are "
+            "{2}".format(hostname, status, ', '.join(ok_statuses)))
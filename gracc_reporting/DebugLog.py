@@ -0,0 +1,118 @@
+"""Debug logging of query and response bodies.  LazyJSON formats a body only
+when a log handler actually emits it, and caps how much of it is formatted:
+long lists (aggregation buckets, mostly) are sampled down to their first
+max_items, and the text is cut off at max_chars.  DumpFile streams whole
+bodies to a gzipped side file instead, for when the full response is
+needed."""
+
+import gzip
+import json
+import threading
+import time
+
+DEFAULT_MAX_CHARS = 10000
+DEFAULT_MAX_ITEMS = 20
+
+
+def _sample(obj, max_items):
+    """Copy of obj with every list cut down to its first max_items, plus a
+    note of how many were left out"""
+    if isinstance(obj, dict):
+        return {key: _sample(value, max_items) for key, value in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        sampled = [_sample(value, max_items) for value in obj[:max_items]]
+        if len(obj) > max_items:
+            sampled.append('... {0} more'.format(len(obj) - max_items))
+        return sampled
+    return obj
+
+
+def format_json(obj, max_chars=DEFAULT_MAX_CHARS,
+                max_items=DEFAULT_MAX_ITEMS, indent=None):
+    """Format obj as JSON, within limits
+
+    :param obj: Query or response body
+    :param int max_chars: Cut the text off after this many characters.  0
+        means no limit
+    :param int max_items: Only format the first max_items of each list.  0
+        means no limit
+    :param int indent: Indent for pretty-printing, or None for one line
+    :return str: JSON text
+    """
+    if max_items:
+        obj = _sample(obj, max_items)
+    encoder = json.JSONEncoder(sort_keys=True, indent=indent, default=str)
+    if not max_chars:
+        return encoder.encode(obj)
+
+    chunks = []
+    size = 0
+    for chunk in encoder.iterencode(obj):
+        chunks.append(chunk)
+        size += len(chunk)
+        if size > max_chars:
+            return ''.join(chunks)[:max_chars] + \
+                ' ... (truncated at {0} characters)'.format(max_chars)
+    return ''.join(chunks)
+
+
+class LazyJSON(object):
+    """Log message argument that is formatted with format_json only when
+    it's turned into a string, so bodies logged at a level no handler
+    emits are never serialized:
+
+        logger.debug('Query: %s', LazyJSON(body))
+
+    Arguments are the same as format_json.
+    """
+    def __init__(self, obj, max_chars=DEFAULT_MAX_CHARS,
+                 max_items=DEFAULT_MAX_ITEMS, indent=None):
+        self.obj = obj
+        self.max_chars = max_chars
+        self.max_items = max_items
+        self.indent = indent
+        self._text = None
+
+    def __str__(self):
+        # Several handlers can format the same record
+        if self._text is None:
+            self._text = format_json(self.obj, self.max_chars,
+                                     self.max_items, self.indent)
+        return self._text
+
+
+class DumpFile(object):
+    """Whole request and response bodies, appended to a gzipped JSON lines
+    file.  Each body is streamed into the file as it's encoded, so it's never
+    held in memory as one string.  Each line is {"kind": ..., "time": ...,
+    <labels>, "body": ...}
+
+    :param str path: File to append to
+    """
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def write(self, kind, body, **labels):
+        """Append a body
+
+        :param str kind: What the body is (query, response, etc.)
+        :param body: Request or response body
+        :param labels: Other fields for the line (report, vo, etc.)
+        """
+        labels.update(kind=kind, time=time.time())
+        with self._lock, gzip.open(self.path, 'at', encoding='utf-8') as f:
+            f.write('{')
+            for key, value in sorted(labels.items()):
+                f.write('{0}: {1}, '.format(json.dumps(key),
+                                            json.dumps(value, default=str)))
+            f.write('"body": ')
+            json.dump(body, f, sort_keys=True, default=str)
+            f.write('}\n')
+
+
+def iter_dump(path):
+    """Generator of the lines of a DumpFile, as dicts"""
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        for line in f:
+            yield json.loads(line)
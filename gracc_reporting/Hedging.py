@@ -0,0 +1,181 @@
+"""Hedged requests.  Searches go to the primary host first, and if there's
+no answer within a delay based on how long the primary usually takes (its
+95th percentile latency, by default), the same request goes to the next
+host, and so on.  The first answer is used and the others are abandoned, so
+one slow coordinating node no longer sets the tail latency of every
+report."""
+
+import math
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, wait
+
+from opensearchpy.client.utils import _normalize_hosts
+from opensearchpy.exceptions import ConnectionError, TransportError
+
+from .Adaptive import is_too_big
+from .ClientFactory import HealthCheckedTransport, UnhealthyClusterError
+
+DEFAULT_PERCENTILE = 95
+# Seconds to wait before hedging until there are MIN_SAMPLES latencies
+DEFAULT_DELAY = 5.
+# Never hedge sooner than this many seconds
+MIN_DELAY = 0.05
+MIN_SAMPLES = 10
+HISTORY = 200
+
+# Requests that are safe to send twice
+_HEDGED_ENDPOINTS = ('_search', '_msearch', '_count')
+
+
+def _is_read(method, url):
+    if method in ('GET', 'HEAD'):
+        return True
+    return method == 'POST' and \
+        url.rstrip('/').rsplit('/', 1)[-1] in _HEDGED_ENDPOINTS
+
+
+def _fails_over(error):
+    """Whether a request that raised error should be sent to the next host.
+    Only errors of the host are: connection errors and timeouts, unhealthy
+    clusters and 5xx responses.  Errors of the request itself (4xx, and
+    requests that are too big, which run_query_adaptive splits) would just
+    fail again on every host.
+
+    :param Exception error: Raised by a host
+    :return bool: True to fail over
+    """
+    if isinstance(error, (ConnectionError, UnhealthyClusterError)):
+        return True
+    if isinstance(error, TransportError):
+        return isinstance(error.status_code, int) and \
+            error.status_code >= 500 and not is_too_big(error)
+    return False
+
+
+def _start(func):
+    """Run func on a daemon thread, so abandoned requests don't keep the
+    report from exiting
+
+    :return Future: func's result
+    """
+    future = Future()
+
+    def run():
+        if not future.set_running_or_notify_cancel():
+            return
+        try:
+            future.set_result(func())
+        except BaseException as e:
+            future.set_exception(e)
+
+    threading.Thread(target=run, daemon=True).start()
+    return future
+
+
+class HedgedTransport(HealthCheckedTransport):
+    """HealthCheckedTransport for the primary host that hedges read requests
+    (searches, GETs) to hedge_hosts
+
+    :param list hedge_hosts: URLs of the hosts to hedge to, in order
+    :param float hedge_percentile: Hedge once a request has taken longer
+        than this percentile of the primary host's recent latencies for the
+        same kind of request
+    :param float hedge_delay: Seconds to wait before hedging until enough
+        latencies have been seen
+    """
+    def __init__(self, hosts, hedge_hosts=(),
+                 hedge_percentile=DEFAULT_PERCENTILE,
+                 hedge_delay=DEFAULT_DELAY, **kwargs):
+        super(HedgedTransport, self).__init__(hosts, **kwargs)
+        kwargs.pop('health_key', None)
+        self.hedges = [HealthCheckedTransport(_normalize_hosts(host),
+                                              health_key=host, **kwargs)
+                       for host in hedge_hosts]
+        self.hedge_percentile = hedge_percentile
+        self.hedge_delay = hedge_delay
+        self.stats = {'requests': 0, 'hedged': 0, 'hedge_wins': 0}
+        # {endpoint: recent primary latencies}
+        self._latencies = {}
+        self._stats_lock = threading.Lock()
+
+    def delay_for(self, url):
+        """Seconds to wait for the primary before hedging a request to url
+
+        :param str url: Request path
+        :return float: Delay
+        """
+        endpoint = url.rstrip('/').rsplit('/', 1)[-1]
+        with self._stats_lock:
+            samples = sorted(self._latencies.get(endpoint, ()))
+        if len(samples) < MIN_SAMPLES:
+            return self.hedge_delay
+        rank = int(math.ceil(self.hedge_percentile / 100. * len(samples)))
+        return max(samples[min(max(rank, 1), len(samples)) - 1], MIN_DELAY)
+
+    def _record_latency(self, url, seconds):
+        endpoint = url.rstrip('/').rsplit('/', 1)[-1]
+        with self._stats_lock:
+            self._latencies.setdefault(endpoint, deque(maxlen=HISTORY)) \
+                .append(seconds)
+
+    def _send_to(self, i, method, url, *args, **kwargs):
+        """Send the request to the primary (i = 0) or hedge host i - 1"""
+        if i == 0:
+            start = time.perf_counter()
+            result = super(HedgedTransport, self).perform_request(
+                method, url, *args, **kwargs)
+            self._record_latency(url, time.perf_counter() - start)
+            return result
+        return self.hedges[i - 1].perform_request(method, url, *args,
+                                                  **kwargs)
+
+    def perform_request(self, method, url, *args, **kwargs):
+        if not self.hedges or not _is_read(method, url) or \
+                getattr(self._in_health_check, 'active', False):
+            return super(HedgedTransport, self).perform_request(
+                method, url, *args, **kwargs)
+
+        n_hosts = len(self.hedges) + 1
+        futures = {}
+
+        def send(i):
+            future = _start(lambda: self._send_to(i, method, url, *args,
+                                                  **kwargs))
+            futures[future] = i
+            return future
+
+        delay = self.delay_for(url)
+        pending = {send(0)}
+        errors = []
+        try:
+            while pending:
+                hedge_left = len(futures) < n_hosts
+                done, pending = wait(pending,
+                                     timeout=delay if hedge_left else None,
+                                     return_when=FIRST_COMPLETED)
+                for future in done:
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        if not _fails_over(e):
+                            raise
+                        errors.append((futures[future], e))
+                        continue
+                    if futures[future] > 0:
+                        with self._stats_lock:
+                            self.stats['hedge_wins'] += 1
+                    return result
+                # Slow (nothing done) or failed (nothing left): next host
+                if hedge_left and (not done or not pending):
+                    pending.add(send(len(futures)))
+            # Every host failed.  Raise the primary's error
+            raise min(errors, key=lambda error: error[0])[1]
+        finally:
+            for future in futures:
+                future.cancel()
+            with self._stats_lock:
+                self.stats['requests'] += 1
+                if len(futures) > 1:
+                    self.stats['hedged'] += 1
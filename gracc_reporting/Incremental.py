@@ -0,0 +1,91 @@
+"""Incremental aggregation queries.  The report range is split into UTC days,
+and each day's partial aggregation results are kept in a local store once the
+day can't change anymore.  Later runs over overlapping ranges (rolling weekly
+or monthly reports, for example) only query the days that aren't in the store
+yet, or that might still be getting records, and merge all of the partials."""
+
+import os
+from datetime import datetime, timedelta
+
+from dateutil import tz
+
+from . import TimeSlice
+from . import TimeUtils
+from .QueryCache import QueryCache, DEFAULT_CACHE_DIR
+
+DEFAULT_STORE_DIR = os.path.join(DEFAULT_CACHE_DIR, 'partials')
+DEFAULT_STORE_MAX_BYTES = 1024 * 1024 * 1024
+DEFAULT_MUTABLE_DAYS = 2
+
+_PARTIAL_KEYS = ('took', 'timed_out', '_shards', 'aggregations')
+
+
+def partial_from_response(response):
+    """Keep only the parts of a raw response needed to merge it later
+
+    :param dict response: Raw response for one day
+    :return dict: Partial result
+    """
+    partial = {key: response[key] for key in _PARTIAL_KEYS if key in response}
+    partial['hits'] = {'total': response.get('hits', {}).get('total', 0),
+                       'hits': []}
+    return partial
+
+
+def run_incremental(client, body, start, end, index_for_window, store, host,
+                    mutable_after=None, time_field=TimeSlice.DEFAULT_TIME_FIELD,
+                    max_workers=TimeSlice.DEFAULT_MAX_WORKERS, **search_kwargs):
+    """Run body over [start, end) one UTC day at a time, using the stored
+    partial results for days that have them, and merge the results of all the
+    days
+
+    :param client: opensearchpy.OpenSearch client
+    :param dict body: Query body (Search.to_dict())
+    :param datetime start: tz-aware UTC start of the range
+    :param datetime end: tz-aware UTC end of the range
+    :param function index_for_window: Called with (start, end), returns the
+        index pattern to query for that day
+    :param QueryCache store: Store of per-day partial results
+    :param str host: Host the query runs against (part of the partial keys,
+        as are the query and any filter_path)
+    :param datetime mutable_after: Days that end after this time can still
+        change, so they're always queried and never stored.  Defaults to
+        DEFAULT_MUTABLE_DAYS days ago
+    :param str time_field: Name of the field the range filter is on
+    :param int max_workers: Number of days to query at once
+    :param search_kwargs: Extra keyword arguments for client.search
+    :return tuple: (combined raw response, number of days queried)
+    """
+    if mutable_after is None:
+        mutable_after = datetime.now(tz.tzutc()) - \
+            timedelta(days=DEFAULT_MUTABLE_DAYS)
+
+    windows = TimeUtils.split_time_range(start, end, 'day')
+    keys = [None] * len(windows)
+    partials = [None] * len(windows)
+
+    for i, (window_start, window_end) in enumerate(windows):
+        if window_end > mutable_after:
+            continue
+        key_body = TimeSlice.retime_body(body, window_start, window_end,
+                                         time_field)
+        if search_kwargs.get('filter_path'):
+            # The same query with a different filter_path stores different
+            # partials
+            key_body = dict(key_body, filter_path=search_kwargs['filter_path'])
+        keys[i] = QueryCache.make_key(
+            key_body, index_for_window(window_start, window_end), host)
+        partials[i] = store.get(keys[i])
+
+    missing = [i for i, partial in enumerate(partials) if partial is None]
+    responses = TimeSlice.run_windows(client, body,
+                                      [windows[i] for i in missing],
+                                      index_for_window, time_field=time_field,
+                                      max_workers=max_workers, **search_kwargs)
+
+    for i, response in zip(missing, responses):
+        partials[i] = partial_from_response(response)
+        if keys[i] is not None:
+            store.put(keys[i], partials[i])
+
+    return TimeSlice.combine_responses(body, partials), len(missing)
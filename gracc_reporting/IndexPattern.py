@@ -1,8 +1,30 @@
 """Generate gracc-reporting index patterns"""
 
-from datetime import datetime
+import re
+import time
+from datetime import datetime, timedelta
+from fnmatch import fnmatch
 
-def indexpattern_generate(pattern=None, start=None, end=None):
+from .TimeUtils import next_window_start
+
+# strftime directives, grouped by the calendar unit they change with
+_DIRECTIVE_UNITS = {
+    'year': 'YyGC',
+    'month': 'mbBh',
+    'day': 'dejaAwuUWVx',
+    'hour': 'HIpkl',
+}
+_UNITS_COARSE_TO_FINE = ('year', 'month', 'day', 'hour')
+_DIRECTIVE_RE = re.compile(r'%-?(.)')
+
+EXISTING_INDICES_TTL = 600      # seconds
+
+# Cache of _cat/indices listings.  {(hosts, prefix): (time, [indices])}
+_existing_indices_cache = {}
+
+
+def indexpattern_generate(pattern=None, start=None, end=None, exact=False,
+                          existing=None):
     """Function to return the proper index pattern for queries to
     elasticsearch on gracc.opensciencegrid.org.  This improves performance by
     not just using a general index pattern unless absolutely necessary.
@@ -18,6 +40,11 @@ def indexpattern_generate(pattern=None, start=None, end=None):
         python's time format conventions
     :param datetime start: Start time
     :param datetime end: End time
+    :param bool exact: If True, and start and end fall in different indices,
+        list the indices in the range (see exact_indexpattern) instead of
+        using the common prefix of the start and end indices
+    :param list existing: Only used if exact is True.  Index names that
+        exist on the cluster.  Indices not in this list are left out.
     :return str: Index Pattern to pass to Elasticsearch
     """
     if pattern is None:
@@ -44,14 +71,181 @@ def indexpattern_generate(pattern=None, start=None, end=None):
 
     if test_indices[0] == test_indices[1]:
         return test_indices[0]
-    else:
-        # Construct the index pattern by comparing the two test indices one
-        # character at a time.  Stop when they don't match anymore
-        index_pattern_common = ''
-        for tup in zip(*test_indices):
-            if tup[0] == tup[1]:
-                index_pattern_common += tup[0]
-            else:
-                break
-        return '{0}*'.format(index_pattern_common)
-    
\ No newline at end of file
+    elif exact:
+        # If none of the indices exist, fall through to the wildcard, which
+        # will just return no results
+        exact_pattern = exact_indexpattern(pattern, start, end, existing)
+        if exact_pattern:
+            return exact_pattern
+
+    # Construct the index pattern by comparing the two test indices one
+    # character at a time.  Stop when they don't match anymore
+    index_pattern_common = ''
+    for tup in zip(*test_indices):
+        if tup[0] == tup[1]:
+            index_pattern_common += tup[0]
+        else:
+            break
+    return '{0}*'.format(index_pattern_common)
+    
+
+
+def _pattern_units(pattern):
+    """Return the calendar unit of each strftime directive in pattern
+
+    :param str pattern: strftime index pattern
+    :return list: (position in pattern, unit) tuples, in pattern order
+    """
+    units = []
+    for match in _DIRECTIVE_RE.finditer(pattern):
+        for unit, directives in _DIRECTIVE_UNITS.items():
+            if match.group(1) in directives:
+                units.append((match.start(), unit))
+    return units
+
+
+def _finest_unit(pattern):
+    """Return the finest calendar unit in pattern, or None"""
+    units = [unit for _, unit in _pattern_units(pattern)]
+    if not units:
+        return None
+    return max(units, key=_UNITS_COARSE_TO_FINE.index)
+
+
+def _group_prefix(pattern, unit):
+    """Return the part of pattern before its first directive finer than unit,
+    if that part pins down a single period of unit (it has directives for
+    unit and every coarser unit).  Rendering this prefix and adding a
+    wildcard matches exactly the indices of that period.
+
+    :param str pattern: strftime index pattern
+    :param str unit: 'year', 'month' or 'day'
+    :return str: Prefix pattern, or None if there isn't a tight one
+    """
+    level = _UNITS_COARSE_TO_FINE.index(unit)
+    end = len(pattern)
+    for position, directive_unit in _pattern_units(pattern):
+        if _UNITS_COARSE_TO_FINE.index(directive_unit) > level:
+            end = position
+            break
+    prefix = pattern[:end]
+    prefix_units = set(u for _, u in _pattern_units(prefix))
+    if all(u in prefix_units for u in _UNITS_COARSE_TO_FINE[:level + 1]):
+        return prefix
+    return None
+
+
+def _period_start(timestamp, unit):
+    """Return the start of the calendar period of unit containing timestamp"""
+    if unit == 'year':
+        timestamp = timestamp.replace(month=1, day=1)
+    elif unit == 'month':
+        timestamp = timestamp.replace(day=1)
+    return timestamp.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def enumerate_indices(pattern, start, end):
+    """List every index that a date-dependent pattern renders to between start
+    and end (both inclusive), in order
+
+    :param str pattern: strftime index pattern, e.g. 'gracc.osg.raw-%Y.%m'
+    :param datetime start: Start time
+    :param datetime end: End time
+    :return list: Index names
+    """
+    step = _finest_unit(pattern)
+    if step is None:
+        return [pattern]
+
+    indices = []
+    timestamp = start
+    while True:
+        index = min(timestamp, end).strftime(pattern)
+        if not indices or indices[-1] != index:
+            indices.append(index)
+        if timestamp >= end:
+            break
+        timestamp = next_window_start(timestamp, step)
+    return indices
+
+
+def compress_indices(pattern, start, end):
+    """Return the smallest list of index names and wildcards that covers
+    exactly the indices pattern renders to between start and end.  Whenever
+    every index of a whole calendar year (or month, or day) is in the range,
+    and the pattern allows it, those indices are replaced by one wildcard.
+    For example, 'gracc.osg.raw-%Y.%m' from 2023-12-05 to 2025-01-10 gives
+    ['gracc.osg.raw-2023.12', 'gracc.osg.raw-2024.*', 'gracc.osg.raw-2025.01']
+
+    :param str pattern: strftime index pattern
+    :param datetime start: Start time
+    :param datetime end: End time
+    :return list: Index names and wildcards
+    """
+    parts = enumerate_indices(pattern, start, end)
+    step = _finest_unit(pattern)
+    if step is None:
+        return parts
+
+    for unit in _UNITS_COARSE_TO_FINE[:_UNITS_COARSE_TO_FINE.index(step)]:
+        prefix = _group_prefix(pattern, unit)
+        if prefix is None:
+            continue
+
+        period_start = _period_start(start, unit)
+        while period_start <= end:
+            period_end = next_window_start(period_start, unit)
+            period_indices = enumerate_indices(
+                pattern, period_start, period_end - timedelta(microseconds=1))
+            if set(period_indices).issubset(parts):
+                position = parts.index(period_indices[0])
+                period_indices = set(period_indices)
+                parts = [p for p in parts if p not in period_indices]
+                parts.insert(position, period_start.strftime(prefix) + '*')
+            period_start = period_end
+    return parts
+
+
+def exact_indexpattern(pattern, start, end, existing=None):
+    """Build an index pattern that only covers the indices between start and
+    end, as a comma-separated list of index names and tight wildcards (see
+    compress_indices).  If existing is given, indices and wildcards that don't
+    match any existing index are left out.
+
+    :param str pattern: strftime index pattern
+    :param datetime start: Start time
+    :param datetime end: End time
+    :param list existing: Index names that exist on the cluster, e.g. from
+        get_existing_indices
+    :return str: Comma-separated index pattern.  Empty if nothing exists.
+    """
+    parts = compress_indices(pattern, start, end)
+    if existing is not None:
+        existing = list(existing)
+        parts = [part for part in parts
+                 if any(fnmatch(index, part) for index in existing)]
+    return ','.join(parts)
+
+
+def get_existing_indices(client, pattern, ttl=EXISTING_INDICES_TTL):
+    """Get the names of the indices on the cluster that could match pattern,
+    from _cat/indices.  Listings are cached per host and pattern prefix for
+    ttl seconds.
+
+    :param client: opensearchpy.OpenSearch client
+    :param str pattern: strftime index pattern
+    :param int ttl: Seconds to keep a listing for
+    :return list: Index names
+    """
+    prefix = pattern.split('%', 1)[0]
+    key = (repr(getattr(getattr(client, 'transport', None), 'hosts', None)),
+           prefix)
+
+    cached = _existing_indices_cache.get(key)
+    if cached is not None and time.time() - cached[0] < ttl:
+        return cached[1]
+
+    listing = client.cat.indices(index=prefix + '*', h='index', format='json')
+    indices = [entry['index'] for entry in listing]
+    _existing_indices_cache[key] = (time.time(), indices)
+    return indices
@@ -0,0 +1,229 @@
+"""SMTP transport that keeps one (authenticated) session open and sends any
+number of messages over it, reconnecting if the server drops the
+connection.  TextUtils.sendEmail and runerror send through it.
+
+    with MailTransport('smtp.example.com', 465, 'user', 'password') as t:
+        t.send(from_addr, to_addrs, msg)
+        t.send_many([(from_addr, to_addrs, msg) for msg in msgs])
+
+LocalSMTPServer is a minimal SMTP server that accepts and keeps every
+message, for testing and benchmarking without a real mail server.  It can
+also be run on its own to catch the emails from reports under test:
+
+    python -m gracc_reporting.MailTransport -p 8025
+"""
+
+import argparse
+import smtplib
+import socketserver
+import threading
+
+__all__ = ['MailTransport', 'LocalSMTPServer']
+
+# Errors after which the session is dropped and the message is resent over
+# a new one
+RECONNECT_ERRORS = (smtplib.SMTPServerDisconnected, ConnectionError)
+
+
+class MailTransport(object):
+    """One SMTP session, opened on the first send and reused until close()
+
+    :param str host: SMTP server
+    :param int port: SMTP port (smtplib's default if None)
+    :param str user: User to log in as.  No login if None
+    :param str password: Password for user
+    :param bool ssl: Connect with SMTP_SSL (default) or plain SMTP
+    :param int timeout: Socket timeout in seconds
+    :param int retries: Times to reconnect and resend a message after the
+        connection is dropped
+    """
+    def __init__(self, host, port=None, user=None, password=None, ssl=True,
+                 timeout=60, retries=1):
+        self.host = host
+        self.port = port
+        self.user = user
+        self.password = password
+        self.ssl = ssl
+        self.timeout = timeout
+        self.retries = retries
+        self.server = None
+        self.connections = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    @property
+    def connected(self):
+        return self.server is not None
+
+    def connect(self):
+        """Open and log in to a new session, closing the old one if any"""
+        self.close()
+        smtp_class = smtplib.SMTP_SSL if self.ssl else smtplib.SMTP
+        server = smtp_class(host=self.host, port=self.port or 0,
+                            timeout=self.timeout)
+        if self.user is not None:
+            server.login(user=self.user, password=self.password)
+        self.server = server
+        self.connections += 1
+
+    def close(self):
+        """Quit the session, if it's open"""
+        server, self.server = self.server, None
+        if server is not None:
+            try:
+                server.quit()
+            except (smtplib.SMTPException, OSError):
+                pass
+
+    def send(self, from_addr, to_addrs, msg):
+        """Send one message, reconnecting and resending up to retries times
+        if the session has been dropped
+
+        :param str from_addr: Envelope sender
+        :param list to_addrs: Envelope recipients
+        :param str msg: Message, as a string
+        :return dict: Refused recipients, as from smtplib.SMTP.sendmail
+        """
+        attempt = 0
+        while True:
+            if self.server is None:
+                self.connect()
+            try:
+                return self.server.sendmail(from_addr, to_addrs, msg)
+            except RECONNECT_ERRORS:
+                self.server = None
+                attempt += 1
+                if attempt > self.retries:
+                    raise
+
+    def send_many(self, messages, stop_on_error=False):
+        """Send a batch of messages over the session
+
+        :param messages: Iterable of (from_addr, to_addrs, msg)
+        :param bool stop_on_error: Raise the first error instead of going on
+            to the next message
+        :return list: For each message, None if it was sent, otherwise the
+            exception it failed with
+        """
+        errors = []
+        for from_addr, to_addrs, msg in messages:
+            try:
+                self.send(from_addr, to_addrs, msg)
+            except (smtplib.SMTPException, OSError) as e:
+                if stop_on_error:
+                    raise
+                errors.append(e)
+            else:
+                errors.append(None)
+        return errors
+
+
+class _SMTPHandler(socketserver.StreamRequestHandler):
+    """Just enough of the SMTP server side for smtplib"""
+    def reply(self, line):
+        self.wfile.write(line.encode('ascii') + b'\r\n')
+
+    def handle(self):
+        self.reply('220 localhost gracc-reporting test SMTP')
+        envelope = None
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode('ascii', 'replace').strip()
+            verb = command.split(' ', 1)[0].upper()
+            if verb == 'EHLO':
+                self.reply('250-localhost')
+                self.reply('250 AUTH PLAIN LOGIN')
+            elif verb == 'HELO':
+                self.reply('250 localhost')
+            elif verb == 'AUTH':
+                self.server.logins += 1
+                self.reply('235 Authentication successful')
+            elif verb == 'MAIL':
+                envelope = {'from': command[10:].strip('<> '), 'to': []}
+                self.reply('250 OK')
+            elif verb == 'RCPT':
+                envelope['to'].append(command[8:].strip('<> '))
+                self.reply('250 OK')
+            elif verb == 'DATA':
+                self.reply('354 End data with <CR><LF>.<CR><LF>')
+                data = []
+                for data_line in iter(self.rfile.readline, b''):
+                    if data_line == b'.\r\n':
+                        break
+                    data.append(data_line)
+                envelope['data'] = b''.join(data).decode('utf-8', 'replace')
+                with self.server.lock:
+                    self.server.messages.append(envelope)
+                envelope = None
+                self.reply('250 OK')
+            elif verb in ('RSET', 'NOOP'):
+                self.reply('250 OK')
+            elif verb == 'QUIT':
+                self.reply('221 Bye')
+                return
+            else:
+                self.reply('502 Command not implemented')
+
+
+class LocalSMTPServer(socketserver.ThreadingTCPServer):
+    """SMTP server on localhost that keeps every message it gets in
+    self.messages, as dicts of from, to and data.  Accepts any login.  Use
+    start() to run it in a background thread, and stop() to shut it down.
+
+    :param int port: Port to listen on.  0 picks a free one (see self.port)
+    """
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, port=0):
+        socketserver.ThreadingTCPServer.__init__(self, ('127.0.0.1', port),
+                                                 _SMTPHandler)
+        self.port = self.server_address[1]
+        self.messages = []
+        self.logins = 0
+        self.lock = threading.Lock()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+        if self._thread is not None:
+            self._thread.join()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a local SMTP server "
+                                                 "that prints every message")
+    parser.add_argument("-p", "--port", dest="port", type=int, default=8025,
+                        help="port to listen on")
+    args = parser.parse_args()
+
+    server = LocalSMTPServer(args.port)
+    print("Listening on localhost:{0}".format(server.port))
+    handled = 0
+    server.start()
+    try:
+        while True:
+            threading.Event().wait(1)
+            with server.lock:
+                new, handled = server.messages[handled:], len(server.messages)
+            for message in new:
+                print("From: {0}  To: {1}\n{2}".format(
+                    message['from'], ', '.join(message['to']), message['data']))
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == '__main__':
+    main()
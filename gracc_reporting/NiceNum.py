@@ -13,11 +13,60 @@ Simple number formatter
 >>> niceNum(10130.56, 1)
 '10,130.6'
 
+Whole arrays, lists or pandas Series can be formatted at once with
+niceNumArray.  Missing values (NaN, None or '') become empty cells:
+
+>>> niceNumArray([123567.0, 10.53, None, float('nan'), ''])
+['123,567', '11', '', '', '']
+
+>>> niceNumArray(np.array([10130.56, 2.5, 3.5]), 1)
+['10,130.6', '2.5', '3.5']
+
+>>> s = niceNumArray(pd.Series([1e6, np.nan], index=['a', 'b']))
+>>> s.to_dict()
+{'a': '1,000,000', 'b': ''}
 
 """
 
+from itertools import repeat
+
+import numpy as np
+import pandas as pd
+
+
 def niceNum(num, precision=0):
     """Returns a string representation for a floating point number
     that is rounded to the given precision and displayed with
     commas and spaces."""
     return format(round(num, precision), ',.{}f'.format(precision))
+
+
+def niceNumArray(values, precision=0):
+    """Formats every number in values like niceNum, in bulk.  NaN, None and
+    empty strings are formatted as empty strings, like empty table cells.
+
+    The numbers are converted to floats once with NumPy and formatted
+    without round(): format() already rounds correctly to the given
+    precision, so the result is the same as niceNum's.
+
+    :param values: numpy array, pandas Series, or list of numbers
+    :param int precision: Number of decimal places
+    :return: list of str, or a Series of str (with the same index) if values
+        is a Series
+    """
+    arr = np.asarray(values)
+    if arr.dtype.kind == 'O':
+        arr = np.array([np.nan if v is None or (isinstance(v, str) and not v)
+                        else v for v in arr.tolist()], dtype=float)
+    else:
+        arr = arr.astype(float)
+
+    spec = ',.{}f'.format(precision)
+    formatted = list(map(format, arr.tolist(), repeat(spec)))
+    for i in np.flatnonzero(np.isnan(arr)).tolist():
+        formatted[i] = ''
+
+    if isinstance(values, pd.Series):
+        return pd.Series(formatted, index=values.index, dtype=object,
+                         name=values.name)
+    return formatted
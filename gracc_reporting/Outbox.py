@@ -0,0 +1,294 @@
+"""Local outbox spool for report emails, so reports don't have to wait for
+the SMTP server.  With spooling on (Reporter spool=True, or -S on the
+command line), send_report writes the finished message into the outbox and
+returns, and the flusher delivers everything in the outbox later:
+
+    python -m gracc_reporting.Outbox -c my.toml
+
+The flusher sends with the SMTP settings in the [email] section of the
+config file, over several connections at once, and leaves messages that
+fail in the outbox to be retried (with backoff) by the next flush.
+
+The outbox is a maildir-style directory:  messages are written to tmp/ and
+renamed into new/ when complete, a flusher claims a message by renaming it
+into cur/ (so two flushers never send the same message), and messages that
+fail max_attempts times (or can't be read) are moved to failed/.  Each message is a JSON file
+with the envelope (from_addr, to_addrs), the message itself, and the
+delivery attempts so far.  A message in new/ is due to be sent once its
+modification time has passed (retries are given future times), and a
+message's modification time in cur/ is when its flusher last touched it,
+which it does every so often while sending.
+"""
+
+import argparse
+import itertools
+import json
+import logging
+import os
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import toml
+
+from .MailTransport import MailTransport
+
+__all__ = ['Outbox']
+
+DEFAULT_OUTBOX_DIR = '~/.local/share/gracc-reporting/outbox'
+DEFAULT_MAX_WORKERS = 4
+DEFAULT_MAX_ATTEMPTS = 5
+DEFAULT_RETRY_DELAY = 60        # seconds, doubled after every failure
+DEFAULT_STALE_AFTER = 3600      # seconds in cur/ before a claim is abandoned
+
+_counter = itertools.count()
+
+logger = logging.getLogger(__name__)
+
+
+class Outbox(object):
+    """Spool directory of messages waiting to be sent
+
+    :param str directory: Outbox directory.  Created if it doesn't exist
+    """
+    def __init__(self, directory=DEFAULT_OUTBOX_DIR):
+        self.directory = os.path.expanduser(directory)
+        for subdir in ('tmp', 'new', 'cur', 'failed'):
+            os.makedirs(os.path.join(self.directory, subdir), exist_ok=True)
+
+    def _path(self, subdir, name):
+        return os.path.join(self.directory, subdir, name)
+
+    def _write(self, subdir, name, envelope, due=None):
+        """Write envelope to tmp/, then move it into subdir
+
+        :param float due: Time to set as the file's modification time
+        """
+        tmp_path = self._path('tmp', name)
+        with open(tmp_path, 'w') as f:
+            json.dump(envelope, f)
+        if due is not None:
+            os.utime(tmp_path, (due, due))
+        os.replace(tmp_path, self._path(subdir, name))
+
+    def put(self, from_addr, to_addrs, message):
+        """Add a message to the outbox
+
+        :param str from_addr: Envelope sender
+        :param list to_addrs: Envelope recipients
+        :param str message: Message, as a string
+        :return str: Name of the message in the outbox
+        """
+        name = '{0:.6f}.{1}_{2}.{3}'.format(time.time(), os.getpid(),
+                                            next(_counter), socket.gethostname())
+        self._write('new', name, {'from_addr': from_addr,
+                                  'to_addrs': list(to_addrs),
+                                  'message': message,
+                                  'attempts': 0,
+                                  'errors': []})
+        return name
+
+    def pending(self, now=None):
+        """Names of the messages in new/ that are due to be sent, oldest
+        first
+
+        :param float now: Current time (time.time())
+        """
+        now = time.time() if now is None else now
+        names = []
+        for name in sorted(os.listdir(os.path.join(self.directory, 'new'))):
+            try:
+                if os.path.getmtime(self._path('new', name)) <= now:
+                    names.append(name)
+            except FileNotFoundError:   # Claimed by another flusher
+                pass
+        return names
+
+    def failed(self):
+        """Names of the messages that failed too many times"""
+        return sorted(os.listdir(os.path.join(self.directory, 'failed')))
+
+    def claim(self, name):
+        """Move a message from new/ into cur/, unless another flusher got
+        there first.  A message that can't be read is moved to failed/
+
+        :return dict: The message's envelope, or None if it was already
+            claimed or couldn't be read
+        """
+        cur_path = self._path('cur', name)
+        try:
+            os.rename(self._path('new', name), cur_path)
+        except FileNotFoundError:
+            return None
+        os.utime(cur_path)
+        try:
+            with open(cur_path, 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            logger.error("Can't read outbox message {0}, moving it to "
+                         "failed/: {1}".format(name, e))
+            try:
+                os.replace(cur_path, self._path('failed', name))
+            except OSError:
+                pass
+            return None
+
+    def touch(self, name):
+        """Update the modification time of a claimed message, so that
+        recover doesn't take it back while it's being sent"""
+        try:
+            os.utime(self._path('cur', name))
+        except FileNotFoundError:
+            pass
+
+    def done(self, name):
+        """Remove a claimed message that's been sent"""
+        os.remove(self._path('cur', name))
+
+    def retry(self, name, envelope, error, max_attempts=DEFAULT_MAX_ATTEMPTS,
+              retry_delay=DEFAULT_RETRY_DELAY):
+        """Put a claimed message that couldn't be sent back into new/, to be
+        tried again after a delay, or into failed/ after max_attempts
+
+        :return bool: True if it will be retried
+        """
+        envelope['attempts'] += 1
+        envelope['errors'].append(str(error))
+        due = time.time() + retry_delay * 2 ** (envelope['attempts'] - 1)
+        retrying = envelope['attempts'] < max_attempts
+        self._write('new' if retrying else 'failed', name, envelope, due)
+        os.remove(self._path('cur', name))
+        return retrying
+
+    def recover(self, stale_after=DEFAULT_STALE_AFTER):
+        """Move messages that have been claimed for more than stale_after
+        seconds (their flusher must have died) back into new/
+
+        :return int: Number of messages recovered
+        """
+        recovered = 0
+        cutoff = time.time() - stale_after
+        for name in os.listdir(os.path.join(self.directory, 'cur')):
+            path = self._path('cur', name)
+            try:
+                if os.path.getmtime(path) < cutoff:
+                    os.rename(path, self._path('new', name))
+                    recovered += 1
+            except FileNotFoundError:
+                pass
+        return recovered
+
+    def flush(self, transport_factory, max_workers=DEFAULT_MAX_WORKERS,
+              max_attempts=DEFAULT_MAX_ATTEMPTS,
+              retry_delay=DEFAULT_RETRY_DELAY,
+              stale_after=DEFAULT_STALE_AFTER):
+        """Send every pending message, over up to max_workers SMTP sessions
+        at once.  Messages being sent are touched every stale_after / 4
+        seconds, so a slow send isn't recovered and sent again by another
+        flusher
+
+        :param transport_factory: Function returning a new MailTransport.
+            Each worker thread gets its own.
+        :param float stale_after: The stale_after that flushers pass to
+            recover
+        :return tuple: (number sent, number that failed this time)
+        """
+        local = threading.local()
+        transports = []
+        sending = set()
+        lock = threading.Lock()
+        finished = threading.Event()
+
+        def heartbeat():
+            while not finished.wait(stale_after / 4.):
+                with lock:
+                    names = list(sending)
+                for name in names:
+                    self.touch(name)
+
+        def deliver(name):
+            envelope = self.claim(name)
+            if envelope is None:
+                return None
+            with lock:
+                sending.add(name)
+            try:
+                return send(name, envelope)
+            finally:
+                with lock:
+                    sending.discard(name)
+
+        def send(name, envelope):
+            if not hasattr(local, 'transport'):
+                local.transport = transport_factory()
+                with lock:
+                    transports.append(local.transport)
+            try:
+                local.transport.send(envelope['from_addr'],
+                                     envelope['to_addrs'],
+                                     envelope['message'])
+            except Exception as e:
+                local.transport.close()
+                self.retry(name, envelope, e, max_attempts, retry_delay)
+                return False
+            self.done(name)
+            return True
+
+        threading.Thread(target=heartbeat, daemon=True).start()
+        try:
+            with ThreadPoolExecutor(max_workers=max_workers) as pool:
+                results = list(pool.map(deliver, self.pending()))
+        finally:
+            finished.set()
+            for transport in transports:
+                transport.close()
+        return results.count(True), results.count(False)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Send the emails waiting in "
+                                                 "the gracc-reporting outbox")
+    parser.add_argument("-c", "--config", dest="config", required=True,
+                        help="report configuration file with the [email] "
+                             "SMTP settings")
+    parser.add_argument("-o", "--outbox", dest="outbox", default=None,
+                        help="outbox directory (default: [email.outbox] "
+                             "directory in the config file, or "
+                             "{0})".format(DEFAULT_OUTBOX_DIR))
+    parser.add_argument("-w", "--workers", dest="workers", type=int,
+                        default=DEFAULT_MAX_WORKERS,
+                        help="number of SMTP sessions to send over at once")
+    parser.add_argument("-l", "--loop", dest="loop", type=float, default=None,
+                        help="keep running, flushing every LOOP seconds")
+    args = parser.parse_args()
+    logging.basicConfig(format='%(asctime)s %(levelname)s %(message)s')
+
+    with open(args.config, 'r') as f:
+        email_config = toml.loads(f.read())['email']
+    outbox_config = email_config.get('outbox', {})
+    outbox = Outbox(args.outbox or outbox_config.get('directory',
+                                                     DEFAULT_OUTBOX_DIR))
+    max_attempts = outbox_config.get('max_attempts', DEFAULT_MAX_ATTEMPTS)
+    retry_delay = outbox_config.get('retry_delay', DEFAULT_RETRY_DELAY)
+    stale_after = outbox_config.get('stale_after', DEFAULT_STALE_AFTER)
+
+    def transport_factory():
+        return MailTransport(email_config['smtphost'],
+                             email_config.get('smtpport'),
+                             email_config.get('smtpuser'),
+                             email_config.get('smtppassword'))
+
+    while True:
+        outbox.recover(stale_after)
+        sent, failed = outbox.flush(transport_factory, args.workers,
+                                    max_attempts, retry_delay, stale_after)
+        if sent or failed:
+            print("Sent {0} emails, {1} failed".format(sent, failed))
+        if args.loop is None:
+            break
+        time.sleep(args.loop)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,261 @@
+"""Streaming pipeline stages for reports that go through raw GRACC records,
+built on ReportUtils.coroutine.  Records are pushed one at a time through a
+chain of stages, so a report can scan tens of millions of records without
+ever holding them all in memory.  Only stages that have to (group_by, top_n,
+and the sinks) keep state, and that state is bounded by the number of groups
+or rows they produce.
+
+Stages are chained by passing each one the next as its target, and the
+source feeds the first one, e.g.:
+
+    report = defaultdict(list)
+    scan_source(search,
+                filter_records(lambda r: r['CoreHours'] > 0,
+                    group_by(['OIM_Site', 'VOName'],
+                             {'CoreHours': ('sum', 'CoreHours'),
+                              'Jobs': ('count', None)},
+                        dict_sink(report, ['OIM_Site', 'VOName',
+                                           'CoreHours', 'Jobs']))))
+
+Closing a stage (which the sources do when they run out of records) flushes
+it and closes its target, so results are complete once the source returns.
+"""
+
+import csv
+import heapq
+import math
+import numbers
+import operator
+
+import pandas as pd
+from opensearchpy import connections
+from opensearchpy.helpers import scan
+
+from .ReportUtils import coroutine
+
+__all__ = ['feed', 'scan_source', 'filter_records', 'project', 'group_by',
+           'top_n', 'dict_sink', 'csv_sink', 'dataframe_sink']
+
+
+# Running accumulators for group_by: (initial value, update function)
+_ACCUMULATORS = {
+    'sum': (0, lambda acc, value: acc + (value or 0)),
+    'count': (0, lambda acc, value: acc + 1),
+    'min': (None, lambda acc, value: value if acc is None or
+            (value is not None and value < acc) else acc),
+    'max': (None, lambda acc, value: value if acc is None or
+            (value is not None and value > acc) else acc),
+}
+
+
+# Sources
+def feed(records, target):
+    """Send every record in an iterable to target, then close target
+
+    :param records: Iterable of records (dicts)
+    :param target: First stage of the pipeline
+    :return int: Number of records sent
+    """
+    n_records = 0
+    try:
+        for record in records:
+            target.send(record)
+            n_records += 1
+    finally:
+        target.close()
+    return n_records
+
+
+def scan_source(search, target, raw=True):
+    """Scan all of the records matching a Search object into target
+
+    :param Search search: Search to scan
+    :param target: First stage of the pipeline
+    :param bool raw: If True, send each hit's _source dict as-is, without
+        wrapping it in a Hit object like Search.scan() does.  This is much
+        faster for large scans.
+    :return int: Number of records sent
+    """
+    if raw:
+        client = connections.get_connection(search._using)
+        records = (hit['_source'] for hit in scan(
+            client, query=search.to_dict(), index=search._index,
+            **search._params))
+    else:
+        records = search.scan()
+    return feed(records, target)
+
+
+# Stages
+@coroutine
+def filter_records(predicate, target):
+    """Only pass on records for which predicate(record) is true"""
+    try:
+        while True:
+            record = (yield)
+            if predicate(record):
+                target.send(record)
+    except GeneratorExit:
+        target.close()
+
+
+@coroutine
+def project(fields, target):
+    """Pass on only some fields of each record
+
+    :param fields: List of field names to keep, or dict of
+        {output name: input field name} to keep and rename
+    """
+    if not isinstance(fields, dict):
+        fields = {field: field for field in fields}
+    items = list(fields.items())
+    try:
+        while True:
+            record = (yield)
+            target.send({name: record.get(field) for name, field in items})
+    except GeneratorExit:
+        target.close()
+
+
+@coroutine
+def group_by(keys, metrics, target):
+    """Group records by the values of keys, keeping running accumulators for
+    each group.  When closed, sends one record per group (the key fields plus
+    one field per metric) to target, in order of first appearance.
+
+    :param list keys: Fields to group by
+    :param dict metrics: {output name: (accumulator, input field)}, where
+        accumulator is one of sum, count, min, max.  The field is ignored for
+        count.
+    """
+    metric_items = [(name, _ACCUMULATORS[acc], field)
+                    for name, (acc, field) in metrics.items()]
+    initial = [acc[0] for _, acc, _ in metric_items]
+    updates = [(i, acc[1], field)
+               for i, (_, acc, field) in enumerate(metric_items)]
+    get_key = operator.itemgetter(*keys)
+    groups = {}
+    try:
+        while True:
+            record = (yield)
+            group_key = get_key(record)
+            state = groups.get(group_key)
+            if state is None:
+                state = groups[group_key] = list(initial)
+            for i, update, field in updates:
+                state[i] = update(state[i], record.get(field) if field else None)
+    except GeneratorExit:
+        try:
+            for group_key, state in groups.items():
+                if len(keys) == 1:
+                    group_key = (group_key, )
+                row = dict(zip(keys, group_key))
+                row.update((name, value) for (name, _, _), value
+                           in zip(metric_items, state))
+                target.send(row)
+        finally:
+            target.close()
+
+
+@coroutine
+def top_n(n, key, target, largest=True):
+    """Keep only the n records with the largest (or smallest) value of key.
+    When closed, sends them to target in order.  Records without a value
+    (missing, None, NaN or not a number) are left out.
+
+    :param int n: Number of records to keep
+    :param key: Field name, or function of a record, to rank on
+    :param bool largest: If False, keep the smallest n instead
+    """
+    if not callable(key):
+        field = key
+        key = lambda record: record.get(field)
+    sign = 1 if largest else -1
+    heap = []
+    counter = 0     # Tie-breaker, so records themselves are never compared
+    try:
+        while True:
+            record = (yield)
+            value = key(record)
+            if not isinstance(value, numbers.Real) or math.isnan(value):
+                continue
+            item = (sign * value, -counter, record)
+            counter += 1
+            if len(heap) < n:
+                heapq.heappush(heap, item)
+            elif item > heap[0]:
+                heapq.heapreplace(heap, item)
+    except GeneratorExit:
+        try:
+            for _, _, record in sorted(heap, reverse=True):
+                target.send(record)
+        finally:
+            target.close()
+
+
+# Sinks
+@coroutine
+def dict_sink(report, columns):
+    """Append each record's fields to the columns of a report dict, the form
+    that Reporter.format_report returns
+
+    :param dict report: dict of lists, e.g. defaultdict(list)
+    :param list columns: Fields to append, in order
+    """
+    try:
+        while True:
+            record = (yield)
+            for column in columns:
+                report[column].append(record.get(column))
+    except GeneratorExit:
+        pass
+
+
+@coroutine
+def csv_sink(fileobj, columns, header=True):
+    """Write each record as a CSV row
+
+    :param fileobj: Open file to write to
+    :param list columns: Fields to write, in order
+    :param bool header: Write a header row first
+    """
+    writer = csv.writer(fileobj)
+    if header:
+        writer.writerow(columns)
+    try:
+        while True:
+            record = (yield)
+            writer.writerow([record.get(column) for column in columns])
+    except GeneratorExit:
+        fileobj.flush()
+
+
+@coroutine
+def dataframe_sink(frames, columns, chunk_size=100000):
+    """Collect records into a pandas DataFrame.  Records are converted to
+    typed DataFrame chunks every chunk_size records, which take much less
+    memory than the records themselves.  When closed, the chunks are joined
+    and the DataFrame is appended to frames.
+
+    :param list frames: List to append the finished DataFrame to
+    :param list columns: Fields to keep, in order
+    :param int chunk_size: Number of records per chunk
+    """
+    chunks = []
+    buffer = {column: [] for column in columns}
+    buffered = 0
+    try:
+        while True:
+            record = (yield)
+            for column in columns:
+                buffer[column].append(record.get(column))
+            buffered += 1
+            if buffered >= chunk_size:
+                chunks.append(pd.DataFrame(buffer, columns=columns))
+                buffer = {column: [] for column in columns}
+                buffered = 0
+    except GeneratorExit:
+        if buffered or not chunks:
+            chunks.append(pd.DataFrame(buffer, columns=columns))
+        frames.append(pd.concat(chunks, ignore_index=True)
+                      if len(chunks) > 1 else chunks[0])
@@ -0,0 +1,120 @@
+"""On-disk cache of raw query responses, so that reruns of a report over the
+same time range don't have to go back to GRACC.  Entries are keyed by the
+query body, index pattern and host, stored gzip-compressed, and evicted
+least-recently-used first once the cache grows past its size limit."""
+
+import gzip
+import hashlib
+import json
+import os
+import tempfile
+import time
+
+DEFAULT_CACHE_DIR = os.path.join('~', '.cache', 'gracc-reporting')
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+DEFAULT_RECENT_TTL = 300    # seconds
+_SUFFIX = '.json.gz'
+
+
+class QueryCache(object):
+    """Cache of raw query responses in a local directory
+
+    :param str directory: Directory to keep cache entries in
+    :param int max_bytes: Once the entries take up more than this, the least
+        recently used ones are deleted
+    :param int recent_ttl: Seconds to keep responses to queries whose range
+        isn't over yet
+    """
+    def __init__(self, directory=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES,
+                 recent_ttl=DEFAULT_RECENT_TTL):
+        self.directory = os.path.expanduser(directory)
+        self.max_bytes = max_bytes
+        self.recent_ttl = recent_ttl
+        if not os.path.exists(self.directory):
+            os.makedirs(self.directory)
+
+    @staticmethod
+    def make_key(body, index, host):
+        """Build the cache key for a query
+
+        :param dict body: Query body (Search.to_dict())
+        :param str index: Index pattern the query runs against
+        :param str host: Host the query runs against
+        :return str: Hex digest identifying the query
+        """
+        canonical = json.dumps({'body': body, 'index': index, 'host': host},
+                               sort_keys=True, separators=(',', ':'),
+                               default=str)
+        return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + _SUFFIX)
+
+    def get(self, key):
+        """Return the cached response for key, or None if there isn't a
+        current one
+
+        :param str key: Cache key from make_key
+        :return dict: Raw response
+        """
+        path = self._path(key)
+        try:
+            with gzip.open(path, 'rt', encoding='utf-8') as f:
+                entry = json.load(f)
+        except (IOError, OSError, ValueError):
+            return None
+
+        if entry['expires'] is not None and entry['expires'] < time.time():
+            self._remove(path)
+            return None
+
+        os.utime(path, None)    # Mark as recently used
+        return entry['response']
+
+    def put(self, key, response, ttl=None):
+        """Store a response
+
+        :param str key: Cache key from make_key
+        :param dict response: Raw response
+        :param int ttl: Seconds the entry is valid for.  None means forever
+        """
+        entry = {'expires': time.time() + ttl if ttl is not None else None,
+                 'response': response}
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as raw, \
+                    gzip.GzipFile(fileobj=raw, mode='wb') as f:
+                f.write(json.dumps(entry).encode('utf-8'))
+            os.replace(tmp_path, self._path(key))
+        except Exception:
+            self._remove(tmp_path)
+            raise
+        self.evict()
+
+    def evict(self):
+        """Delete least recently used entries until the cache fits in
+        max_bytes"""
+        entries = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(_SUFFIX):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            self._remove(path)
+            total -= size
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
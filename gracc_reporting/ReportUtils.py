@@ -1,28 +1,42 @@
 import abc
 import argparse
-from datetime import datetime
+from datetime import datetime, timedelta
 import sys
-import smtplib
-from email.mime.text import MIMEText
 import logging
 import operator
 import os
-import pkg_resources
-import json
 import toml
 import copy
-import http.client
-import pandas as pd
-
-from opensearchpy import OpenSearch, client
-
-from . import TextUtils
+from dateutil import tz
+
+# Only modules that are quick to import are imported here, so that --help,
+# and reports that fail config validation, don't wait for pandas and
+# opensearchpy.  Those (and the modules that need them: ClientFactory,
+# TextUtils, Outbox) are imported where they're used.
+from . import Aggregations
+from . import DebugLog
+from . import Incremental
+from . import TimeSlice
+from . import Timing
+from .QueryCache import QueryCache
 from . import TimeUtils
-from .IndexPattern import indexpattern_generate
+from .IndexPattern import indexpattern_generate, get_existing_indices
 
 __all__ = ['Reporter', 'runerror', 'coroutine', 'get_report_parser']
 
 OK_ES_STATUSES=['green',]
+# Parts of a search response that run_query always needs, whatever the
+# report's filter_path
+RESPONSE_FILTER_PATH = ['took', 'timed_out', '_shards']
+# Parts that the methods merging partial responses (run_query_sliced,
+# run_query_incremental, run_query_adaptive) need as well.  Aggregations have
+# to be whole to be merged.
+MERGE_FILTER_PATH = ['aggregations', 'hits.total']
+
+# Parsed config files, shared by all Reporters in this process (e.g. reports
+# run through BatchRunner).  Clients are shared through ClientFactory.
+# {(abspath, mtime): config}
+_config_cache = {}
 
 
 class ContextFilter(logging.Filter):
@@ -58,6 +72,19 @@ class Reporter(object, metaclass=abc.ABCMeta):
     :param str althost_key: Alternate Elasticsearch Host key from config file.
         Must be specified in [elasticsearch] section of
         config file by name (e.g. my_es_cluster="https://hostname.me")
+    :param bool use_cache: If False, don't use the query cache even if it's
+        configured in the [cache] section of the config file
+    :param bool spool: If True, put emails in the outbox (see Outbox) instead
+        of sending them
+    :param str record: Record every Elasticsearch request and response in
+        this cassette file (see Cassette)
+    :param str replay: Answer Elasticsearch requests from this cassette
+        file instead of the host
+    :param float replay_latency: Seconds to wait before answering each
+        replayed request
+    :param str debug_dump: Append every query and response, in full, to
+        this gzipped JSON lines file (see DebugLog.DumpFile) instead of
+        printing them
     """
 
     __optional_kwargs = {
@@ -68,14 +95,27 @@ class Reporter(object, metaclass=abc.ABCMeta):
         'logfile': None,
         'is_test': False,
         'no_email': False, 
-        'verbose': False        
+        'verbose': False,
+        'use_cache': True,
+        'spool': False,
+        'record': None,
+        'replay': None,
+        'replay_latency': 0.,
+        'debug_dump': None
     }
 
+    # Parts of the search response the report reads, e.g. ['aggregations']
+    # (see Reporter._apply_filter_path).  None means the whole response.
+    filter_path = None
+
     def __init__(self, report_type, config_file, start, end, **kwargs):
         validate_and_add_kwargs_for_instance(self, self.__optional_kwargs, kwargs)
         self.report_type = report_type
         self.configfile = config_file
-        self.config = self._parse_config(config_file)
+        self.timings = Timing.Timings({'report': report_type,
+                                       'vo': self.vo or ''})
+        with self.timings.span('parse_config'):
+            self.config = self._parse_config(config_file)
 
         self.logger = self.__setup_gen_logger()
         self.start_time = TimeUtils.parse_datetime(start) 
@@ -84,11 +124,39 @@ class Reporter(object, metaclass=abc.ABCMeta):
         self.header = []
         if self.vo is not None: 
             self.vo = self.__check_vo(self.vo)
-        self.indexpattern = self.indexpattern_generate(self.index_key,
-                                                       start=self.start_time,
-                                                       end=self.end_time)
         self.email_info = self.__get_email_info()
-        self.client = self.__establish_client()
+        self.cache = self.__get_query_cache()
+        self.__debug_limits, self.debug_dump_file = self.__get_debug_settings()
+        self.__client = None
+        self.__client_settings = self.__get_client_settings()
+        self.__indexpattern = None
+
+    @property
+    def indexpattern(self):
+        """Index pattern for [self.start_time, self.end_time], generated
+        on first use (see indexpattern_generate), since with check_indices
+        that has to ask the cluster"""
+        if self.__indexpattern is None:
+            with self.timings.active(), self.timings.span('indexpattern'):
+                self.__indexpattern = self.indexpattern_generate(
+                    self.index_key, start=self.start_time, end=self.end_time)
+        return self.__indexpattern
+
+    @indexpattern.setter
+    def indexpattern(self, indexpattern):
+        self.__indexpattern = indexpattern
+
+    @property
+    def client(self):
+        """The elasticsearch client, created on first use"""
+        if self.__client is None:
+            with self.timings.span('establish_client'):
+                self.__client = self.__establish_client()
+        return self.__client
+
+    @client.setter
+    def client(self, client):
+        self.__client = client
 
     # Report methods that must or should be implemented in subclasses
     @abc.abstractmethod
@@ -102,38 +170,104 @@ class Reporter(object, metaclass=abc.ABCMeta):
         in the Reporter and report-specific class.  Must be overridden."""
         pass
 
-    def run_query(self, overridequery=None):
+    def run_query(self, overridequery=None, paginate=False,
+                  page_size=Aggregations.DEFAULT_PAGE_SIZE):
         """Execute the query and check the status code before returning the
         relevant info
 
+        :param function overridequery: Call this instead of self.query to get
+            the Search object
+        :param bool paginate: If True, run the query's nested bucket
+            aggregations as a composite aggregation, page by page, and return
+            a generator of the composite buckets instead (see
+            Aggregations.iter_composite_buckets).  Use this instead of
+            terms aggregations with size=MAXINT for large breakdowns.
+        :param int page_size: Number of buckets per page if paginate is True
         :return Response.aggregations OR ES Search object: If the results are
         aggregated (response has aggregations property), returns aggregations
         property of elasticsearch response (most reports).  If not, return the
         search object itself, so it can be scanned using .scan() (JSR, for
         example)
         """
-
-        s = overridequery() if overridequery is not None else self.query()
+        if paginate:
+            # The buckets are fetched as the generator is consumed, so that's
+            # what the run_query span times (see __run_paginated_query)
+            _, s, t = self.__prepare_query(overridequery)
+            return self.__run_paginated_query(s, t, page_size)
+        return self.__run_query(overridequery)
+
+    def __prepare_query(self, overridequery=None):
+        """Get the Search object, apply the report's filter_path and log the
+        query
+
+        :param function overridequery: Call this instead of self.query to get
+            the Search object
+        :return tuple: (Search object, the Search with filter_path, its
+            to_dict())
+        """
+        original = overridequery() if overridequery is not None \
+            else self.query()
+        s = self._apply_filter_path(original)
 
         t = s.to_dict()
-        if self.verbose:
-            print(json.dumps(t, sort_keys=True, indent=4))
-            self.logger.debug(json.dumps(t, sort_keys=True))
-        else:
-            self.logger.debug(json.dumps(t, sort_keys=True))
+        self._log_query(t)
+        return original, s, t
+
+    @Timing.timed('run_query')
+    def __run_query(self, overridequery=None):
+        """run_query without pagination
+
+        :param function overridequery: Call this instead of self.query to get
+            the Search object
+        :return Response.aggregations OR ES Search object: See run_query
+        """
+        from opensearchpy import connections
+        from opensearchpy.helpers.response import Response
+
+        original, s, t = self.__prepare_query(overridequery)
 
         try:
-            response = s.execute()
+            cache_key = None
+            cached = None
+            if self.cache is not None:
+                key_body = t
+                if 'filter_path' in s._params:
+                    # Filtered responses are cached apart from whole ones
+                    key_body = dict(t, filter_path=s._params['filter_path'])
+                cache_key = QueryCache.make_key(
+                    key_body, s._index,
+                    repr(connections.get_connection(s._using).transport.hosts))
+                cached = self.cache.get(cache_key)
+
+            if cached is not None:
+                self.logger.info('Using cached response for query')
+                response = Response(s, cached)
+            else:
+                response = s.execute()
             if not response.success():
                 raise Exception("Error accessing Elasticsearch")
-
-            if self.verbose:
-                print(json.dumps(response.to_dict(), sort_keys=True, indent=4))
+            Timing.annotate(
+                cached=cached is not None,
+                server_seconds=response.took / 1000.,
+                buckets=Aggregations.count_buckets(
+                    response.to_dict().get('aggregations', {})))
+
+            if cache_key is not None and cached is None:
+                # Ranges that are over won't change, so keep them forever.
+                # Go by the query's own range, which an overridequery can
+                # set to anything
+                end = TimeSlice.range_end(t)
+                ttl = None if end is not None and \
+                    end <= datetime.now(tz.tzutc()) else self.cache.recent_ttl
+                self.cache.put(cache_key, response.to_dict(), ttl=ttl)
+
+            self._log_response(response.to_dict())
 
             if hasattr(response, 'aggregations') and response.aggregations:
                 results = response.aggregations
             else:
-                results = s
+                # Unfiltered, so that it can be scanned
+                results = original
 
             self.logger.info('Ran elasticsearch query successfully')
             return results
@@ -141,6 +275,213 @@ class Reporter(object, metaclass=abc.ABCMeta):
             self.logger.exception(e)
             raise
 
+    @Timing.timed('run_query_sliced')
+    def run_query_sliced(self, overridequery=None, window='month',
+                         max_workers=TimeSlice.DEFAULT_MAX_WORKERS,
+                         time_field=TimeSlice.DEFAULT_TIME_FIELD):
+        """Execute the query as one request per time window over
+        [self.start_time, self.end_time), max_workers windows at a time, and
+        merge the aggregations of the windows.  Each window queries only the
+        indices for that window.  The query must filter on a range of
+        time_field, and its aggregations must be mergeable (see
+        Aggregations.merge_aggregations).
+
+        :param function overridequery: Call this instead of self.query to get
+            the Search object
+        :param window: 'hour', 'day', 'week', 'month', 'year' or
+            datetime.timedelta.  See TimeUtils.split_time_range
+        :param int max_workers: Number of windows to query concurrently
+        :param str time_field: Field that the query's range filter is on
+        :return Response.aggregations: Merged aggregations, just like
+            run_query returns
+        """
+        from opensearchpy import connections
+        from opensearchpy.helpers.response import Response
+
+        s = overridequery() if overridequery is not None else self.query()
+        s = self._apply_filter_path(s, keep=MERGE_FILTER_PATH)
+        t = s.to_dict()
+        self._log_query(t)
+
+        windows = TimeUtils.split_time_range(self.start_time, self.end_time,
+                                             window)
+
+        try:
+            merged = TimeSlice.run_sliced(
+                connections.get_connection(s._using), t, windows,
+                self.__index_for_window, time_field=time_field,
+                max_workers=max_workers, **s._params)
+            response = Response(s, merged)
+            Timing.annotate(
+                windows=len(windows),
+                buckets=Aggregations.count_buckets(merged['aggregations']))
+
+            self._log_response(response.to_dict())
+
+            self.logger.info('Ran elasticsearch query successfully over {0} '
+                             'time windows'.format(len(windows)))
+            return response.aggregations
+        except Exception as e:
+            self.logger.exception(e)
+            raise
+
+    @Timing.timed('run_query_incremental')
+    def run_query_incremental(self, overridequery=None, mutable_days=None,
+                              max_workers=TimeSlice.DEFAULT_MAX_WORKERS,
+                              time_field=TimeSlice.DEFAULT_TIME_FIELD):
+        """Like run_query_sliced with daily windows, but the partial results
+        of each UTC day are stored locally once the day is more than
+        mutable_days old, and later runs reuse them instead of querying those
+        days again.  A rolling 30-day report then only queries the days that
+        are new or still changing, plus the partial days at either end of the
+        range.
+
+        The store is configured in the [incremental] section of the config
+        file (directory, max_size_mb, mutable_days).
+
+        :param function overridequery: Call this instead of self.query to get
+            the Search object
+        :param int mutable_days: Days that ended less than this many days ago
+            can still get new records, so they're always queried
+        :param int max_workers: Number of days to query concurrently
+        :param str time_field: Field that the query's range filter is on
+        :return Response.aggregations: Merged aggregations, just like
+            run_query returns
+        """
+        from opensearchpy import connections
+        from opensearchpy.helpers.response import Response
+
+        s = overridequery() if overridequery is not None else self.query()
+        s = self._apply_filter_path(s, keep=MERGE_FILTER_PATH)
+        t = s.to_dict()
+        self._log_query(t)
+
+        incremental_config = self.config.get('incremental', {})
+        if mutable_days is None:
+            mutable_days = incremental_config.get(
+                'mutable_days', Incremental.DEFAULT_MUTABLE_DAYS)
+        max_bytes = Incremental.DEFAULT_STORE_MAX_BYTES
+        if 'max_size_mb' in incremental_config:
+            max_bytes = incremental_config['max_size_mb'] * 1024 * 1024
+        store = QueryCache(
+            directory=incremental_config.get('directory',
+                                             Incremental.DEFAULT_STORE_DIR),
+            max_bytes=max_bytes)
+
+        try:
+            _client = connections.get_connection(s._using)
+            merged, n_queried = Incremental.run_incremental(
+                _client, t, self.start_time, self.end_time,
+                self.__index_for_window, store, repr(_client.transport.hosts),
+                mutable_after=datetime.now(tz.tzutc()) - timedelta(days=mutable_days),
+                time_field=time_field, max_workers=max_workers, **s._params)
+            response = Response(s, merged)
+            Timing.annotate(
+                windows=n_queried,
+                buckets=Aggregations.count_buckets(merged['aggregations']))
+
+            self._log_response(response.to_dict())
+
+            self.logger.info('Ran elasticsearch query successfully.  Queried '
+                             '{0} days, the rest came from stored '
+                             'partials'.format(n_queried))
+            return response.aggregations
+        except Exception as e:
+            self.logger.exception(e)
+            raise
+
+    @Timing.timed('run_query_adaptive')
+    def run_query_adaptive(self, overridequery=None, min_window=None,
+                           max_partitions=None,
+                           time_field=TimeSlice.DEFAULT_TIME_FIELD):
+        """Like run_query, but if the query times out or hits the cluster's
+        search.max_buckets limit, split [self.start_time, self.end_time) in
+        half and run each half the same way, down to min_window, then split
+        the top-level terms aggregation into hash partitions, up to
+        max_partitions, and merge the partial aggregations (see
+        Adaptive.run_adaptive).  The query's aggregations must be mergeable
+        (see Aggregations.merge_aggregations).
+
+        min_window (in minutes) and max_partitions can also be set in the
+        [adaptive] section of the config file.
+
+        :param function overridequery: Call this instead of self.query to get
+            the Search object
+        :param timedelta min_window: Shortest time window to split down to
+        :param int max_partitions: Most terms partitions to split into
+        :param str time_field: Field that the query's range filter is on
+        :return Response.aggregations: Merged aggregations, just like
+            run_query returns
+        """
+        from opensearchpy import connections
+        from opensearchpy.helpers.response import Response
+
+        from . import Adaptive
+
+        s = overridequery() if overridequery is not None else self.query()
+        s = self._apply_filter_path(s, keep=MERGE_FILTER_PATH)
+        t = s.to_dict()
+        self._log_query(t)
+
+        adaptive_config = self.config.get('adaptive', {})
+        if min_window is None:
+            min_window = Adaptive.DEFAULT_MIN_WINDOW
+            if 'min_window' in adaptive_config:
+                min_window = timedelta(minutes=adaptive_config['min_window'])
+        if max_partitions is None:
+            max_partitions = adaptive_config.get(
+                'max_partitions', Adaptive.DEFAULT_MAX_PARTITIONS)
+
+        try:
+            merged, stats = Adaptive.run_adaptive(
+                connections.get_connection(s._using), t, self.start_time,
+                self.end_time, self.__index_for_window, min_window=min_window,
+                max_partitions=max_partitions, time_field=time_field,
+                logger=self.logger, **s._params)
+            response = Response(s, merged)
+            Timing.annotate(
+                requests=stats['requests'], split_depth=stats['depth'],
+                buckets=Aggregations.count_buckets(
+                    merged.get('aggregations', {})))
+
+            self._log_response(response.to_dict())
+
+            self.logger.info('Ran elasticsearch query successfully in {0} '
+                             'requests, split {1} times, to a depth of '
+                             '{2}'.format(stats['requests'], stats['splits'],
+                                          stats['depth']))
+            return response.aggregations
+        except Exception as e:
+            self.logger.exception(e)
+            raise
+
+    def run_query_dataframe(self, overridequery=None, run=None, **kwargs):
+        """Run the query and flatten its aggregations into a pandas
+        DataFrame with one row per innermost bucket, straight from the raw
+        response (see Aggregations.aggregations_to_dataframe), instead of
+        walking the buckets of the aggregations object.  date_histogram keys
+        become UTC datetimes.
+
+        :param function overridequery: Call this instead of self.query to get
+            the Search object
+        :param run: Method that runs the query: self.run_query (default),
+            self.run_query_sliced or self.run_query_incremental
+        :param kwargs: Extra keyword arguments for run
+        :return pandas.DataFrame: Bucket keys, doc_count and metrics
+        """
+        s = overridequery() if overridequery is not None else self.query()
+        run = run if run is not None else self.run_query
+        results = run(overridequery=lambda: s, **kwargs)
+        if results is s:
+            raise Aggregations.AggregationError(
+                "Query has no aggregations to make a DataFrame from")
+
+        with Timing.span('aggregations_to_dataframe') as record:
+            df = Aggregations.aggregations_to_dataframe(
+                results.to_dict(), Aggregations.get_aggs(s.to_dict()))
+            record['rows'] = len(df)
+        return df
+
     def generate_report_file(self):
         """Method to generate the report file, if format_report below is not
         used."""
@@ -151,16 +492,30 @@ class Reporter(object, metaclass=abc.ABCMeta):
         CSV and HTML generation"""
         pass
 
+    @Timing.timed('send_report', export=True)
     def send_report(self, title=None, successmessage=None):
         """Send reports as ascii, csv, html attachments.
 
         :param str title: Title of report, overrides self.title
         """
+        import pandas as pd
+        from . import TextUtils
+
         successmessage = successmessage if successmessage is not None \
             else "Report sent successfully."
 
+        # Attachment size handling, with the defaults for any keys the
+        # [email.attachments] section leaves out
+        attachments = {}
+        if self.email_info['attachments'] is not None:
+            attachments = {'compressThreshold': TextUtils.COMPRESS_THRESHOLD,
+                           'inlineLimit': TextUtils.INLINE_LIMIT,
+                           'maxMessageSize': TextUtils.MAX_MESSAGE_SIZE}
+            attachments.update(self.email_info['attachments'])
+
         text = {}
-        content = self.format_report()
+        with self.timings.span('format_report'):
+            content = self.format_report()
 
         if self.check_no_email(self.email_info['to']['email']):
             return
@@ -186,7 +541,9 @@ class Reporter(object, metaclass=abc.ABCMeta):
                     self.email_info['smtpport'],
                     self.email_info['smtpuser'],
                     self.email_info['smtppassword'],
-                    )
+                    outbox=self.__get_outbox(),
+                    logger=self.logger,
+                    **attachments)
 
                 self.logger.info(successmessage)
                 return
@@ -201,10 +558,12 @@ class Reporter(object, metaclass=abc.ABCMeta):
             sys.exit(1)
 
         emailReport = TextUtils.TextUtils(self.header)
-        text["text"] = emailReport.printAsTextTable("text", content)
-        text["csv"] = emailReport.printAsTextTable("csv", content)
-        htmldata = emailReport.printAsTextTable("html", content,
-                                                template=self.template)
+        rendered = emailReport.printAsTextTables(["text", "csv", "html"],
+                                                 content,
+                                                 template=self.template)
+        text["text"] = rendered["text"]
+        text["csv"] = rendered["csv"]
+        htmldata = rendered["html"]
 
         htmlheader = ""
         if self.header:
@@ -233,7 +592,10 @@ class Reporter(object, metaclass=abc.ABCMeta):
                             self.email_info['smtpport'],
                             self.email_info['smtpuser'],
                             self.email_info['smtppassword'],
-                            html_template=self.template)
+                            html_template=self.template,
+                            outbox=self.__get_outbox(),
+                            logger=self.logger,
+                            **attachments)
         self.logger.info("Sent reports to {0}".format(
             ", ".join(self.email_info['to']['email'])))
         return
@@ -243,16 +605,86 @@ class Reporter(object, metaclass=abc.ABCMeta):
         """Returns the Elasticsearch index pattern based on the class
         variables of start time and end time, and the index pattern fed in.
 
+        If exact_indices is true in the report's section of the config file,
+        ranges that span more than one index get a list of exactly the
+        indices in the range instead of a common-prefix wildcard.  If
+        check_indices is also true, indices that don't exist on the cluster
+        are left out.
+
         :param str index_key: Config file key name under report section that
             points to the index pattern to be passed in
         :return str: Index pattern to be used in report
         """
         try:
-            pat = self.config[self.report_type.lower()][index_key]
+            report_config = self.config[self.report_type.lower()]
+            pat = report_config[index_key]
         except KeyError:
             return 'gracc.osg.summary'
 
-        return indexpattern_generate(pattern=pat, **kwargs)
+        exact = report_config.get('exact_indices', False)
+        existing = None
+        if exact and report_config.get('check_indices', False) and '%' in pat:
+            try:
+                existing = get_existing_indices(self.client, pat)
+            except Exception as e:
+                self.logger.warning("Couldn't list existing indices.  Not "
+                                    "filtering index pattern.  Error: "
+                                    "{0}".format(e))
+
+        return indexpattern_generate(pattern=pat, exact=exact,
+                                     existing=existing, **kwargs)
+
+    def _log_query(self, body):
+        """Log a query body at DEBUG level (only formatted if a handler
+        emits it), print it if verbose, and write it to the debug dump file
+        if there is one.  The log and printed copies are limited by max_chars
+        and max_items in the [debug] section of the config file (see
+        DebugLog.format_json).
+
+        :param dict body: Query body
+        """
+        if self.verbose:
+            print(DebugLog.format_json(body, indent=4, **self.__debug_limits))
+        self.logger.debug('Query: %s',
+                          DebugLog.LazyJSON(body, **self.__debug_limits))
+        if self.debug_dump_file is not None:
+            self.debug_dump_file.write('query', body, **self.timings.labels)
+
+    def _log_response(self, body):
+        """Write a raw response to the debug dump file if there is one, or
+        else print it (within the [debug] limits) if verbose
+
+        :param dict body: Raw response
+        """
+        if self.debug_dump_file is not None:
+            self.debug_dump_file.write('response', body, **self.timings.labels)
+            if self.verbose:
+                print('Response written to {0}'.format(
+                    self.debug_dump_file.path))
+        elif self.verbose:
+            print(DebugLog.format_json(body, indent=4, **self.__debug_limits))
+
+    def _apply_filter_path(self, s, keep=()):
+        """Have Elasticsearch leave everything but the report's filter_path
+        (set on the Search with s.params(filter_path=...), or the class's
+        filter_path) out of the response, so less has to be sent and
+        parsed.  The parts run_query checks (RESPONSE_FILTER_PATH) are always
+        kept.
+
+        :param Search s: Search object returned by the query method
+        :param keep: More paths that have to be kept, e.g. MERGE_FILTER_PATH
+        :return Search: s with the filter_path param, or s itself if there's
+            no filter_path
+        """
+        filter_path = s._params.get('filter_path', self.filter_path)
+        if not filter_path:
+            return s
+        if isinstance(filter_path, str):
+            filter_path = filter_path.split(',')
+        filter_path = list(filter_path) + \
+            [path for path in RESPONSE_FILTER_PATH + list(keep)
+             if path not in filter_path]
+        return s.params(filter_path=','.join(filter_path))
 
     @staticmethod
     def sorted_buckets(agg, key=operator.attrgetter('key')):
@@ -341,6 +773,27 @@ class Reporter(object, metaclass=abc.ABCMeta):
             filepath = os.path.join(os.getcwd(), filename)
         return filepath
 
+    def export_timings(self):
+        """
+        Writes the timings recorded so far to the files in the [timing]
+        section of the config file: json_lines (spans appended as JSON
+        lines) and prometheus (per-phase totals for the node exporter's
+        textfile collector).  {report} and {vo} in the paths are replaced
+        with the report type and VO.  Does nothing for files that aren't
+        configured.
+        """
+        timing_config = self.config.get('timing', {})
+        for key, write in (('json_lines', self.timings.write_json_lines),
+                           ('prometheus', self.timings.write_prometheus)):
+            if key not in timing_config:
+                continue
+            path = timing_config[key].format(**self.timings.labels)
+            try:
+                write(path)
+            except OSError as e:
+                self.logger.warning("Couldn't write timings to {0}: "
+                                    "{1}".format(path, e))
+
     # Non-public methods
 
     @staticmethod
@@ -353,17 +806,60 @@ class Reporter(object, metaclass=abc.ABCMeta):
         """
         print("Using config file ", configfile)
         if os.path.exists(configfile):
-            try:
-                with open(configfile, 'r') as f:
-                    config = toml.loads(f.read())
-            except toml.TomlDecodeError as e:
-                print("Cannot decode toml file")
-                print(e)
-                raise
-            return config
+            cache_key = (os.path.abspath(configfile),
+                         os.path.getmtime(configfile))
+            if cache_key not in _config_cache:
+                try:
+                    with open(configfile, 'r') as f:
+                        _config_cache[cache_key] = toml.loads(f.read())
+                except toml.TomlDecodeError as e:
+                    print("Cannot decode toml file")
+                    print(e)
+                    raise
+            # Reports are free to modify their config, so don't share it
+            return copy.deepcopy(_config_cache[cache_key])
         else:
             raise OSError("Cannot find file {0:s}".format(configfile))
 
+    def __index_for_window(self, window_start, window_end):
+        """Index pattern for one time window of a sliced query
+
+        :param datetime window_start: Start of the window
+        :param datetime window_end: End of the window (exclusive)
+        :return str: Index pattern
+        """
+        # window_end is exclusive, so it shouldn't pull in the next index
+        last = max(window_start, window_end - timedelta(microseconds=1))
+        return self.indexpattern_generate(self.index_key, start=window_start,
+                                          end=last)
+
+    def __run_paginated_query(self, s, body, page_size):
+        """Generator that yields the composite buckets for Search s, logging
+        any errors the way run_query does.  The time spent fetching the pages
+        is recorded as a run_query span, with the number of buckets.
+
+        :param Search s: Search object returned by the query method
+        :param dict body: s.to_dict()
+        :param int page_size: Number of buckets per page
+        :return generator: AttrDict composite buckets
+        """
+        from opensearchpy import connections
+
+        try:
+            n_buckets = 0
+            for bucket in self.timings.iterate(
+                    'run_query', Aggregations.iter_composite_buckets(
+                        connections.get_connection(s._using), s._index, body,
+                        page_size=page_size, **s._params),
+                    count='buckets'):
+                n_buckets += 1
+                yield bucket
+            self.logger.info('Ran paginated elasticsearch query successfully.'
+                             '  Returned {0} buckets'.format(n_buckets))
+        except Exception as e:
+            self.logger.exception(e)
+            raise
+
     def __check_vo(self, vo):
         """
         Check to see if the vo is a section in config file (as of this writing,
@@ -392,55 +888,88 @@ class Reporter(object, metaclass=abc.ABCMeta):
                 if vo.lower() in self.config else [vo.lower(), ]
             return vo
 
+    def _es_client_settings(self):
+        """Get the elasticsearch host and client settings from the
+        [elasticsearch] section of the config file.  Besides the host keys,
+        that section can set ok_statuses, timeout, pool_maxsize, health_ttl,
+        http_compress, and hedge_hosts (a list of other host keys in the
+        section to hedge searches to, see Hedging) with hedge_percentile
+        and hedge_delay.
+
+        Settings that aren't in the config file are left out, so
+        ClientFactory's defaults apply.
+
+        :return tuple: (hostname, dict of keyword arguments for
+            ClientFactory.get_client).  hostname is None if it isn't in the
+            config file
+        """
+        _es_part = self.config.get('elasticsearch', {})
+
+        if self.althost_key is not None:
+            try:
+                _hostname = _es_part[self.althost_key]
+            except KeyError:
+                raise KeyError("Reporter class instantiated with althost_key" 
+                    " \'{0}\' that isn't set in the configuration file.".format(
+                        self.althost_key))
+        else:
+            _hostname = _es_part.get('hostname')
+
+        settings = {key: _es_part[key] for key in
+                    ('ok_statuses', 'timeout', 'pool_maxsize', 'health_ttl',
+                     'http_compress', 'hedge_percentile', 'hedge_delay')
+                    if key in _es_part}
+        if _es_part.get('hedge_hosts'):
+            try:
+                settings['hedge_hosts'] = [_es_part[key] for key in
+                                           _es_part['hedge_hosts']]
+            except KeyError as e:
+                raise KeyError("hedge_hosts names the host key {0} that isn't "
+                               "set in the configuration file.".format(e))
+        if self.replay is not None:
+            settings['replay'] = self.replay
+            settings['replay_latency'] = self.replay_latency
+        elif self.record is not None:
+            settings['record'] = self.record
+        return _hostname, settings
+
+    def __get_client_settings(self):
+        """Check the elasticsearch settings in the config file (see
+        _es_client_settings), so bad ones stop the report right away, before
+        the client is needed.
+
+        :return tuple: (hostname, settings) from _es_client_settings
+        """
+        try:
+            return self._es_client_settings()
+        except Exception as e:
+            self.logger.exception("Couldn't initialize Elasticsearch instance."
+                                  " Error: {0}".format(e))
+            sys.exit(1)
+
     def __establish_client(self):
-        """Initialize and return the elasticsearch client
+        """Get the shared elasticsearch client for the configured host from
+        ClientFactory.  This doesn't connect to the host.  The cluster health
+        is checked right before the first query.
 
-        :return: elasticsearch.Elasticsearch object
+        :return: opensearchpy.OpenSearch object
         """
-        _fallback_ok = ['green', 'yellow']
-        _default_host = 'https://gracc.opensciencegrid.org/q'
+        from . import ClientFactory
 
         if self.verbose:
+            import http.client
             http.client.HTTPConnection.debuglevel = 1
             http.client.HTTPSConnection.debuglevel = 1
 
-
-        def __start_client(hostname, ok_statuses):
-            if self.verbose:
-                print(hostname)
-            _client = OpenSearch(hostname,
-                                    verify_certs=False,
-                                    timeout=60)
-
-            _cat_client = client.CatClient(_client)
-            assert _cat_client.health(h=["status",]).strip()\
-                in ok_statuses
-            return _client
-
         try:
-            try:
-                _es_part = self.config['elasticsearch']
-            except KeyError:
-                # ES hosts not configured in config file, so use default values
-                _hostname = _default_host
-                _ok_statuses = _fallback_ok
-                return __start_client(_hostname, _ok_statuses)
+            _hostname, _settings = self.__client_settings
+            if _hostname is None:
+                _hostname = ClientFactory.DEFAULT_HOST
 
-            _ok_statuses = self.config['elasticsearch'].get(
-                'ok_statuses', _fallback_ok)
+            if self.verbose:
+                print(_hostname)
 
-            if self.althost_key is not None:
-                try:
-                    _hostname = self.config['elasticsearch'][self.althost_key]        
-                except KeyError:
-                    raise KeyError("Reporter class instantiated with althost_key" 
-                        " \'{0}\' that isn't set in the configuration file.".format(
-                            self.althost_key))
-            else:
-                _hostname = self.config['elasticsearch'].get(
-                    'hostname', _default_host)
-            
-            return __start_client(_hostname, _ok_statuses)
+            return ClientFactory.get_client(_hostname, **_settings)
         except Exception as e:
             self.logger.exception("Couldn't initialize Elasticsearch instance."
                                   " Error: {0}".format(e))
@@ -501,8 +1030,83 @@ class Reporter(object, metaclass=abc.ABCMeta):
         for key in ("from", "smtphost", "smtpport", "smtpuser", "smtppassword"):
             email_info[key] = copy.deepcopy(config_email_info[key])
 
+        # Optional attachment size handling, as TextUtils.sendEmail kwargs.
+        # None (off) if there's no [email.attachments] section
+        email_info['attachments'] = None
+        if 'attachments' in config_email_info:
+            attachments = config_email_info['attachments']
+            email_info['attachments'] = {}
+            for key, kwarg, scale in (
+                    ('compress_threshold_kb', 'compressThreshold', 1024),
+                    ('inline_limit_kb', 'inlineLimit', 1024),
+                    ('max_message_mb', 'maxMessageSize', 1024 * 1024)):
+                if key in attachments:
+                    email_info['attachments'][kwarg] = \
+                        int(attachments[key] * scale)
+            if 'compression' in attachments:
+                email_info['attachments']['compression'] = \
+                    attachments['compression']
+
         return email_info
 
+    def __get_outbox(self):
+        """Get the outbox to spool emails in, if spooling is on.  The
+        directory can be set with directory in the [email.outbox] section of
+        the config file.
+
+        :return Outbox: Outbox, or None if emails should be sent right away
+        """
+        from .Outbox import Outbox, DEFAULT_OUTBOX_DIR
+
+        if not self.spool:
+            return None
+        outbox_config = self.config['email'].get('outbox', {})
+        return Outbox(outbox_config.get('directory', DEFAULT_OUTBOX_DIR))
+
+    def __get_query_cache(self):
+        """Set up the query cache from the [cache] section of the config
+        file, if there is one.  Keys are directory, max_size_mb, recent_ttl
+        (seconds) and enabled.
+
+        :return QueryCache: Cache, or None if caching isn't configured
+        """
+        try:
+            cache_config = self.config['cache']
+        except KeyError:
+            return None
+
+        if not self.use_cache or not cache_config.get('enabled', True):
+            return None
+
+        cache_kwargs = {}
+        if 'directory' in cache_config:
+            cache_kwargs['directory'] = cache_config['directory']
+        if 'max_size_mb' in cache_config:
+            cache_kwargs['max_bytes'] = cache_config['max_size_mb'] * 1024 * 1024
+        if 'recent_ttl' in cache_config:
+            cache_kwargs['recent_ttl'] = cache_config['recent_ttl']
+        return QueryCache(**cache_kwargs)
+
+    def __get_debug_settings(self):
+        """Get the limits for logged and printed bodies, and the debug dump
+        file, from the [debug] section of the config file: max_chars,
+        max_items (0 for no limit) and dump_file.  {report} and {vo} in
+        dump_file are replaced with the report type and VO.  The debug_dump
+        keyword argument overrides dump_file.
+
+        :return tuple: (kwargs for DebugLog.format_json, DebugLog.DumpFile
+            or None)
+        """
+        debug_config = self.config.get('debug', {})
+        limits = {'max_chars': debug_config.get('max_chars',
+                                                DebugLog.DEFAULT_MAX_CHARS),
+                  'max_items': debug_config.get('max_items',
+                                                DebugLog.DEFAULT_MAX_ITEMS)}
+        path = self.debug_dump
+        if path is None and 'dump_file' in debug_config:
+            path = debug_config['dump_file'].format(**self.timings.labels)
+        return limits, DebugLog.DumpFile(path) if path is not None else None
+
     def __setup_gen_logger(self):
         """Creates logger for Reporter class.
 
@@ -573,6 +1177,9 @@ def runerror(config, error, traceback, logfile):
             f.write(str(error))
     print(error, file=sys.stderr)
 
+    from email.mime.text import MIMEText
+    from . import TextUtils
+
     with open(config, 'r') as f:
         c = toml.loads(f.read())
     admin_emails = c['email']['test']['emails']
@@ -585,9 +1192,9 @@ def runerror(config, error, traceback, logfile):
     msg['To'] = ', '.join(admin_emails)
 
     try:
-        s = smtplib.SMTP(c['email']['smtphost'])
-        s.sendmail(from_email, admin_emails, msg.as_string())
-        s.quit()
+        with TextUtils.mail_transport(c['email']['smtphost'],
+                                      ssl=False) as transport:
+            transport.send(from_email, admin_emails, msg.as_string())
         print("Successfully sent error email")
     except Exception as e:
         err = "Error:  unable to send email.\n%s\n" % e
@@ -652,6 +1259,28 @@ def get_report_parser(no_time_options=False):
     always_include.add_argument("-L", "--logfile", dest="logfile",
                         default=None, help="Specify non-standard location"
                         "for logfile")
+    always_include.add_argument("-S", "--spool", dest="spool",
+                        action="store_true", default=False,
+                        help="Put emails in the outbox for the flusher "
+                             "(python -m gracc_reporting.Outbox) to send, "
+                             "instead of sending them now")
+    always_include.add_argument("--record", dest="record", default=None,
+                        metavar="CASSETTE",
+                        help="save every Elasticsearch request and response "
+                             "in the file CASSETTE")
+    always_include.add_argument("--replay", dest="replay", default=None,
+                        metavar="CASSETTE",
+                        help="answer Elasticsearch requests from the file "
+                             "CASSETTE (made with --record) instead of the "
+                             "host")
+    always_include.add_argument("--replay-latency", dest="replay_latency",
+                        type=float, default=0., metavar="SECONDS",
+                        help="with --replay, wait this long before "
+                             "answering each request")
+    always_include.add_argument("--debug-dump", dest="debug_dump",
+                        default=None, metavar="FILE",
+                        help="append every query and response, in full, to "
+                             "the gzipped JSON lines file FILE")
     if no_time_options:
         return parser
 
@@ -2,15 +2,34 @@
 
 import time
 import sys
+import logging
 import datetime
-from io import StringIO
-import smtplib
+from contextlib import contextmanager
+from io import StringIO, BytesIO
 from email.message import EmailMessage
-import tabulate
 import pandas as pd
 from email.utils import formataddr
+import gzip
+import zipfile
 
 from . import NiceNum
+from . import Timing
+from .MailTransport import MailTransport
+from .TableRenderer import render_table
+
+# Attachment size handling in sendEmail, in bytes.  sendEmail doesn't do any
+# unless it's asked to; these are the defaults for the keys of a config
+# file's [email.attachments] section
+COMPRESS_THRESHOLD = 1024 * 1024
+INLINE_LIMIT = 512 * 1024
+MAX_MESSAGE_SIZE = 20 * 1024 * 1024
+# Lines of the text table to put in the summary email sent instead of a
+# report that's over MAX_MESSAGE_SIZE
+SUMMARY_LINES = 50
+
+# Open SMTP sessions, {(host, port, user, ssl): MailTransport}.  None unless
+# inside shared_smtp_sessions()
+_smtp_sessions = None
 
 
 ##########################################
@@ -48,31 +67,64 @@ class TextUtils:
             text (dict of lists) - {column_name:[values],column_name:[values]} where column_name corresponds to header name
                                    or pandas dataframe
         """
+        return self._render(format_type, self.toDataFrame(text))
+
+    def printAsTextTables(self, format_types, text, template=False):
+        """Prepares input text in several formats at once.  The content is
+        converted to a DataFrame only once, and every format is rendered from
+        that.
+        Args:
+            format_types(list of str) - any of text, csv, html
+            text (dict of lists or pandas dataframe) - as for printAsTextTable
+        Returns:
+            dict of {format_type: rendered str}
+        """
+        df = self.toDataFrame(text)
+        return {format_type: self._render(format_type, df)
+                for format_type in format_types}
 
+    def toDataFrame(self, text):
+        """Converts the content to a DataFrame with columns in header order
+        Args:
+            text (dict of lists or pandas dataframe) - as for printAsTextTable
+        """
         if not isinstance(text, pd.DataFrame):
-            # Convert list of dicts to pandas data frame
-            df = pd.DataFrame.from_dict(text, orient='index').transpose()
-            # Order the columns according to the header
-            df = df[self.table_header]
+            with Timing.span('to_dataframe') as span:
+                # Convert list of dicts to pandas data frame
+                df = pd.DataFrame.from_dict(text, orient='index').transpose()
+                # Order the columns according to the header
+                df = df[self.table_header]
+                span['rows'] = len(df)
         else:
             df = text
+        return df
 
+    def _render(self, format_type, df):
+        """Renders a DataFrame from toDataFrame in one format"""
         # TODO: Remove this alignment code when python-tabulate recognizes
         # numbers with comma separators.
         alignment_list = ["left"] * (len(self.table_header) - 1)
         alignment_list.append("right")
-        # the order is defined by header list
-        if format_type == "text":
-            return tabulate.tabulate(df, tablefmt="grid", headers=self.table_header,
-                                     showindex=False, floatfmt=',.0f', colalign=alignment_list)
-        elif format_type == "html":
-            return tabulate.tabulate(df, tablefmt="html", headers=self.table_header,
-                                     showindex=False, floatfmt=',.0f', colalign=alignment_list)
-        elif format_type == "csv":
-            return df.to_csv(index=False)
-
-
-def sendEmail(toList, subject, content, fromEmail=None, smtpServerHost=None, smtpPort=None, smtpUser=None, smtpPassword=None, html_template=False):
+        # the order is defined by header list.  render_table gives the same
+        # output as tabulate, much faster for large tables
+        with Timing.span('render_' + str(format_type), rows=len(df)) as span:
+            if format_type == "text":
+                result = render_table(df, self.table_header, tablefmt="grid",
+                                      colalign=alignment_list, floatfmt=',.0f')
+            elif format_type == "html":
+                result = render_table(df, self.table_header, tablefmt="html",
+                                      colalign=alignment_list, floatfmt=',.0f')
+            elif format_type == "csv":
+                result = df.to_csv(index=False)
+            else:
+                return None
+            span['bytes_out'] = len(result)
+        return result
+
+
+def sendEmail(toList, subject, content, fromEmail=None, smtpServerHost=None, smtpPort=None, smtpUser=None, smtpPassword=None, html_template=False,
+              compressThreshold=None, compression='gzip', inlineLimit=None, maxMessageSize=None,
+              outbox=None, logger=None):
     """
     This turns the "report" into an email attachment and sends it to the EmailTarget(s).
     Args:
@@ -80,6 +132,15 @@ def sendEmail(toList, subject, content, fromEmail=None, smtpServerHost=None, smt
     content(str) - email content
     fromEmail (str) - from email address
     smtpServerHost(str) - smtpHost
+    compressThreshold(int) - attachments bigger than this many bytes are compressed (None: never; see
+                             COMPRESS_THRESHOLD for a suggested value)
+    compression(str) - gzip or zip
+    inlineLimit(int) - text content bigger than this many bytes is only put in the body once, as
+                       plain text, instead of also as <pre> HTML (None: no limit)
+    maxMessageSize(int) - if the message is still bigger than this many bytes, a summary is sent
+                          instead, with no attachments (None: no limit)
+    outbox(Outbox) - if given, put the message in this outbox instead of sending it now
+    logger(logging.Logger) - where to log sending a summary instead (default: this module's logger)
     """
 
     #Charset.add_charset('utf-8', Charset.QP, Charset.QP, 'utf-8')
@@ -88,14 +149,87 @@ def sendEmail(toList, subject, content, fromEmail=None, smtpServerHost=None, smt
         print("Cannot send mail (no To: specified)!", file=sys.stderr)
         sys.exit(1)
 
-    msg = EmailMessage()
-    msg["Subject"] = subject
-    msg["From"] = formataddr(fromEmail)
-    msg["To"] = _toStr(toList)
-    # new code
+    with Timing.span('build_email') as span:
+        msg = buildEmail(toList, subject, content, fromEmail, html_template,
+                         compressThreshold, compression, inlineLimit).as_string()
+
+        if maxMessageSize is not None and len(msg) > maxMessageSize:
+            warning = "Report email is {0:,} bytes, over the limit of {1:,}.  Sending a summary " \
+                      "instead".format(len(msg), maxMessageSize)
+            print(warning, file=sys.stderr)
+            (logger or logging.getLogger(__name__)).warning(warning)
+            msg = buildSummaryEmail(toList, subject, content, fromEmail, len(msg),
+                                    maxMessageSize).as_string()
+        span['bytes_out'] = len(msg)
+
+    if len(toList[1]) != 0 and outbox is not None:
+        with Timing.span('queue_email', bytes_out=len(msg)):
+            outbox.put(fromEmail[1], toList[1], msg)
+        print("Succesfully queued email in outbox {0}".format(outbox.directory))
+    elif len(toList[1]) != 0:
+        with Timing.span('send_email', bytes_out=len(msg)), \
+                mail_transport(smtpServerHost, smtpPort, smtpUser,
+                               smtpPassword) as transport:
+            transport.send(fromEmail[1], toList[1], msg)
+        print("Succesfully sent email")
+    else:
+        # The email list isn't valid, so we write it to stderr and hope
+        # it reaches somebody who cares.
+        print("Problem in sending email to: ", toList, file=sys.stderr)
+
+
+@contextmanager
+def mail_transport(host, port=None, user=None, password=None, ssl=True):
+    """Context manager giving a MailTransport for the server.  Inside
+    shared_smtp_sessions, this is the shared transport for the server, and
+    it stays open afterwards.  Otherwise, it's a new one that's closed on
+    exit.
+    """
+    if _smtp_sessions is None:
+        with MailTransport(host, port, user, password, ssl=ssl) as transport:
+            yield transport
+        return
+
+    key = (host, port, user, ssl)
+    if key not in _smtp_sessions:
+        _smtp_sessions[key] = MailTransport(host, port, user, password,
+                                            ssl=ssl)
+    yield _smtp_sessions[key]
+
+
+@contextmanager
+def shared_smtp_sessions():
+    """Context manager within which sendEmail (and anything else using
+    mail_transport) keeps its SMTP sessions open and reuses them for later
+    emails to the same server, instead of connecting and logging in for
+    every email.  The sessions are closed on exit.
+    """
+    global _smtp_sessions
+    if _smtp_sessions is not None:
+        # Already sharing sessions
+        yield
+        return
+
+    _smtp_sessions = {}
+    try:
+        yield
+    finally:
+        sessions, _smtp_sessions = _smtp_sessions, None
+        for transport in sessions.values():
+            transport.close()
+
+
+def buildEmail(toList, subject, content, fromEmail, html_template=False,
+               compressThreshold=None, compression='gzip', inlineLimit=None):
+    """Builds the report email that sendEmail sends.  Arguments are as for sendEmail.
+    Returns:
+        EmailMessage
+    """
+    msg = _newMessage(toList, subject, fromEmail)
     if "text" in content:
         msg.set_content(content["text"], 'plain')
-        msg.add_alternative("<pre>" + content["text"] + "</pre>", subtype="html")
+        if inlineLimit is None or len(content["text"].encode('utf-8')) <= inlineLimit:
+            msg.add_alternative("<pre>" + content["text"] + "</pre>", subtype="html")
 
     if html_template:
         attachment_html = content["html"]
@@ -103,22 +237,53 @@ def sendEmail(toList, subject, content, fromEmail=None, smtpServerHost=None, smt
         attachment_html = "<html><head><title>%s</title></head><body>%s</body>" \
                       "</html>" % (subject, content["html"])
 
-    msg.add_attachment(attachment_html, filename="report_{}.html".format(datetime.datetime.now().strftime('%Y_%m_%d')))
+    date = datetime.datetime.now().strftime('%Y_%m_%d')
+    _addAttachment(msg, attachment_html, "report_{}.html".format(date), compressThreshold, compression)
     if "csv" in content:
-        msg.add_attachment(content["csv"], filename="report_{}.csv".format(datetime.datetime.now().strftime('%Y_%m_%d')))
+        _addAttachment(msg, content["csv"], "report_{}.csv".format(date), compressThreshold, compression)
+    return msg
 
-    msg = msg.as_string()
 
-    if len(toList[1]) != 0:
-        server = smtplib.SMTP_SSL(host=smtpServerHost, port=smtpPort)
-        server.login(user=smtpUser, password=smtpPassword)
-        server.sendmail(fromEmail[1], toList[1], msg)
-        server.quit()
-        print("Succesfully sent email")
+def buildSummaryEmail(toList, subject, content, fromEmail, size, maxMessageSize):
+    """Builds the email sent instead of a report that's too big: a note and the
+    first SUMMARY_LINES lines of the text table, with no attachments.
+    Returns:
+        EmailMessage
+    """
+    msg = _newMessage(toList, subject, fromEmail)
+    summary = "The full report email would have been {0:,} bytes, which is over the limit of " \
+              "{1:,} bytes, so only a summary was sent.\n".format(size, maxMessageSize)
+    if "text" in content:
+        lines = content["text"].splitlines()
+        summary += "\n" + "\n".join(lines[:SUMMARY_LINES])
+        if len(lines) > SUMMARY_LINES:
+            summary += "\n... ({0:,} more lines)".format(len(lines) - SUMMARY_LINES)
+    msg.set_content(summary, 'plain')
+    return msg
+
+
+def _newMessage(toList, subject, fromEmail):
+    msg = EmailMessage()
+    msg["Subject"] = subject
+    msg["From"] = formataddr(fromEmail)
+    msg["To"] = _toStr(toList)
+    return msg
+
+
+def _addAttachment(msg, data, filename, compressThreshold, compression):
+    """Attaches data (str) to msg, compressed if it's over compressThreshold bytes"""
+    raw = data.encode('utf-8')
+    if compressThreshold is None or len(raw) <= compressThreshold:
+        msg.add_attachment(data, filename=filename)
+    elif compression == 'zip':
+        buf = BytesIO()
+        with zipfile.ZipFile(buf, 'w', zipfile.ZIP_DEFLATED) as z:
+            z.writestr(filename, raw)
+        msg.add_attachment(buf.getvalue(), 'application', 'zip', filename=filename + '.zip')
+    elif compression == 'gzip':
+        msg.add_attachment(gzip.compress(raw), 'application', 'gzip', filename=filename + '.gz')
     else:
-        # The email list isn't valid, so we write it to stderr and hope
-        # it reaches somebody who cares.
-        print("Problem in sending email to: ", toList, file=sys.stderr)
+        raise ValueError("Unknown compression {0}.  Use gzip or zip".format(compression))
 
 
 def _toStr(toList):
@@ -0,0 +1,257 @@
+"""Run a GRACC aggregation query over a long time range as a set of shorter
+time windows, in parallel, and merge the results back together.  Each window
+is a separate search request, so no one request has to cover the whole range,
+and the windows can run concurrently against the same client."""
+
+import copy
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from dateutil import parser, tz
+
+from . import Aggregations
+
+DEFAULT_TIME_FIELD = 'EndTime'
+DEFAULT_MAX_WORKERS = 4
+
+_LOWER = ('gte', 'gt')
+_UPPER = ('lt', 'lte')
+# Appended to a range's own format when ISO bounds are mixed with its own
+_ISO_FORMAT = 'strict_date_optional_time'
+_EPOCH = datetime(1970, 1, 1, tzinfo=tz.tzutc())
+
+
+def _epoch_unit(fmt):
+    """Units per second of epoch bounds under a range's format: 1 for
+    epoch_second, 1000 for epoch_millis, or None if neither is in it"""
+    for name in (fmt or '').split('||'):
+        if name.strip() == 'epoch_second':
+            return 1
+        if name.strip() == 'epoch_millis':
+            return 1000
+    return None
+
+
+def _is_epoch(value, fmt):
+    """Whether a range bound is an epoch time rather than a date string"""
+    if isinstance(value, bool):
+        return False
+    if isinstance(value, (int, float)):
+        return True
+    return isinstance(value, str) and _epoch_unit(fmt) is not None and \
+        value.lstrip('-').isdigit()
+
+
+def _bound_time(value, fmt):
+    """Parse an original range bound
+
+    :param value: Range bound (epoch number or date string)
+    :param str fmt: The range's format, if any
+    :return datetime: tz-aware bound, or None if it can't be parsed
+    """
+    if _is_epoch(value, fmt):
+        return datetime.fromtimestamp(float(value) / (_epoch_unit(fmt) or 1000),
+                                      tz.tzutc())
+    try:
+        parsed = parser.parse(value)
+    except (ValueError, OverflowError, TypeError):
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=tz.tzutc())
+    return parsed
+
+
+def _format_bound(timestamp, like, fmt):
+    """Format a window boundary the same way as the original range bound:
+    epoch bounds in the units of the range's format (epoch_millis unless it
+    says epoch_second), anything else as an ISO 8601 string
+
+    :param datetime timestamp: tz-aware UTC window boundary
+    :param like: Original value of the range bound
+    :param str fmt: The range's format, if any
+    :return: Formatted boundary
+    """
+    if _is_epoch(like, fmt):
+        epoch = int(round((timestamp - _EPOCH).total_seconds() *
+                          (_epoch_unit(fmt) or 1000)))
+        return str(epoch) if isinstance(like, str) else epoch
+    return timestamp.isoformat()
+
+
+def _retime_range(old, start, end):
+    """New range on the time field for [start, end).  A window that reaches
+    the start or end of the original range keeps the original bound there,
+    so an inclusive end (lte) or exclusive start (gt) still holds at the
+    ends of the whole range.
+
+    :param dict old: Original range options ({'gte': ..., 'lt': ...,
+        'format': ...})
+    :param datetime start: tz-aware UTC start of the window
+    :param datetime end: tz-aware UTC end of the window
+    :return dict: New range options
+    """
+    fmt = old.get('format')
+    new = {k: v for k, v in old.items() if k not in _LOWER + _UPPER}
+    kept = []
+    formatted = []
+    for keys, default, timestamp, reached in (
+            (_LOWER, 'gte', start, lambda t: start <= t),
+            (_UPPER, 'lt', end, lambda t: end >= t)):
+        key = next((k for k in keys if k in old), None)
+        like = old[key] if key is not None else \
+            next((old[k] for k in _LOWER + _UPPER if k in old), None)
+        if key is not None:
+            bound = _bound_time(old[key], fmt)
+            if bound is not None and reached(bound):
+                new[key] = old[key]
+                kept.append(old[key])
+                continue
+        new[default] = _format_bound(timestamp, like, fmt)
+        formatted.append(new[default])
+
+    # ISO bounds don't match a format of the range's own
+    if fmt is not None and _epoch_unit(fmt) is None and \
+            any(isinstance(v, str) for v in formatted):
+        if kept:
+            if _ISO_FORMAT not in fmt.split('||'):
+                new['format'] = '{0}||{1}'.format(fmt, _ISO_FORMAT)
+        else:
+            del new['format']
+    return new
+
+
+def retime_body(body, start, end, time_field=DEFAULT_TIME_FIELD):
+    """Return a copy of a query body with every range clause on time_field
+    replaced by [start, end).  Where the window reaches the start or end of
+    the original range, the original bound is kept (see _retime_range)
+
+    :param dict body: Query body (Search.to_dict())
+    :param datetime start: tz-aware UTC start of the new range
+    :param datetime end: tz-aware UTC end of the new range
+    :param str time_field: Name of the field the report's range filter is on
+    :return dict: New query body
+    """
+    new_body = copy.deepcopy(body)
+    found = []
+
+    def _retime(node):
+        if isinstance(node, dict):
+            if 'range' in node and time_field in node['range']:
+                node['range'][time_field] = _retime_range(
+                    node['range'][time_field], start, end)
+                found.append(node)
+            for value in node.values():
+                _retime(value)
+        elif isinstance(node, list):
+            for value in node:
+                _retime(value)
+
+    _retime(new_body.get('query', {}))
+    if not found:
+        raise ValueError("Query has no range clause on {0} to split "
+                         "on".format(time_field))
+    return new_body
+
+
+def range_end(body, time_field=DEFAULT_TIME_FIELD):
+    """End of the time range a query body covers
+
+    :param dict body: Query body (Search.to_dict())
+    :param str time_field: Name of the field the range filter is on
+    :return datetime: Latest end of the range clauses on time_field, or None
+        if there are none, or any of them has no end that can be parsed
+        (open-ended, date math, etc.)
+    """
+    ends = []
+
+    def _find(node):
+        if isinstance(node, dict):
+            if 'range' in node and time_field in node['range']:
+                old = node['range'][time_field]
+                key = next((k for k in _UPPER if k in old), None)
+                ends.append(_bound_time(old[key], old.get('format'))
+                            if key is not None else None)
+            for value in node.values():
+                _find(value)
+        elif isinstance(node, list):
+            for value in node:
+                _find(value)
+
+    _find(body.get('query', {}))
+    if not ends or None in ends:
+        return None
+    return max(ends)
+
+
+def combine_responses(body, responses):
+    """Combine the raw responses of the same query run over disjoint time
+    windows into one raw response
+
+    :param dict body: Query body the responses came from
+    :param list responses: Raw response dicts
+    :return dict: Combined raw response
+    """
+    shards = {}
+    for response in responses:
+        for key, value in response.get('_shards', {}).items():
+            if isinstance(value, int):
+                shards[key] = shards.get(key, 0) + value
+
+    total_hits = 0
+    for response in responses:
+        total = response.get('hits', {}).get('total', 0)
+        total_hits += total['value'] if isinstance(total, dict) else total
+
+    combined = {
+        'took': max([r.get('took', 0) for r in responses] or [0]),
+        'timed_out': any(r.get('timed_out') for r in responses),
+        '_shards': shards,
+        'hits': {'total': {'value': total_hits, 'relation': 'eq'},
+                 'max_score': None, 'hits': []},
+    }
+    agg_defs = Aggregations.get_aggs(body)
+    if agg_defs:
+        combined['aggregations'] = Aggregations.merge_aggregations(
+            agg_defs, [r.get('aggregations', {}) for r in responses])
+    return combined
+
+
+def run_windows(client, body, windows, index_for_window,
+                time_field=DEFAULT_TIME_FIELD, max_workers=DEFAULT_MAX_WORKERS,
+                **search_kwargs):
+    """Run body once per time window on a thread pool
+
+    :param client: opensearchpy.OpenSearch client, shared by all threads
+    :param dict body: Query body (Search.to_dict())
+    :param list windows: list of (start, end) tuples, e.g. from
+        TimeUtils.split_time_range
+    :param function index_for_window: Called with (start, end), returns the
+        index pattern to query for that window
+    :param str time_field: Name of the field the range filter is on
+    :param int max_workers: Number of windows to query at once
+    :param search_kwargs: Extra keyword arguments for client.search
+    :return list: Raw response for each window, in the same order as windows
+    """
+    def _run_window(window):
+        window_start, window_end = window
+        window_body = retime_body(body, window_start, window_end, time_field)
+        return Aggregations.check_response(
+            client.search(index=index_for_window(window_start, window_end),
+                          body=window_body, **search_kwargs))
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(_run_window, windows))
+
+
+def run_sliced(client, body, windows, index_for_window,
+               time_field=DEFAULT_TIME_FIELD, max_workers=DEFAULT_MAX_WORKERS,
+               **search_kwargs):
+    """Run body once per time window on a thread pool and merge the results.
+    Arguments are the same as run_windows.
+
+    :return dict: Combined raw response
+    """
+    responses = run_windows(client, body, windows, index_for_window,
+                            time_field=time_field, max_workers=max_workers,
+                            **search_kwargs)
+    return combine_responses(body, responses)
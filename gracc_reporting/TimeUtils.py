@@ -4,14 +4,41 @@ reporting.  Note that in this module, parse_datetime is the only function
 that can accept non-UTC timestamps.  All other functions assume either epoch
 time or UTC timestamps"""
 
-from datetime import datetime, date
+from datetime import datetime, date, timedelta
 from calendar import timegm
+from functools import lru_cache
 
 from dateutil import tz, parser
 
+# Time zones, created once instead of on every conversion
+UTC = tz.tzutc()
+LOCAL = tz.tzlocal()
+
+# Epoch time units, and how many of them make a second
+EPOCH_UNITS = {'second': 1, 'millisecond': 1e3, 'microsecond': 1e6}
+
+# Number of distinct timestamp strings parse_datetime remembers the parse of
+PARSE_CACHE_SIZE = 4096
+
 class InvalidUnitError(ValueError):
     pass
 
+
+@lru_cache(maxsize=PARSE_CACHE_SIZE)
+def _parse_string(timestamp):
+    """dateutil.parser.parse, memoized, since reports parse the same few
+    timestamps over and over.  datetimes are immutable, so sharing them is
+    safe."""
+    return parser.parse(timestamp)
+
+
+def _epoch_divisor(unit):
+    try:
+        return EPOCH_UNITS[unit]
+    except KeyError:
+        raise InvalidUnitError("unit passed in was {0}. unit must be one "
+                               "of {1}.".format(unit, ', '.join(EPOCH_UNITS)))
+
 def parse_datetime(timestamp, utc=False):
     """
     Parse datetime, return as UTC time datetime
@@ -30,13 +57,13 @@ def parse_datetime(timestamp, utc=False):
         min_timestamp = datetime.min.time()
         _timestamp = datetime.combine(timestamp, min_timestamp)
     else:
-        _timestamp = parser.parse(timestamp)
+        _timestamp = _parse_string(timestamp)
 
     if not utc:
-        _timestamp = _timestamp.replace(tzinfo=tz.tzlocal())  # Assume time is local TZ
+        _timestamp = _timestamp.replace(tzinfo=LOCAL)  # Assume time is local TZ
     else:
-        _timestamp = _timestamp.replace(tzinfo=tz.tzutc())
-    return _timestamp.astimezone(tz.tzutc())
+        _timestamp = _timestamp.replace(tzinfo=UTC)
+    return _timestamp.astimezone(UTC)
 
 
 def epoch_to_datetime(timestamp, unit='second'):    # Note that changes might affect JSR links
@@ -46,24 +73,41 @@ def epoch_to_datetime(timestamp, unit='second'):    # Note that changes might af
     :param timestamp:  string or int.  Timestamp to convert to datetime.datetime object
     :return:  datetime.datetime object in UTC time zone
     """
-    _accepted_units = {'second': 1, 'millisecond': 1e3, 'microsecond': 1e6}
-
     if timestamp is None:
         return None
 
     if not isinstance(timestamp, (float, int)):
         timestamp = float(timestamp)
 
-    try:
-        _timestamp = timestamp / _accepted_units[unit]
-    except KeyError:
-        raise InvalidUnitError("unit passed in was {0}. unit must be one "
-                               "of {1}.".format(unit, ', '.join(
-                                   _accepted_units)))
+    _timestamp = timestamp / _epoch_divisor(unit)
+
+    return datetime.fromtimestamp(int(round(_timestamp)), UTC)
 
-    timestamp = int(round(_timestamp))
-    dt_timestamp = datetime.utcfromtimestamp(timestamp)
-    return parse_datetime(dt_timestamp, utc=True)
+
+def epoch_to_datetime_array(timestamps, unit='second'):
+    """
+    Vectorized epoch_to_datetime:  convert a whole column of epoch
+    timestamps in one call.  Like epoch_to_datetime, timestamps are rounded
+    to the second.
+
+    :param timestamps:  list, numpy array or pandas Series of numbers (or
+        numeric strings).  None and NaN become NaT
+    :param str unit: second, millisecond or microsecond
+    :return:  pandas Series (for a Series, with the same index) or
+        DatetimeIndex (otherwise) of UTC datetime64
+    """
+    import numpy as np
+    import pandas as pd
+
+    divisor = _epoch_divisor(unit)
+    is_series = isinstance(timestamps, pd.Series)
+    values = pd.to_numeric(timestamps if is_series else pd.Series(timestamps))
+    # np.rint rounds halves to even, like round() in epoch_to_datetime
+    seconds = np.rint(values.to_numpy(dtype=float, na_value=np.nan) / divisor)
+    result = pd.to_datetime(seconds, unit='s', utc=True)
+    if is_series:
+        return pd.Series(result, index=timestamps.index, name=timestamps.name)
+    return result
 
 
 def get_epoch_time_range_utc_ms(start_time, end_time):
@@ -84,3 +128,63 @@ def get_epoch_time_range_utc_ms(start_time, end_time):
         return_dict[key] = timegm(return_dict[key].timetuple()) * 1000
 
     return return_dict["start_time"], return_dict["end_time"]
+
+
+def next_window_start(timestamp, window):
+    """Return the start of the calendar window after the one containing
+    timestamp
+
+    :param datetime timestamp: tz-aware UTC datetime
+    :param window: 'hour', 'day', 'week', 'month', 'year' or datetime.timedelta
+    :return datetime: start of the next window
+    """
+    if isinstance(window, timedelta):
+        return timestamp + window
+    elif window == 'hour':
+        return timestamp.replace(minute=0, second=0, microsecond=0) + \
+            timedelta(hours=1)
+
+    day_start = timestamp.replace(hour=0, minute=0, second=0, microsecond=0)
+    if window == 'day':
+        return day_start + timedelta(days=1)
+    elif window == 'week':
+        return day_start + timedelta(days=7 - day_start.weekday())
+    elif window == 'month':
+        if day_start.month == 12:
+            return day_start.replace(year=day_start.year + 1, month=1, day=1)
+        return day_start.replace(month=day_start.month + 1, day=1)
+    elif window == 'year':
+        return day_start.replace(year=day_start.year + 1, month=1, day=1)
+    else:
+        raise InvalidUnitError("window passed in was {0}.  window must be a "
+                               "datetime.timedelta or one of hour, day, week, "
+                               "month, year".format(window))
+
+
+def split_time_range(start_time, end_time, window='month'):
+    """Split [start_time, end_time) into consecutive windows.  Calendar
+    windows ('month', for example) are aligned to UTC calendar boundaries, to
+    match the way GRACC's date-dependent indices are laid out, so the first
+    and last windows can be partial.
+
+    :param start_time: datetime.datetime, datetime.date, or str timestamp
+        representing start time in UTC
+    :param end_time: Same as above, but end time (UTC)
+    :param window: 'hour', 'day', 'week', 'month', 'year' or a
+        datetime.timedelta
+    :return list: list of (window_start, window_end) UTC datetime tuples
+    """
+    start_time = parse_datetime(start_time, utc=True)
+    end_time = parse_datetime(end_time, utc=True)
+    assert start_time <= end_time
+
+    if isinstance(window, timedelta) and window <= timedelta(0):
+        raise InvalidUnitError("window must be a positive timedelta")
+
+    windows = []
+    window_start = start_time
+    while window_start < end_time:
+        window_end = min(next_window_start(window_start, window), end_time)
+        windows.append((window_start, window_end))
+        window_start = window_end
+    return windows
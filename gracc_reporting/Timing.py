@@ -0,0 +1,257 @@
+"""Per-phase timing of reports.  Reporter records a span for each phase of a
+report (config parsing, client setup, queries, rendering, sending email),
+with the bytes sent and received and the bucket and row counts where they
+apply, in its Timings object (Reporter.timings).  The spans can be written
+out as JSON lines, one per span, and as a Prometheus textfile-collector
+file with per-phase totals, so report latency can be charted over time.
+
+Code outside of Reporter (TextUtils, the JSON serializer used by the
+Elasticsearch clients, ClientFactory.TimedJSONSerializer) records with the
+module-level span(), which records into the Timings that's active (see
+Timings.active), if any.
+"""
+
+import functools
+import json
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+__all__ = ['Timings', 'span', 'annotate', 'timed']
+
+# Numeric span attributes that are summed per phase for Prometheus
+METRIC_ATTRS = ('bytes_in', 'bytes_out', 'buckets', 'rows', 'server_seconds',
+                'requests', 'split_depth')
+METRIC_PREFIX = 'gracc_report'
+
+# Timings that span() records into
+_active = None
+# Spans open in each thread, innermost last
+_local = threading.local()
+
+
+def _open_spans():
+    if not hasattr(_local, 'spans'):
+        _local.spans = []
+    return _local.spans
+
+
+class Timings(object):
+    """Spans recorded for one report
+
+    :param dict labels: Labels identifying the report (e.g. report, vo),
+        added to every exported span and metric
+    """
+    def __init__(self, labels=None):
+        self.labels = dict(labels or {})
+        self.spans = []
+        self._exported = 0
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def span(self, name, **attrs):
+        """Time the body of the with statement as a span called name.  Yields
+        the span's dict, so attributes (bytes_in, rows, etc.) can be added to
+        it inside the body.
+
+        :param str name: Name of the phase
+        :param attrs: Attributes to start the span with
+        """
+        open_spans = _open_spans()
+        record = {'name': name,
+                  'parent': open_spans[-1]['name'] if open_spans else None,
+                  'start': time.time()}
+        record.update(attrs)
+        open_spans.append(record)
+        start = time.perf_counter()
+        try:
+            yield record
+        finally:
+            record['seconds'] = time.perf_counter() - start
+            open_spans.pop()
+            with self._lock:
+                self.spans.append(record)
+
+    def iterate(self, name, iterable, count=None, **attrs):
+        """Generator that yields the items of iterable, recording the time
+        spent getting them, but not the time between them, as one span
+        called name.  This Timings is active only while an item is being
+        got, so the code using the items doesn't record into the span.
+
+        :param str name: Name of the phase
+        :param iterable: Items to yield
+        :param str count: Attribute to set to the number of items, if any
+        :param attrs: Attributes to start the span with
+        """
+        open_spans = _open_spans()
+        record = {'name': name,
+                  'parent': open_spans[-1]['name'] if open_spans else None,
+                  'start': time.time()}
+        record.update(attrs)
+        iterator = iter(iterable)
+        n_items = 0
+        seconds = 0.
+        try:
+            while True:
+                # The generator can be resumed from another thread
+                open_spans = _open_spans()
+                open_spans.append(record)
+                start = time.perf_counter()
+                try:
+                    with self.active():
+                        item = next(iterator)
+                except StopIteration:
+                    return
+                finally:
+                    seconds += time.perf_counter() - start
+                    open_spans.pop()
+                n_items += 1
+                yield item
+        finally:
+            record['seconds'] = seconds
+            if count is not None:
+                record[count] = n_items
+            with self._lock:
+                self.spans.append(record)
+
+    @contextmanager
+    def active(self):
+        """Within the with statement, span() records into this Timings"""
+        global _active
+        previous, _active = _active, self
+        try:
+            yield self
+        finally:
+            _active = previous
+
+    def totals(self):
+        """Sum the spans by phase
+
+        :return dict: {name: {'count': n, 'seconds': total, attr: total}}
+        """
+        totals = {}
+        with self._lock:
+            spans = list(self.spans)
+        for record in spans:
+            total = totals.setdefault(record['name'],
+                                      {'count': 0, 'seconds': 0.})
+            total['count'] += 1
+            total['seconds'] += record['seconds']
+            for attr in METRIC_ATTRS:
+                if record.get(attr) is not None:
+                    total[attr] = total.get(attr, 0) + record[attr]
+        return totals
+
+    def write_json_lines(self, path):
+        """Append the spans recorded since the last call to path, one JSON
+        object (the labels plus the span) per line
+
+        :param str path: File to append to
+        """
+        with self._lock:
+            spans, self._exported = self.spans[self._exported:], \
+                len(self.spans)
+        with open(os.path.expanduser(path), 'a') as f:
+            for record in spans:
+                line = dict(self.labels)
+                line.update(record)
+                f.write(json.dumps(line, sort_keys=True, default=str) + '\n')
+
+    def prometheus_text(self, prefix=METRIC_PREFIX):
+        """Per-phase totals in the Prometheus text exposition format
+
+        :return str: Metrics
+        """
+        labels = ','.join('{0}="{1}"'.format(key, _escape(value))
+                          for key, value in sorted(self.labels.items()))
+        metrics = [('phase_seconds', 'seconds', 'Seconds spent in the phase'),
+                   ('phase_count', 'count', 'Number of times the phase ran')]
+        metrics.extend(('phase_' + attr, attr, 'Total {0} of the phase'.format(
+            attr.replace('_', ' '))) for attr in METRIC_ATTRS)
+
+        totals = self.totals()
+        lines = []
+        for metric, key, help_text in metrics:
+            samples = [(phase, total[key]) for phase, total
+                       in sorted(totals.items()) if key in total]
+            if not samples:
+                continue
+            name = '{0}_{1}'.format(prefix, metric)
+            lines.append('# HELP {0} {1}'.format(name, help_text))
+            lines.append('# TYPE {0} gauge'.format(name))
+            for phase, value in samples:
+                lines.append('{0}{{{1}{2}phase="{3}"}} {4!r}'.format(
+                    name, labels, ',' if labels else '', _escape(phase),
+                    float(value)))
+
+        name = '{0}_last_run_timestamp_seconds'.format(prefix)
+        lines.append('# HELP {0} When the report last ran'.format(name))
+        lines.append('# TYPE {0} gauge'.format(name))
+        lines.append('{0}{{{1}}} {2!r}'.format(name, labels, time.time()))
+        return '\n'.join(lines) + '\n'
+
+    def write_prometheus(self, path, prefix=METRIC_PREFIX):
+        """Write prometheus_text to path for the node exporter's textfile
+        collector.  The file is replaced atomically, so the collector never
+        reads half of it.
+
+        :param str path: File to write (should end in .prom)
+        """
+        path = os.path.expanduser(path)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or '.',
+                                        suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                f.write(self.prometheus_text(prefix))
+            os.chmod(tmp_path, 0o644)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+
+
+def _escape(value):
+    """Escape a Prometheus label value"""
+    return str(value).replace('\\', '\\\\').replace('"', '\\"') \
+        .replace('\n', '\\n')
+
+
+@contextmanager
+def span(name, **attrs):
+    """Timings.span on the active Timings.  Does nothing (but still yields a
+    dict) if no Timings is active."""
+    timings = _active
+    if timings is None:
+        yield dict(attrs)
+    else:
+        with timings.span(name, **attrs) as record:
+            yield record
+
+
+def annotate(**attrs):
+    """Add attributes to the innermost span open in this thread, if any"""
+    open_spans = _open_spans()
+    if open_spans:
+        open_spans[-1].update(attrs)
+
+
+def timed(name, export=False):
+    """Decorator for Reporter methods: record each call as a span called
+    name in self.timings, with self.timings active during the call
+
+    :param str name: Name of the span
+    :param bool export: Call self.export_timings() after each call
+    """
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            try:
+                with self.timings.active(), self.timings.span(name):
+                    return method(self, *args, **kwargs)
+            finally:
+                if export:
+                    self.export_timings()
+        return wrapper
+    return decorator
@@ -11,5 +11,9 @@ setup(name='gracc-reporting',
       packages=['gracc_reporting'],
       install_requires=['opensearch-py',
                         'python-dateutil', 'toml', 'tabulate',
-                        'pandas']
+                        'pandas'],
+      extras_require={'async': ['opensearch-py[async]'],
+                      'fastjson': ['orjson']},
+      entry_points={'console_scripts': [
+          'gracc-outbox-flush=gracc_reporting.Outbox:main']}
      )
@@ -0,0 +1,158 @@
+"""Unit tests for Adaptive"""
+
+import unittest
+from datetime import datetime, timedelta
+
+from dateutil import tz
+from opensearchpy.exceptions import ConnectionTimeout, TransportError
+
+from gracc_reporting import Adaptive, Aggregations
+from gracc_reporting.TimeUtils import parse_datetime
+
+body = {
+    'query': {'bool': {'filter': [
+        {'range': {'EndTime': {'gte': '2024-01-01T00:00:00+00:00',
+                               'lt': '2024-01-03T00:00:00+00:00'}}}]}},
+    'size': 0,
+    'aggs': {'OIM_Site': {'terms': {'field': 'OIM_Site'},
+                          'aggs': {'CoreHours': {'sum': {'field': 'CoreHours'}}}}}
+}
+
+start = datetime(2024, 1, 1, tzinfo=tz.tzutc())
+end = datetime(2024, 1, 3, tzinfo=tz.tzutc())
+SITES = ['A', 'B', 'C', 'D']
+
+
+def too_many_buckets():
+    return TransportError(400, 'search_phase_execution_exception',
+                          {'error': {'root_cause': [
+                              {'type': 'too_many_buckets_exception'}]}})
+
+
+class FakeClient(object):
+    """Stand-in for opensearchpy.OpenSearch.  Each site has one CoreHour per
+    hour of the range.  Requests for more than max_hours * max_sites
+    site-hours fail with error()"""
+    def __init__(self, max_hours, max_sites=len(SITES),
+                 error=too_many_buckets):
+        self.max_hours = max_hours
+        self.max_sites = max_sites
+        self.error = error
+        self.calls = []
+
+    def search(self, index, body, **kwargs):
+        self.calls.append(body)
+        time_range = body['query']['bool']['filter'][0]['range']['EndTime']
+        hours = (parse_datetime(time_range['lt'], utc=True) -
+                 parse_datetime(time_range['gte'], utc=True)) \
+            .total_seconds() / 3600.
+        include = body['aggs']['OIM_Site']['terms'].get(
+            'include', {'partition': 0, 'num_partitions': 1})
+        sites = [site for i, site in enumerate(SITES)
+                 if i % include['num_partitions'] == include['partition']]
+        if hours * len(sites) > self.max_hours * self.max_sites:
+            raise self.error()
+        return {'took': 5, 'timed_out': False,
+                '_shards': {'total': 1, 'successful': 1, 'failed': 0},
+                'hits': {'total': {'value': 10, 'relation': 'eq'}, 'hits': []},
+                'aggregations': {'OIM_Site': {'buckets': [
+                    {'key': site, 'doc_count': 1,
+                     'CoreHours': {'value': hours}} for site in sites]}}}
+
+
+def site_hours(response):
+    return {bucket['key']: bucket['CoreHours']['value']
+            for bucket in response['aggregations']['OIM_Site']['buckets']}
+
+
+class TestRunAdaptive(unittest.TestCase):
+    """Tests for Adaptive.run_adaptive"""
+    def run_adaptive(self, client, **kwargs):
+        return Adaptive.run_adaptive(client, body, start, end,
+                                     lambda s, e: 'gracc.osg.raw-2024.01',
+                                     **kwargs)
+
+    def test_no_split(self):
+        """Queries that work the first time are run once"""
+        response, stats = self.run_adaptive(FakeClient(48))
+        self.assertEqual(site_hours(response), dict.fromkeys(SITES, 48.))
+        self.assertEqual(stats, {'requests': 1, 'splits': 0, 'depth': 0})
+
+    def test_bisect_time(self):
+        """Halve the time range until the pieces work"""
+        client = FakeClient(12)
+        response, stats = self.run_adaptive(client)
+        self.assertEqual(site_hours(response), dict.fromkeys(SITES, 48.))
+        self.assertEqual(response['hits']['total']['value'], 40)
+        self.assertEqual(stats['depth'], 2)
+        # 1 + 2 failed halves + 4 quarters
+        self.assertEqual(stats['requests'], 7)
+
+    def test_timeout(self):
+        """Client timeouts are split too"""
+        client = FakeClient(24, error=lambda: ConnectionTimeout(
+            'TIMEOUT', 'timed out', None))
+        response, stats = self.run_adaptive(client)
+        self.assertEqual(site_hours(response), dict.fromkeys(SITES, 48.))
+        self.assertEqual(stats['depth'], 1)
+
+    def test_partition_terms(self):
+        """Below min_window, split the terms into partitions"""
+        client = FakeClient(24, max_sites=1)
+        response, stats = self.run_adaptive(client,
+                                            min_window=timedelta(days=1))
+        self.assertEqual(site_hours(response), dict.fromkeys(SITES, 48.))
+        self.assertEqual(response['hits']['total']['value'], 20)
+        self.assertEqual(stats['depth'], 3)
+        includes = [b['aggs']['OIM_Site']['terms'].get('include')
+                    for b in client.calls]
+        self.assertIn({'partition': 3, 'num_partitions': 4}, includes)
+
+    def test_gives_up(self):
+        """Re-raise the error once the pieces can't get any smaller"""
+        client = FakeClient(1, max_sites=1)
+        with self.assertRaises(TransportError):
+            self.run_adaptive(client, min_window=timedelta(days=1),
+                              max_partitions=2)
+
+    def test_other_errors(self):
+        """Errors that aren't about size aren't retried"""
+        client = FakeClient(1, error=lambda: TransportError(
+            400, 'parsing_exception', {}))
+        with self.assertRaises(TransportError):
+            self.run_adaptive(client)
+        self.assertEqual(len(client.calls), 1)
+
+
+class TestPartitionBody(unittest.TestCase):
+    """Tests for Adaptive.partition_body"""
+    def test_partition(self):
+        """Add the partition to the top-level terms aggregation"""
+        new = Adaptive.partition_body(body, 1, 4)
+        self.assertEqual(new['aggs']['OIM_Site']['terms']['include'],
+                         {'partition': 1, 'num_partitions': 4})
+        self.assertNotIn('include', body['aggs']['OIM_Site']['terms'])
+        self.assertEqual(new['query'], body['query'])
+
+    def test_not_terms(self):
+        """Only terms aggregations can be partitioned"""
+        with self.assertRaises(Aggregations.AggregationError):
+            Adaptive.partition_body(
+                {'aggs': {'EndTime': {'date_histogram': {
+                    'field': 'EndTime', 'calendar_interval': 'day'}}}}, 0, 2)
+
+
+class TestIsTooBig(unittest.TestCase):
+    """Tests for Adaptive.is_too_big"""
+    def test_is_too_big(self):
+        """Timeouts and too_many_buckets mean too big, other errors not"""
+        self.assertTrue(Adaptive.is_too_big(too_many_buckets()))
+        self.assertTrue(Adaptive.is_too_big(
+            ConnectionTimeout('TIMEOUT', 'timed out', None)))
+        self.assertFalse(Adaptive.is_too_big(ValueError()))
+        with self.assertRaises(Adaptive.QueryTooBigError):
+            Adaptive._check_too_big({'timed_out': True})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,339 @@
+"""Unit tests for Aggregations"""
+
+import unittest
+
+from gracc_reporting import Aggregations
+
+MAXINT = 2**31 - 1
+
+site_vo_body = {
+    'query': {'bool': {'filter': [{'term': {'ResourceType': 'Payload'}}]}},
+    'size': 0,
+    'aggs': {
+        'OIM_Site': {
+            'terms': {'field': 'OIM_Site', 'size': MAXINT, 'missing': 'N/A'},
+            'aggs': {
+                'VOName': {
+                    'terms': {'field': 'VOName', 'size': MAXINT},
+                    'aggs': {'CoreHours': {'sum': {'field': 'CoreHours'}}}
+                }
+            }
+        }
+    }
+}
+
+
+class FakeClient(object):
+    """Stand-in for opensearchpy.OpenSearch that returns canned pages of
+    composite buckets"""
+    def __init__(self, pages):
+        self.pages = pages
+        self.bodies = []
+
+    def search(self, index, body, **kwargs):
+        self.bodies.append(dict(body['aggs']['OIM_Site']['composite']))
+        page = self.pages[len(self.bodies) - 1]
+        agg = {'buckets': page}
+        if page:
+            agg['after_key'] = page[-1]['key']
+        return {'timed_out': False,
+                '_shards': {'total': 1, 'successful': 1},
+                'aggregations': {'OIM_Site': agg}}
+
+
+def make_bucket(site, vo, hours):
+    return {'key': {'OIM_Site': site, 'VOName': vo}, 'doc_count': 1,
+            'CoreHours': {'value': hours}}
+
+
+class TestTermsToComposite(unittest.TestCase):
+    """Tests for Aggregations.terms_to_composite"""
+    def test_nested_terms(self):
+        """Nested terms become composite sources with metric sub-aggs"""
+        body, name = Aggregations.terms_to_composite(site_vo_body, 10)
+        self.assertEqual(name, 'OIM_Site')
+        self.assertDictEqual(body['aggs'], {
+            'OIM_Site': {
+                'composite': {
+                    'size': 10,
+                    'sources': [
+                        {'OIM_Site': {'terms': {'field': 'OIM_Site',
+                                                'missing_bucket': True}}},
+                        {'VOName': {'terms': {'field': 'VOName'}}},
+                    ]},
+                'aggs': {'CoreHours': {'sum': {'field': 'CoreHours'}}}
+            }
+        })
+        self.assertEqual(body['query'], site_vo_body['query'])
+        self.assertIn('size', site_vo_body['aggs']['OIM_Site']['terms'])
+
+    def test_order(self):
+        """Key orders are kept, and other orders dropped with a warning"""
+        inner = {'terms': {'field': 'b', 'order': {'_count': 'desc'}}}
+        body = {'aggs': {'a': {'terms': {'field': 'a',
+                                         'order': {'_key': 'desc'}},
+                               'aggs': {'b': inner}}}}
+        with self.assertLogs('gracc_reporting.Aggregations', 'WARNING'):
+            new_body, _ = Aggregations.terms_to_composite(body)
+        self.assertEqual(new_body['aggs']['a']['composite']['sources'],
+                         [{'a': {'terms': {'field': 'a', 'order': 'desc'}}},
+                          {'b': {'terms': {'field': 'b'}}}])
+
+    def test_multiple_top_level_aggs(self):
+        """Raise AggregationError if there's more than one top-level agg"""
+        body = {'aggs': {'a': {'terms': {'field': 'a'}},
+                         'b': {'terms': {'field': 'b'}}}}
+        self.assertRaises(Aggregations.AggregationError,
+                          Aggregations.terms_to_composite, body)
+
+    def test_sibling_bucket_aggs(self):
+        """Raise AggregationError if a level has two bucket sub-aggs"""
+        body = {'aggs': {'a': {'terms': {'field': 'a'},
+                               'aggs': {'b': {'terms': {'field': 'b'}},
+                                        'c': {'terms': {'field': 'c'}}}}}}
+        self.assertRaises(Aggregations.AggregationError,
+                          Aggregations.terms_to_composite, body)
+
+    def test_unsupported_agg(self):
+        """Raise AggregationError for bucket aggs composite can't handle"""
+        body = {'aggs': {'a': {'filters': {'filters': {}}}}}
+        self.assertRaises(Aggregations.AggregationError,
+                          Aggregations.terms_to_composite, body)
+
+
+class TestIterCompositeBuckets(unittest.TestCase):
+    """Tests for Aggregations.iter_composite_buckets"""
+    def test_follow_after_key(self):
+        """Walk every page, passing the previous after_key each time"""
+        pages = [[make_bucket('A', 'vo1', 1.0), make_bucket('A', 'vo2', 2.0)],
+                 [make_bucket('B', 'vo1', 3.0)],
+                 []]
+        fake = FakeClient(pages)
+        buckets = list(Aggregations.iter_composite_buckets(
+            fake, 'gracc.osg.raw-*', site_vo_body, page_size=2))
+
+        self.assertEqual([b.CoreHours.value for b in buckets], [1.0, 2.0, 3.0])
+        self.assertEqual(buckets[2].key.OIM_Site, 'B')
+        self.assertNotIn('after', fake.bodies[0])
+        self.assertEqual(fake.bodies[1]['after'],
+                         {'OIM_Site': 'A', 'VOName': 'vo2'})
+        self.assertEqual(len(fake.bodies), 3)
+
+    def test_missing(self):
+        """Keys of missing_bucket buckets are the terms' missing value"""
+        fake = FakeClient([[make_bucket(None, 'vo1', 1.0)], []])
+        buckets = list(Aggregations.iter_composite_buckets(
+            fake, 'gracc.osg.raw-*', site_vo_body))
+        self.assertEqual(buckets[0].key.OIM_Site, 'N/A')
+        self.assertEqual(fake.bodies[1]['after'],
+                         {'OIM_Site': None, 'VOName': 'vo1'})
+
+    def test_narrow_filter_path(self):
+        """A filter_path without the after_key still gets every page"""
+        class FilteringClient(FakeClient):
+            """Leaves out the after_key unless filter_path keeps it"""
+            def search(self, index, body, filter_path, **kwargs):
+                response = super(FilteringClient, self).search(index, body)
+                if 'aggregations.OIM_Site.after_key' not in \
+                        filter_path.split(','):
+                    response['aggregations']['OIM_Site'].pop('after_key',
+                                                             None)
+                return response
+
+        pages = [[make_bucket('A', 'vo1', 1.0), make_bucket('A', 'vo2', 2.0)],
+                 [make_bucket('B', 'vo1', 3.0)], []]
+        buckets = list(Aggregations.iter_composite_buckets(
+            FilteringClient(pages), 'gracc.osg.raw-*', site_vo_body,
+            page_size=2,
+            filter_path='aggregations.OIM_Site.buckets,took,timed_out,_shards'))
+        self.assertEqual(len(buckets), 3)
+
+    def test_full_page_without_after_key(self):
+        """Raise AggregationError rather than stop after a full page with no
+        after_key"""
+        class NoAfterKeyClient(FakeClient):
+            def search(self, index, body, **kwargs):
+                response = super(NoAfterKeyClient, self).search(index, body)
+                response['aggregations']['OIM_Site'].pop('after_key', None)
+                return response
+
+        pages = [[make_bucket('A', 'vo1', 1.0), make_bucket('A', 'vo2', 2.0)]]
+        with self.assertRaises(Aggregations.AggregationError):
+            list(Aggregations.iter_composite_buckets(
+                NoAfterKeyClient(pages), 'idx', site_vo_body, page_size=2))
+
+    def test_bad_response(self):
+        """Raise an Exception if not all shards succeeded"""
+        class BadClient(object):
+            def search(self, **kwargs):
+                return {'timed_out': False,
+                        '_shards': {'total': 2, 'successful': 1}}
+
+        gen = Aggregations.iter_composite_buckets(BadClient(), 'idx',
+                                                  site_vo_body)
+        self.assertRaises(Exception, list, gen)
+
+
+class TestMergeAggregations(unittest.TestCase):
+    """Tests for Aggregations.merge_aggregations"""
+    agg_defs = {
+        'OIM_Site': {
+            'terms': {'field': 'OIM_Site', 'size': MAXINT},
+            'aggs': {
+                'CoreHours': {'sum': {'field': 'CoreHours'}},
+                'MinStart': {'min': {'field': 'StartTime'}},
+                'MaxEnd': {'max': {'field': 'EndTime'}},
+                'Records': {'value_count': {'field': 'RecordId'}},
+            }
+        }
+    }
+
+    @staticmethod
+    def site_bucket(site, count, hours, start, end, records):
+        return {'key': site, 'doc_count': count,
+                'CoreHours': {'value': hours}, 'MinStart': {'value': start},
+                'MaxEnd': {'value': end}, 'Records': {'value': records}}
+
+    def test_merge_terms_metrics(self):
+        """Merge terms buckets by key and combine their metrics"""
+        first = {'OIM_Site': {'buckets': [
+            self.site_bucket('A', 5, 10.0, 3, 7, 5),
+            self.site_bucket('B', 1, 1.0, 4, 4, 1)]}}
+        second = {'OIM_Site': {'buckets': [
+            self.site_bucket('A', 2, 5.0, 1, 9, 2),
+            self.site_bucket('C', 9, 2.0, None, None, 9)]}}
+
+        merged = Aggregations.merge_aggregations(self.agg_defs,
+                                                 [first, second])
+        buckets = merged['OIM_Site']['buckets']
+
+        self.assertEqual([b['key'] for b in buckets], ['C', 'A', 'B'])
+        self.assertDictEqual(buckets[1], self.site_bucket('A', 7, 15.0, 1, 9, 7))
+        self.assertDictEqual(buckets[0], self.site_bucket('C', 9, 2.0, None, None, 9))
+
+    def test_merge_stats(self):
+        """Combine stats metrics, recomputing avg"""
+        defs = {'Hours': {'stats': {'field': 'CoreHours'}}}
+        results = [{'Hours': {'count': 1, 'min': 2.0, 'max': 2.0, 'sum': 2.0,
+                              'avg': 2.0}},
+                   {'Hours': {'count': 3, 'min': 1.0, 'max': 5.0, 'sum': 6.0,
+                              'avg': 2.0}}]
+        self.assertDictEqual(
+            Aggregations.merge_aggregations(defs, results)['Hours'],
+            {'count': 4, 'min': 1.0, 'max': 5.0, 'sum': 8.0, 'avg': 2.0})
+
+    def test_unmergeable_metric(self):
+        """Raise AggregationError for metrics that can't be combined"""
+        defs = {'Hours': {'avg': {'field': 'CoreHours'}}}
+        self.assertRaises(Aggregations.AggregationError,
+                          Aggregations.merge_aggregations, defs,
+                          [{'Hours': {'value': 1.0}}])
+
+
+
+class TestFlattenAggregations(unittest.TestCase):
+    """Flattening nested aggregation responses into columns"""
+    aggregations = {
+        'Total': {'value': 6.0},
+        'OIM_Site': {'buckets': [
+            {'key': 'site1', 'doc_count': 3,
+             'Hours': {'value': 4.0},
+             'VOName': {'buckets': [
+                 {'key': 'vo1', 'doc_count': 2, 'CoreHours': {'value': 3.0},
+                  'Jobs': {'count': 2, 'min': 1.0, 'max': 2.0, 'avg': 1.5,
+                           'sum': 3.0}},
+                 {'key': 'vo2', 'doc_count': 1, 'CoreHours': {'value': 1.0},
+                  'Jobs': {'count': 1, 'min': 1.0, 'max': 1.0, 'avg': 1.0,
+                           'sum': 1.0}}]}},
+            {'key': 'site2', 'doc_count': 1,
+             'Hours': {'value': 2.0},
+             'VOName': {'buckets': [
+                 {'key': 'vo1', 'doc_count': 1, 'CoreHours': {'value': None},
+                  'Jobs': {'count': 0, 'min': None, 'max': None, 'avg': None,
+                           'sum': 0.0}}]}},
+            {'key': 'site3', 'doc_count': 0, 'Hours': {'value': 0.0},
+             'VOName': {'buckets': []}}]}}
+
+    def test_nested_terms(self):
+        """A row per innermost bucket, repeating outer keys and metrics"""
+        columns = Aggregations.flatten_aggregations(self.aggregations)
+        self.assertEqual(list(columns['OIM_Site']), ['site1', 'site1', 'site2'])
+        self.assertEqual(list(columns['VOName']), ['vo1', 'vo2', 'vo1'])
+        self.assertEqual(list(columns['Total']), [6.0] * 3)
+        self.assertEqual(list(columns['Hours']), [4.0, 4.0, 2.0])
+        self.assertEqual(list(columns['doc_count']), [2, 1, 1])
+        self.assertEqual(columns['doc_count'].dtype, 'int64')
+        self.assertEqual(columns['CoreHours'].dtype, 'float64')
+        self.assertEqual(list(columns['CoreHours'][:2]), [3.0, 1.0])
+        self.assertNotEqual(columns['CoreHours'][2], columns['CoreHours'][2])
+        self.assertEqual(list(columns['Jobs.count']), [2, 1, 0])
+
+    def test_composite_and_keyed(self):
+        """Composite sources and keyed buckets become key columns"""
+        columns = Aggregations.flatten_aggregations({
+            'Pages': {'after_key': {'site': 'b', 'vo': 'y'}, 'buckets': [
+                {'key': {'site': 'a', 'vo': 'x'}, 'doc_count': 1,
+                 'Payload': {'doc_count': 1,
+                             'Ranges': {'buckets': {
+                                 'low': {'doc_count': 1,
+                                         'CoreHours': {'value': 1.0}},
+                                 'high': {'doc_count': 0,
+                                          'CoreHours': {'value': 0.0}}}}}},
+                {'key': {'site': 'b', 'vo': 'y'}, 'doc_count': 2,
+                 'Payload': {'doc_count': 2,
+                             'Ranges': {'buckets': {
+                                 'low': {'doc_count': 2,
+                                         'CoreHours': {'value': 5.0}}}}}}]}})
+        self.assertEqual(list(columns['site']), ['a', 'a', 'b'])
+        self.assertEqual(list(columns['vo']), ['x', 'x', 'y'])
+        self.assertEqual(list(columns['Payload.doc_count']), [1, 1, 2])
+        self.assertEqual(list(columns['Payload.Ranges']),
+                         ['low', 'high', 'low'])
+        self.assertEqual(list(columns['CoreHours']), [1.0, 0.0, 5.0])
+
+    def test_metrics_only(self):
+        """Metrics alone make one row"""
+        columns = Aggregations.flatten_aggregations({'Total': {'value': 1}})
+        self.assertEqual(list(columns['Total']), [1])
+
+    def test_sibling_bucket_aggs(self):
+        """Raise AggregationError for sibling bucket aggregations"""
+        with self.assertRaises(Aggregations.AggregationError):
+            Aggregations.flatten_aggregations({'a': {'buckets': []},
+                                               'b': {'buckets': []}})
+
+    def test_dataframe_dates(self):
+        """date_histogram keys become datetimes in the DataFrame"""
+        agg_defs = {'EndTime': {
+            'date_histogram': {'field': 'EndTime', 'calendar_interval': 'day'},
+            'aggs': {'CoreHours': {'sum': {'field': 'CoreHours'}}}}}
+        df = Aggregations.aggregations_to_dataframe(
+            {'EndTime': {'buckets': [
+                {'key': 1514764800000, 'key_as_string': '2018-01-01',
+                 'doc_count': 1, 'CoreHours': {'value': 1.0}},
+                {'key': 1514851200000, 'key_as_string': '2018-01-02',
+                 'doc_count': 1, 'CoreHours': {'value': 2.0}}]}}, agg_defs)
+        self.assertEqual(list(df.columns), ['EndTime', 'doc_count',
+                                            'CoreHours'])
+        self.assertEqual(str(df['EndTime'][1].date()), '2018-01-02')
+        self.assertEqual(df['CoreHours'].sum(), 3.0)
+
+    def test_dataframe_nested_dates(self):
+        """date_histogram keys under a filter are converted too"""
+        agg_defs = {'OIM_Site': {
+            'terms': {'field': 'OIM_Site'},
+            'aggs': {'Payload': {
+                'filter': {'term': {'ResourceType': 'Payload'}},
+                'aggs': {'EndTime': {'date_histogram': {
+                    'field': 'EndTime', 'calendar_interval': 'day'}}}}}}}
+        df = Aggregations.aggregations_to_dataframe(
+            {'OIM_Site': {'buckets': [
+                {'key': 'site1', 'doc_count': 1,
+                 'Payload': {'doc_count': 1, 'EndTime': {'buckets': [
+                     {'key': 1514764800000, 'doc_count': 1}]}}}]}},
+            agg_defs)
+        self.assertEqual(str(df['Payload.EndTime'][0].date()), '2018-01-01')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,118 @@
+"""Unit tests for AsyncReportUtils"""
+
+import asyncio
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+from opensearchpy import Search
+
+from gracc_reporting import ClientFactory
+from gracc_reporting.AsyncReportUtils import AsyncReporter
+
+CONFIG = """
+[elasticsearch]
+    hostname = 'https://gracc.example.com/q'
+
+[email]
+    smtphost = 'smtp.example.com'
+    smtpport = 465
+    smtpuser = 'user'
+    smtppassword = 'password'
+    [email.from]
+        name = 'GRACC Operations'
+        email = 'nobody@example.com'
+    [email.test]
+        names = ['Test Recipient', ]
+        emails = ['nobody1@example.com', ]
+
+[asynctest]
+    index_pattern = 'gracc.osg.raw-%Y.%m'
+    to_names = ['test name', ]
+    to_emails = ['nobody2@example.com', ]
+"""
+
+
+class FakeCat(object):
+    async def health(self, **kwargs):
+        return 'green\n'
+
+
+class FakeAsyncClient(object):
+    """Stand-in for opensearchpy.AsyncOpenSearch whose searches each take
+    delay seconds"""
+    def __init__(self, delay=0.1):
+        self.delay = delay
+        self.cat = FakeCat()
+        self.closed = False
+
+    async def search(self, index, body, **kwargs):
+        await asyncio.sleep(self.delay)
+        vo = body['query']['bool']['filter'][0]['term']['VOName']
+        return {'took': 1, 'timed_out': False,
+                '_shards': {'total': 1, 'successful': 1},
+                'hits': {'total': {'value': 1, 'relation': 'eq'}, 'hits': []},
+                'aggregations': {'CoreHours': {'value': len(vo)}}}
+
+    async def close(self):
+        self.closed = True
+
+
+class FakeAsyncReport(AsyncReporter):
+    """AsyncReporter that runs one query per VO"""
+    vos = ['a', 'bb', 'ccc', 'dddd', 'eeeee']
+
+    def __init__(self, config_file):
+        super(FakeAsyncReport, self).__init__(report_type='asynctest',
+                                              config_file=config_file,
+                                              start='2018-03-28 06:30',
+                                              end='2018-03-29 06:30')
+        self.results = None
+
+    def query(self):
+        return self.vo_query('a')
+
+    def vo_query(self, vo):
+        s = Search(index=self.indexpattern).filter('term', VOName=vo)[0:0]
+        s.aggs.metric('CoreHours', 'sum', field='CoreHours')
+        return s
+
+    async def run_report_async(self):
+        self.async_client = self.fake_client
+        results = await self.run_queries_async(
+            *(lambda vo=vo: self.vo_query(vo) for vo in self.vos))
+        self.results = [r.CoreHours.value for r in results]
+
+
+class TestAsyncReporter(unittest.TestCase):
+    """Tests for AsyncReportUtils.AsyncReporter"""
+    def setUp(self):
+        ClientFactory.clear()
+        self.directory = tempfile.mkdtemp()
+        self.config_file = os.path.join(self.directory, 'config.toml')
+        with open(self.config_file, 'w') as f:
+            f.write(CONFIG)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+        ClientFactory.clear()
+
+    def test_concurrent_queries(self):
+        """Queries run concurrently, and results come back in order"""
+        report = FakeAsyncReport(self.config_file)
+        fake = report.fake_client = FakeAsyncClient(delay=0.2)
+
+        start = time.time()
+        report.run_report()
+        elapsed = time.time() - start
+
+        self.assertListEqual(report.results, [1, 2, 3, 4, 5])
+        self.assertLess(elapsed, 0.2 * len(FakeAsyncReport.vos) / 2)
+        self.assertTrue(fake.closed)
+        self.assertIsNone(report.async_client)
+
+
+if __name__ == '__main__':
+    unittest.main()
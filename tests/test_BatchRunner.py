@@ -0,0 +1,66 @@
+"""Unit tests for BatchRunner"""
+
+import unittest
+
+from gracc_reporting.BatchRunner import BatchRunner
+
+
+class FakeReport(object):
+    """Stand-in for a Reporter subclass"""
+    ran = []
+    exported = 0
+
+    def __init__(self, name, fail=False, vo=None):
+        self.name = name
+        self.fail = fail
+
+    def run_report(self):
+        if self.fail:
+            raise RuntimeError("report failed")
+        FakeReport.ran.append(self.name)
+
+    def export_timings(self):
+        FakeReport.exported += 1
+
+
+class TestBatchRunner(unittest.TestCase):
+    """Tests for BatchRunner.BatchRunner"""
+    def setUp(self):
+        FakeReport.ran = []
+        FakeReport.exported = 0
+
+    def test_run_all(self):
+        """Run every report, recording failures and carrying on"""
+        runner = BatchRunner()
+        runner.add(FakeReport, 'first')
+        runner.add(FakeReport, 'second', fail=True)
+        runner.add(FakeReport, name='third', vo='testvo')
+        results = runner.run()
+
+        self.assertListEqual(FakeReport.ran, ['first', 'third'])
+        self.assertListEqual([r.ok for r in results], [True, False, True])
+        self.assertIn('report failed', results[1].error)
+        self.assertEqual(results[2].name, 'FakeReport (testvo)')
+        self.assertIn('FAILED', runner.timings_table())
+
+    def test_no_extra_export(self):
+        """Timings are exported by the report's send_report, not again by
+        the runner"""
+        runner = BatchRunner()
+        runner.add(FakeReport, 'first')
+        runner.run()
+        self.assertEqual(FakeReport.exported, 0)
+
+    def test_stop_on_error(self):
+        """Stop at the first failure if stop_on_error is set"""
+        runner = BatchRunner(stop_on_error=True)
+        runner.add(FakeReport, 'first', fail=True)
+        runner.add(FakeReport, 'second')
+        results = runner.run()
+
+        self.assertListEqual(FakeReport.ran, [])
+        self.assertEqual(len(results), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
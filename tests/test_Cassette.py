@@ -0,0 +1,100 @@
+"""Unit tests for Cassette"""
+
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+from opensearchpy import Search, Transport
+from opensearchpy.exceptions import NotFoundError
+
+from gracc_reporting import ClientFactory
+from gracc_reporting.Cassette import Cassette, CassetteMissError
+
+HOST = 'https://gracc.example.com/q'
+RESPONSE = {'took': 5, 'timed_out': False,
+            '_shards': {'total': 1, 'successful': 1, 'failed': 0},
+            'hits': {'total': {'value': 2, 'relation': 'eq'}, 'hits': []},
+            'aggregations': {'vo': {'buckets': [{'key': 'a', 'doc_count': 2}]}}}
+
+
+def fake_perform_request(method, url, *args, **kwargs):
+    if url == '/_cat/health':
+        return 'green\n'
+    if 'missing' in url:
+        raise NotFoundError(404, 'index_not_found_exception', {'status': 404})
+    return RESPONSE
+
+
+def search(client, index='gracc.osg.summary'):
+    s = Search(using=client, index=index).filter('term', VOName='a')
+    s.aggs.bucket('vo', 'terms', field='VOName')
+    return s
+
+
+class TestCassette(unittest.TestCase):
+    """Tests for recording and replaying requests with Cassette"""
+    def setUp(self):
+        ClientFactory.clear()
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, 'cassette.jsonl.gz')
+
+    def tearDown(self):
+        ClientFactory.clear()
+        shutil.rmtree(self.dir)
+
+    @mock.patch.object(Transport, 'perform_request',
+                       side_effect=fake_perform_request)
+    def record(self, perform_request):
+        client = ClientFactory.get_client(HOST, record=self.path)
+        response = search(client).execute()
+        with self.assertRaises(NotFoundError):
+            search(client, 'missing').execute()
+        ClientFactory.clear()
+        return response
+
+    def test_record_and_replay(self):
+        """Replayed responses and errors match the recorded ones"""
+        recorded = self.record()
+        # Health check, search and the error
+        self.assertEqual(len(Cassette(self.path)), 3)
+
+        with mock.patch.object(Transport, 'perform_request') as perform:
+            client = ClientFactory.get_client(HOST, replay=self.path)
+            replayed = search(client).execute()
+            with self.assertRaises(NotFoundError):
+                search(client, 'missing').execute()
+            perform.assert_not_called()
+        self.assertEqual(replayed.to_dict(), recorded.to_dict())
+        self.assertEqual(replayed.aggregations.vo.buckets[0].key, 'a')
+
+    def test_miss(self):
+        """Raise CassetteMissError for requests that weren't recorded"""
+        self.record()
+        client = ClientFactory.get_client(HOST, replay=self.path)
+        s = search(client).filter('term', ProjectName='other')
+        self.assertRaises(CassetteMissError, s.execute)
+
+    def test_repeated_requests(self):
+        """Repeats are played in order, then the last one again"""
+        cassette = Cassette(self.path)
+        cassette.record('GET', '/', None, {'q': 1}, {'n': 1})
+        cassette.record('GET', '/', None, {'q': 1}, {'n': 2})
+        cassette = Cassette(self.path)
+        self.assertEqual([cassette.play('GET', '/', None, {'q': 1})['n']
+                          for _ in range(3)], [1, 2, 2])
+
+    def test_latency(self):
+        """replay_latency delays each replayed request"""
+        self.record()
+        client = ClientFactory.get_client(HOST, replay=self.path,
+                                          replay_latency=0.05)
+        start = time.time()
+        search(client).execute()
+        self.assertGreaterEqual(time.time() - start, 0.05)
+
+
+if __name__ == '__main__':
+    unittest.main()
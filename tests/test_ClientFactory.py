@@ -0,0 +1,93 @@
+"""Unit tests for ClientFactory"""
+
+import datetime
+import unittest
+from unittest import mock
+
+from opensearchpy import Transport
+
+from gracc_reporting import ClientFactory
+
+HOST = 'https://gracc.example.com/q'
+
+
+class TestClientFactory(unittest.TestCase):
+    """Tests for ClientFactory.get_client and HealthCheckedTransport"""
+    def setUp(self):
+        ClientFactory.clear()
+
+    def tearDown(self):
+        ClientFactory.clear()
+
+    def test_shared_client(self):
+        """Same host and settings share a client.  Different ones don't"""
+        client = ClientFactory.get_client(HOST)
+        self.assertIs(client, ClientFactory.get_client(HOST))
+        self.assertIsNot(client, ClientFactory.get_client(HOST + '2'))
+        self.assertIsNot(client, ClientFactory.get_client(HOST, timeout=5))
+
+    def test_http_compress(self):
+        """Requests and responses are gzipped unless turned off"""
+        client = ClientFactory.get_client(HOST)
+        self.assertTrue(client.transport.get_connection().http_compress)
+        client = ClientFactory.get_client(HOST, http_compress=False)
+        self.assertFalse(client.transport.get_connection().http_compress)
+
+    @mock.patch.object(Transport, 'perform_request')
+    def test_lazy_health_check(self, perform_request):
+        """Don't check health until the first request, then cache it"""
+        perform_request.return_value = 'green\n'
+        client = ClientFactory.get_client(HOST)
+        perform_request.assert_not_called()
+
+        client.transport.perform_request('GET', '/')
+        client.transport.perform_request('GET', '/')
+        urls = [c[0][1] for c in perform_request.call_args_list]
+        self.assertListEqual(urls, ['/_cat/health', '/', '/'])
+
+    @mock.patch.object(Transport, 'perform_request')
+    def test_health_ttl(self, perform_request):
+        """Check health again once the cached status is too old"""
+        perform_request.return_value = 'green\n'
+        client = ClientFactory.get_client(HOST, health_ttl=-1)
+        client.transport.perform_request('GET', '/')
+        client.transport.perform_request('GET', '/')
+        urls = [c[0][1] for c in perform_request.call_args_list]
+        self.assertEqual(urls.count('/_cat/health'), 2)
+
+    @mock.patch.object(Transport, 'perform_request')
+    def test_bad_status(self, perform_request):
+        """Raise UnhealthyClusterError if the status isn't OK"""
+        perform_request.return_value = 'red\n'
+        client = ClientFactory.get_client(HOST)
+        self.assertRaises(ClientFactory.UnhealthyClusterError,
+                          client.transport.perform_request, 'GET', '/')
+
+
+class TestFastJSONSerializer(unittest.TestCase):
+    """FastJSONSerializer gives the same results with or without orjson"""
+    data = {'when': datetime.datetime(2018, 1, 1), 'n': 1, 'big': 2 ** 70,
+            'nested': {'list': [1.5, None, 'a']}}
+
+    def check(self):
+        serializer = ClientFactory.FastJSONSerializer()
+        body = serializer.dumps(self.data)
+        self.assertIsInstance(body, str)
+        self.assertEqual(serializer.loads(body),
+                         dict(self.data, when='2018-01-01T00:00:00'))
+        self.assertEqual(serializer.dumps('{"a": 1}'), '{"a": 1}')
+
+    def test_orjson(self):
+        """Serialize with orjson, if it is installed"""
+        if ClientFactory.orjson is None:
+            self.skipTest("orjson isn't installed")
+        self.check()
+
+    def test_json(self):
+        """Fall back to the json module without orjson"""
+        with mock.patch.object(ClientFactory, 'orjson', None):
+            self.check()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,90 @@
+"""Unit tests for DebugLog"""
+
+import io
+import json
+import logging
+import os
+import shutil
+import tempfile
+import unittest
+
+from gracc_reporting import DebugLog
+
+response = {'took': 5,
+            'aggregations': {'OIM_Site': {'buckets': [
+                {'key': 'site{0}'.format(i), 'doc_count': i}
+                for i in range(100)]}}}
+
+
+class TestFormatJSON(unittest.TestCase):
+    """Tests for DebugLog.format_json"""
+    def test_no_limits(self):
+        """Without limits, the whole body is formatted"""
+        text = DebugLog.format_json(response, max_chars=0, max_items=0)
+        self.assertEqual(json.loads(text), response)
+
+    def test_sample(self):
+        """Lists are cut to max_items, with a note of the rest"""
+        text = DebugLog.format_json(response, max_chars=0, max_items=3)
+        buckets = json.loads(text)['aggregations']['OIM_Site']['buckets']
+        self.assertEqual(len(buckets), 4)
+        self.assertEqual(buckets[-1], '... 97 more')
+
+    def test_truncate(self):
+        """The text is cut off at max_chars"""
+        text = DebugLog.format_json(response, max_chars=50, max_items=0)
+        self.assertTrue(text.endswith('(truncated at 50 characters)'))
+        self.assertLess(len(text), 100)
+
+
+class TestLazyJSON(unittest.TestCase):
+    """Tests for DebugLog.LazyJSON"""
+    def setUp(self):
+        self.stream = io.StringIO()
+        # Not in the logger hierarchy, so test runners' handlers don't see it
+        self.logger = logging.Logger('test_DebugLog', logging.DEBUG)
+        self.handler = logging.StreamHandler(self.stream)
+        self.logger.addHandler(self.handler)
+
+    def tearDown(self):
+        self.logger.removeHandler(self.handler)
+
+    def test_not_formatted_unless_emitted(self):
+        """Nothing is serialized if no handler takes DEBUG records"""
+        self.handler.setLevel(logging.WARNING)
+        lazy = DebugLog.LazyJSON(response)
+        self.logger.debug('Response: %s', lazy)
+        self.assertIsNone(lazy._text)
+        self.assertEqual(self.stream.getvalue(), '')
+
+    def test_formatted_when_emitted(self):
+        """Bodies are formatted, within the limits, when emitted"""
+        self.handler.setLevel(logging.DEBUG)
+        self.logger.debug('Response: %s',
+                          DebugLog.LazyJSON(response, max_items=1))
+        self.assertIn('"... 99 more"', self.stream.getvalue())
+
+
+class TestDumpFile(unittest.TestCase):
+    """Tests for DebugLog.DumpFile"""
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, 'dump.jsonl.gz')
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_write(self):
+        """Bodies are dumped in full, one line each"""
+        dump = DebugLog.DumpFile(self.path)
+        dump.write('query', {'size': 0}, report='test')
+        dump.write('response', response, report='test')
+        lines = list(DebugLog.iter_dump(self.path))
+        self.assertEqual([line['kind'] for line in lines],
+                         ['query', 'response'])
+        self.assertEqual(lines[0]['report'], 'test')
+        self.assertEqual(lines[1]['body'], response)
+
+
+if __name__ == '__main__':
+    unittest.main()
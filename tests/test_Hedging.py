@@ -0,0 +1,114 @@
+"""Unit tests for Hedging"""
+
+import threading
+import time
+import unittest
+
+from opensearchpy.exceptions import ConnectionError, TransportError
+
+from gracc_reporting import ClientFactory, Hedging
+
+HOST = 'https://gracc.example.com/q'
+HEDGE_HOST = 'https://gracc2.example.com/q'
+
+
+class FakeHedgedTransport(Hedging.HedgedTransport):
+    """HedgedTransport whose hosts answer after a set number of seconds, or
+    raise, instead of going over the network"""
+    def __init__(self, answers, **kwargs):
+        super(FakeHedgedTransport, self).__init__(
+            [{'host': 'gracc.example.com'}],
+            hedge_hosts=[HEDGE_HOST] * (len(answers) - 1), **kwargs)
+        self.answers = answers
+        self.sent = []
+        self.lock = threading.Lock()
+
+    def _send_to(self, i, method, url, *args, **kwargs):
+        with self.lock:
+            self.sent.append(i)
+        answer = self.answers[i]
+        if isinstance(answer, Exception):
+            raise answer
+        time.sleep(answer)
+        return {'host': i}
+
+
+class TestHedgedTransport(unittest.TestCase):
+    """Tests for Hedging.HedgedTransport, against fake hosts"""
+    def tearDown(self):
+        ClientFactory.clear()
+
+    def test_fast_primary(self):
+        """A primary that answers before the delay isn't hedged"""
+        transport = FakeHedgedTransport([0., 0.], hedge_delay=1.)
+        self.assertEqual(transport.perform_request('POST', '/x/_search'),
+                         {'host': 0})
+        self.assertEqual(transport.sent, [0])
+        self.assertEqual(transport.stats['hedged'], 0)
+
+    def test_slow_primary(self):
+        """A slow primary is hedged, and the hedge's answer is used"""
+        transport = FakeHedgedTransport([1., 0.], hedge_delay=0.05)
+        start = time.perf_counter()
+        self.assertEqual(transport.perform_request('POST', '/x/_search'),
+                         {'host': 1})
+        self.assertLess(time.perf_counter() - start, 0.9)
+        self.assertEqual(transport.sent, [0, 1])
+        self.assertEqual(transport.stats,
+                         {'requests': 1, 'hedged': 1, 'hedge_wins': 1})
+
+    def test_failed_primary(self):
+        """Send to the next host right away if the primary fails"""
+        transport = FakeHedgedTransport([ConnectionError('N/A', 'down', None),
+                                         0.], hedge_delay=5.)
+        start = time.perf_counter()
+        self.assertEqual(transport.perform_request('GET', '/'), {'host': 1})
+        self.assertLess(time.perf_counter() - start, 1.)
+
+    def test_all_fail(self):
+        """Raise the primary's error if every host fails"""
+        primary_error = TransportError(500, 'primary')
+        transport = FakeHedgedTransport(
+            [primary_error, TransportError(500, 'hedge')], hedge_delay=0.05)
+        with self.assertRaises(TransportError) as raised:
+            transport.perform_request('POST', '/x/_search')
+        self.assertIs(raised.exception, primary_error)
+
+    def test_request_error_not_failed_over(self):
+        """Errors of the request itself are raised from the primary alone"""
+        for error in (TransportError(400, 'parsing_exception'),
+                      TransportError(500, 'too_many_buckets_exception')):
+            transport = FakeHedgedTransport([error, 0., 0.], hedge_delay=5.)
+            with self.assertRaises(TransportError) as raised:
+                transport.perform_request('POST', '/x/_search')
+            self.assertIs(raised.exception, error)
+            self.assertEqual(transport.sent, [0])
+
+    def test_writes_not_hedged(self):
+        """Only reads are hedged"""
+        self.assertTrue(Hedging._is_read('POST', '/gracc.osg.raw-*/_search'))
+        self.assertTrue(Hedging._is_read('GET', '/_cat/health'))
+        self.assertFalse(Hedging._is_read('POST', '/index/_doc'))
+        self.assertFalse(Hedging._is_read('DELETE', '/index'))
+
+    def test_delay_percentile(self):
+        """Hedge after the percentile of the primary's recent latencies"""
+        transport = FakeHedgedTransport([0., 0.], hedge_delay=3.,
+                                        hedge_percentile=90)
+        self.assertEqual(transport.delay_for('/x/_search'), 3.)
+        for i in range(1, 11):
+            transport._record_latency('/y/_search', i / 10.)
+        self.assertAlmostEqual(transport.delay_for('/x/_search'), 0.9)
+        self.assertEqual(transport.delay_for('/x/_count'), 3.)
+
+    def test_get_client(self):
+        """get_client uses HedgedTransport when there are hedge_hosts"""
+        client = ClientFactory.get_client(HOST, hedge_hosts=[HEDGE_HOST])
+        self.assertIsInstance(client.transport, Hedging.HedgedTransport)
+        self.assertEqual(len(client.transport.hedges), 1)
+        self.assertNotIsInstance(ClientFactory.get_client(HOST).transport,
+                                 Hedging.HedgedTransport)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,93 @@
+"""Unit tests for Incremental"""
+
+import shutil
+import tempfile
+import threading
+import unittest
+from datetime import datetime
+
+from dateutil import tz
+
+from gracc_reporting import Incremental
+from gracc_reporting.QueryCache import QueryCache
+
+body = {
+    'query': {'range': {'EndTime': {'gte': '2024-01-01T00:00:00+00:00',
+                                    'lt': '2024-01-04T00:00:00+00:00'}}},
+    'size': 0,
+    'aggs': {'OIM_Site': {'terms': {'field': 'OIM_Site'},
+                          'aggs': {'CoreHours': {'sum': {'field': 'CoreHours'}}}}}
+}
+
+
+class FakeClient(object):
+    """Stand-in for opensearchpy.OpenSearch that answers every day with
+    one bucket and records which days were queried"""
+    def __init__(self):
+        self.days = []
+        self.lock = threading.Lock()
+
+    def search(self, index, body, **kwargs):
+        with self.lock:
+            self.days.append(body['query']['range']['EndTime']['gte'][:10])
+        return {'took': 1, 'timed_out': False,
+                '_shards': {'total': 1, 'successful': 1},
+                'hits': {'total': {'value': 2, 'relation': 'eq'}, 'hits': []},
+                'aggregations': {'OIM_Site': {'buckets': [
+                    {'key': 'A', 'doc_count': 2,
+                     'CoreHours': {'value': 10.0}}]}}}
+
+
+class TestRunIncremental(unittest.TestCase):
+    """Tests for Incremental.run_incremental"""
+    start = datetime(2024, 1, 1, tzinfo=tz.tzutc())
+    end = datetime(2024, 1, 4, tzinfo=tz.tzutc())
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.store = QueryCache(directory=self.directory)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def run_once(self, client, mutable_after, **search_kwargs):
+        return Incremental.run_incremental(
+            client, body, self.start, self.end,
+            lambda s, e: s.strftime('gracc.osg.raw-%Y.%m'), self.store,
+            'host', mutable_after=mutable_after, **search_kwargs)
+
+    def test_reuse_partials(self):
+        """Second run should only query the mutable day, with the same
+        result"""
+        mutable_after = datetime(2024, 1, 3, tzinfo=tz.tzutc())
+        first_client = FakeClient()
+        first, n_first = self.run_once(first_client, mutable_after)
+        second_client = FakeClient()
+        second, n_second = self.run_once(second_client, mutable_after)
+
+        self.assertEqual(n_first, 3)
+        self.assertEqual(n_second, 1)
+        self.assertListEqual(second_client.days, ['2024-01-03'])
+        self.assertDictEqual(first['aggregations'], second['aggregations'])
+        self.assertListEqual(second['aggregations']['OIM_Site']['buckets'],
+                             [{'key': 'A', 'doc_count': 6,
+                               'CoreHours': {'value': 30.0}}])
+
+
+    def test_filter_path_in_key(self):
+        """Runs with different filter_paths don't share partials"""
+        mutable_after = datetime(2024, 1, 3, tzinfo=tz.tzutc())
+        self.run_once(FakeClient(), mutable_after,
+                      filter_path='aggregations,took,timed_out,_shards')
+        _, n_queried = self.run_once(
+            FakeClient(), mutable_after,
+            filter_path='aggregations,hits.total,took,timed_out,_shards')
+        self.assertEqual(n_queried, 3)
+        _, n_queried = self.run_once(
+            FakeClient(), mutable_after,
+            filter_path='aggregations,hits.total,took,timed_out,_shards')
+        self.assertEqual(n_queried, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -3,7 +3,8 @@
 import unittest
 from datetime import datetime
 
-from gracc_reporting.IndexPattern import indexpattern_generate
+from gracc_reporting.IndexPattern import indexpattern_generate, \
+    enumerate_indices, compress_indices, get_existing_indices
 
 
 date_dateend = datetime(2016, 0o6, 12)
@@ -124,3 +125,87 @@ class TestIndexPatternGenerateDateDep(unittest.TestCase):
         self.assertEqual(indexpattern_generate(
             pattern=self.pattern_good, start=date_datestart3, end=date_dateend),
                          answer)
+
+
+class TestIndexPatternGenerateExact(unittest.TestCase):
+    """Unit tests for indexpattern_generate in exact mode, and the helper
+    functions for it"""
+
+    pattern_month = 'gracc.osg.raw-%Y.%m'
+    pattern_day = 'gracc.osg.raw-%Y.%m.%d'
+
+    def test_exact_across_year(self):
+        """Dec to Jan should list both months, not 'gracc.osg.raw-20*'"""
+        answer = 'gracc.osg.raw-2023.12,gracc.osg.raw-2024.01'
+        self.assertEqual(indexpattern_generate(
+            pattern=self.pattern_month, start=datetime(2023, 12, 5),
+            end=datetime(2024, 1, 10), exact=True), answer)
+
+    def test_exact_same_index(self):
+        """Dates in the same index should just return that index"""
+        self.assertEqual(indexpattern_generate(
+            pattern=self.pattern_month, start=date_datestart1,
+            end=date_dateend, exact=True), 'gracc.osg.raw-2016.06')
+
+    def test_enumerate_months(self):
+        """List every month, including partial first and last months"""
+        answer = ['gracc.osg.raw-2016.0{0}'.format(m) for m in range(5, 7)]
+        self.assertListEqual(enumerate_indices(
+            self.pattern_month, date_datestart2, date_dateend), answer)
+
+    def test_compress_whole_year(self):
+        """Whole years become a single wildcard"""
+        answer = ['gracc.osg.raw-2023.12', 'gracc.osg.raw-2024.*',
+                  'gracc.osg.raw-2025.01']
+        self.assertListEqual(compress_indices(
+            self.pattern_month, datetime(2023, 12, 5),
+            datetime(2025, 1, 10)), answer)
+
+    def test_compress_whole_month(self):
+        """Whole months of daily indices become a single wildcard"""
+        answer = ['gracc.osg.raw-2023.12.31', 'gracc.osg.raw-2024.01.*',
+                  'gracc.osg.raw-2024.02.01']
+        self.assertListEqual(compress_indices(
+            self.pattern_day, datetime(2023, 12, 31),
+            datetime(2024, 2, 1)), answer)
+
+    def test_no_loose_wildcards(self):
+        """Don't use wildcards if the year isn't at the front of the
+        pattern"""
+        parts = compress_indices('gracc.osg.raw-%m.%Y', datetime(2024, 1, 1),
+                                 datetime(2024, 12, 31))
+        self.assertEqual(len(parts), 12)
+        self.assertFalse(any('*' in p for p in parts))
+
+    def test_existing_filter(self):
+        """Leave out indices that don't exist"""
+        existing = ['gracc.osg.raw-2024.03', 'gracc.osg.raw-2023.12',
+                    'gracc.osg.summary']
+        answer = 'gracc.osg.raw-2023.12,gracc.osg.raw-2024.*'
+        self.assertEqual(indexpattern_generate(
+            pattern=self.pattern_month, start=datetime(2023, 12, 5),
+            end=datetime(2025, 1, 10), exact=True, existing=existing), answer)
+
+    def test_existing_none_exist(self):
+        """Fall back to the common prefix wildcard if nothing exists"""
+        self.assertEqual(indexpattern_generate(
+            pattern=self.pattern_month, start=date_datestart3,
+            end=date_dateend, exact=True, existing=[]), 'gracc.osg.raw-201*')
+
+    def test_get_existing_indices_cached(self):
+        """Only call _cat/indices once within the TTL"""
+        class FakeCat(object):
+            calls = 0
+
+            def indices(self, **kwargs):
+                FakeCat.calls += 1
+                return [{'index': 'gracc.osg.raw-2024.01'}]
+
+        class FakeClient(object):
+            cat = FakeCat()
+
+        client = FakeClient()
+        for _ in range(2):
+            self.assertListEqual(get_existing_indices(client, 'test.cache-%Y'),
+                                 ['gracc.osg.raw-2024.01'])
+        self.assertEqual(FakeCat.calls, 1)
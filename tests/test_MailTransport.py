@@ -0,0 +1,80 @@
+"""Unit tests for MailTransport, against LocalSMTPServer"""
+
+import unittest
+
+from gracc_reporting.MailTransport import MailTransport, LocalSMTPServer
+import gracc_reporting.TextUtils as TextUtils
+
+from_addr = 'nobody@example.com'
+to_addrs = ['nobody1@example.com', 'nobody2@example.com']
+
+
+def message(i):
+    return 'Subject: test {0}\r\n\r\nBody {0}\r\n'.format(i)
+
+
+class TestMailTransport(unittest.TestCase):
+    """Tests for MailTransport sessions"""
+    def setUp(self):
+        self.server = LocalSMTPServer().start()
+
+    def tearDown(self):
+        self.server.stop()
+
+    def transport(self, **kwargs):
+        return MailTransport('127.0.0.1', self.server.port, 'user',
+                             'password', ssl=False, timeout=5, **kwargs)
+
+    def test_one_session(self):
+        """Several messages are sent over one login"""
+        with self.transport() as t:
+            for i in range(5):
+                t.send(from_addr, to_addrs, message(i))
+        self.assertEqual(self.server.logins, 1)
+        self.assertEqual(len(self.server.messages), 5)
+        self.assertEqual(self.server.messages[0]['to'], to_addrs)
+        self.assertIn('Body 4', self.server.messages[4]['data'])
+        self.assertFalse(t.connected)
+
+    def test_send_many(self):
+        """send_many sends every message over one connection"""
+        with self.transport() as t:
+            errors = t.send_many((from_addr, to_addrs, message(i))
+                                 for i in range(10))
+        self.assertEqual(errors, [None] * 10)
+        self.assertEqual(len(self.server.messages), 10)
+        self.assertEqual(t.connections, 1)
+
+    def test_reconnect(self):
+        """A dropped session is reopened and the message resent"""
+        with self.transport() as t:
+            t.send(from_addr, to_addrs, message(0))
+            t.server.close()    # Simulate the server timing us out
+            t.send(from_addr, to_addrs, message(1))
+        self.assertEqual(t.connections, 2)
+        self.assertEqual(len(self.server.messages), 2)
+
+    def test_no_login(self):
+        """Don't log in without a user"""
+        with MailTransport('127.0.0.1', self.server.port, ssl=False) as t:
+            t.send(from_addr, to_addrs, message(0))
+        self.assertEqual(self.server.logins, 0)
+        self.assertEqual(len(self.server.messages), 1)
+
+    def test_shared_sessions(self):
+        """TextUtils.mail_transport shares transports inside
+        shared_smtp_sessions"""
+        with TextUtils.shared_smtp_sessions():
+            for i in range(3):
+                with TextUtils.mail_transport('127.0.0.1', self.server.port,
+                                              'user', 'password',
+                                              ssl=False) as t:
+                    t.send(from_addr, to_addrs, message(i))
+            self.assertTrue(t.connected)
+        self.assertFalse(t.connected)
+        self.assertEqual(self.server.logins, 1)
+        self.assertEqual(len(self.server.messages), 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
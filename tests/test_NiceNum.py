@@ -2,6 +2,10 @@
 
 import unittest
 import doctest
+import random
+
+import numpy as np
+import pandas as pd
 
 import gracc_reporting.NiceNum as NiceNum
 
@@ -10,4 +14,40 @@ class TestNiceNum(unittest.TestCase):
     """Test niceNum from NiceNum"""
     def test_nicenum_from_doctest(self):
         """Run doctests in niceNum"""
-        doctest.testmod(NiceNum, verbose=False)
+        results = doctest.testmod(NiceNum, verbose=False)
+        self.assertEqual(results.failed, 0)
+
+
+class TestNiceNumArray(unittest.TestCase):
+    """Test niceNumArray from NiceNum"""
+    values = [0.5, 1.5, 2.5, -0.4, -2.5, 2.675, 1e15 + 0.5, 10 ** 17, 7, 0] + \
+        [random.Random(i).uniform(-1e9, 1e9) for i in range(1000)]
+
+    def test_matches_nicenum(self):
+        """Same strings as niceNum, at several precisions"""
+        for precision in (0, 1, 2, 3):
+            self.assertEqual(
+                NiceNum.niceNumArray(np.array(self.values), precision),
+                [NiceNum.niceNum(v, precision) for v in self.values])
+
+    def test_missing(self):
+        """NaN, None and empty strings become empty cells"""
+        self.assertEqual(
+            NiceNum.niceNumArray([1234, None, np.nan, '', 2.5]),
+            ['1,234', '', '', '', '2'])
+        self.assertEqual(NiceNum.niceNumArray(np.array([np.nan, 1.0])),
+                         ['', '1'])
+
+    def test_series(self):
+        """A Series comes back as a Series with the same index and name"""
+        s = pd.Series([1e6, None, 3.25], index=['x', 'y', 'z'],
+                      name='CoreHours')
+        result = NiceNum.niceNumArray(s, 1)
+        self.assertEqual(list(result.index), ['x', 'y', 'z'])
+        self.assertEqual(result.name, 'CoreHours')
+        self.assertEqual(list(result), ['1,000,000.0', '', '3.2'])
+
+    def test_ints(self):
+        """Integers are formatted without decimals"""
+        self.assertEqual(NiceNum.niceNumArray(np.arange(999, 1002)),
+                         ['999', '1,000', '1,001'])
@@ -0,0 +1,127 @@
+"""Unit tests for Outbox"""
+
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+import gracc_reporting.TextUtils as TextUtils
+from gracc_reporting.MailTransport import MailTransport, LocalSMTPServer
+from gracc_reporting.Outbox import Outbox
+
+from_addr = 'nobody@example.com'
+to_addrs = ['nobody1@example.com']
+
+
+def message(i):
+    return 'Subject: test {0}\r\n\r\nBody {0}\r\n'.format(i)
+
+
+class TestOutbox(unittest.TestCase):
+    """Tests for the Outbox spool and flusher"""
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.outbox = Outbox(self.dir)
+        self.server = LocalSMTPServer().start()
+
+    def tearDown(self):
+        self.server.stop()
+        shutil.rmtree(self.dir)
+
+    def transport(self):
+        return MailTransport('127.0.0.1', self.server.port, ssl=False)
+
+    def test_put_and_flush(self):
+        """Queued messages are all sent, over several sessions"""
+        for i in range(10):
+            self.outbox.put(from_addr, to_addrs, message(i))
+        self.assertEqual(len(self.outbox.pending()), 10)
+
+        sent, failed = self.outbox.flush(self.transport, max_workers=3)
+        self.assertEqual((sent, failed), (10, 0))
+        self.assertEqual(self.outbox.pending(), [])
+        self.assertEqual(os.listdir(os.path.join(self.dir, 'cur')), [])
+        bodies = sorted(m['data'] for m in self.server.messages)
+        self.assertEqual(len(bodies), 10)
+        self.assertIn('Body 9', bodies[-1])
+
+    def test_claim_once(self):
+        """A message can only be claimed once"""
+        name = self.outbox.put(from_addr, to_addrs, message(0))
+        self.assertIsNotNone(self.outbox.claim(name))
+        self.assertIsNone(self.outbox.claim(name))
+
+    def test_retry_and_fail(self):
+        """Failed messages are retried after a delay, then given up on"""
+        self.outbox.put(from_addr, to_addrs, message(0))
+
+        def broken_transport():
+            return MailTransport('127.0.0.1', 1, ssl=False, timeout=1)
+
+        sent, failed = self.outbox.flush(broken_transport, max_attempts=2,
+                                         retry_delay=60)
+        self.assertEqual((sent, failed), (0, 1))
+        # Not due again yet
+        self.assertEqual(self.outbox.pending(), [])
+        self.assertEqual(len(self.outbox.pending(now=time.time() + 61)), 1)
+
+        with mock.patch('time.time', return_value=time.time() + 61):
+            sent, failed = self.outbox.flush(broken_transport,
+                                             max_attempts=2)
+        self.assertEqual((sent, failed), (0, 1))
+        self.assertEqual(len(self.outbox.failed()), 1)
+        self.assertEqual(self.outbox.pending(now=time.time() + 10 ** 6), [])
+
+    def test_recover(self):
+        """Stale claims are put back into new/"""
+        name = self.outbox.put(from_addr, to_addrs, message(0))
+        self.outbox.claim(name)
+        self.assertEqual(self.outbox.recover(stale_after=3600), 0)
+        self.assertEqual(self.outbox.recover(stale_after=-1), 1)
+        self.assertEqual(self.outbox.pending(), [name])
+
+    def test_corrupt_message(self):
+        """Messages that can't be read are moved to failed/, not retried"""
+        name = self.outbox.put(from_addr, to_addrs, message(0))
+        with open(os.path.join(self.dir, 'new', name), 'w') as f:
+            f.write('{"from_addr": ')
+        with self.assertLogs('gracc_reporting.Outbox', 'ERROR'):
+            self.assertEqual(self.outbox.flush(self.transport), (0, 0))
+        self.assertEqual(self.outbox.failed(), [name])
+        self.assertEqual(self.outbox.recover(stale_after=-1), 0)
+
+    def test_heartbeat(self):
+        """A message that's slow to send isn't recovered meanwhile"""
+        name = self.outbox.put(from_addr, to_addrs, message(0))
+        recovered = []
+
+        class SlowTransport(object):
+            def send(transport, *args):
+                time.sleep(0.3)
+                recovered.append(self.outbox.recover(stale_after=0.2))
+
+            def close(transport):
+                pass
+
+        sent, failed = self.outbox.flush(SlowTransport, stale_after=0.2)
+        self.assertEqual((sent, failed), (1, 0))
+        self.assertEqual(recovered, [0])
+        self.assertEqual(self.outbox.pending(), [])
+
+    def test_sendEmail_outbox(self):
+        """sendEmail queues instead of sending when given an outbox"""
+        content = {'text': 'report', 'html': '<table></table>'}
+        with mock.patch('smtplib.SMTP_SSL') as smtp:
+            TextUtils.sendEmail((['Test'], to_addrs), 'subject', content,
+                                ('GRACC', from_addr), 'smtp.example.com',
+                                outbox=self.outbox)
+        self.assertFalse(smtp.called)
+        self.assertEqual(len(self.outbox.pending()), 1)
+        self.outbox.flush(self.transport)
+        self.assertIn('Subject: subject', self.server.messages[0]['data'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,109 @@
+"""Unit tests for Pipeline"""
+
+import io
+import unittest
+from collections import defaultdict
+
+from gracc_reporting import Pipeline
+
+records = [
+    {'OIM_Site': 'A', 'VOName': 'x', 'CoreHours': 1.0},
+    {'OIM_Site': 'B', 'VOName': 'x', 'CoreHours': 5.0},
+    {'OIM_Site': 'A', 'VOName': 'y', 'CoreHours': 2.0},
+    {'OIM_Site': 'A', 'VOName': 'x', 'CoreHours': 3.0},
+    {'OIM_Site': 'C', 'VOName': 'y', 'CoreHours': 0.0},
+]
+
+
+class TestStages(unittest.TestCase):
+    """Tests for the Pipeline stages"""
+    def test_filter_project(self):
+        """filter_records drops records and project renames fields"""
+        report = defaultdict(list)
+        n = Pipeline.feed(records, Pipeline.filter_records(
+            lambda r: r['CoreHours'] > 0,
+            Pipeline.project({'Site': 'OIM_Site'},
+                             Pipeline.dict_sink(report, ['Site']))))
+        self.assertEqual(n, 5)
+        self.assertEqual(report, {'Site': ['A', 'B', 'A', 'A']})
+
+    def test_group_by(self):
+        """group_by sums, counts and takes the max per group"""
+        report = defaultdict(list)
+        columns = ['OIM_Site', 'CoreHours', 'Jobs', 'Max']
+        Pipeline.feed(records, Pipeline.group_by(
+            ['OIM_Site'],
+            {'CoreHours': ('sum', 'CoreHours'), 'Jobs': ('count', None),
+             'Max': ('max', 'CoreHours')},
+            Pipeline.dict_sink(report, columns)))
+        self.assertEqual(report['OIM_Site'], ['A', 'B', 'C'])
+        self.assertEqual(report['CoreHours'], [6.0, 5.0, 0.0])
+        self.assertEqual(report['Jobs'], [3, 1, 1])
+        self.assertEqual(report['Max'], [3.0, 5.0, 0.0])
+
+    def test_group_by_multiple_keys(self):
+        """Groups on several keys come out in first-seen order"""
+        report = defaultdict(list)
+        Pipeline.feed(records, Pipeline.group_by(
+            ['OIM_Site', 'VOName'], {'Min': ('min', 'CoreHours')},
+            Pipeline.dict_sink(report, ['OIM_Site', 'VOName', 'Min'])))
+        self.assertEqual(list(zip(report['OIM_Site'], report['VOName'],
+                                  report['Min'])),
+                         [('A', 'x', 1.0), ('B', 'x', 5.0), ('A', 'y', 2.0),
+                          ('C', 'y', 0.0)])
+
+    def test_top_n(self):
+        """top_n keeps the largest (or smallest) n records, in order"""
+        report = defaultdict(list)
+        Pipeline.feed(records, Pipeline.top_n(
+            2, 'CoreHours', Pipeline.dict_sink(report, ['CoreHours'])))
+        self.assertEqual(report['CoreHours'], [5.0, 3.0])
+
+        report = defaultdict(list)
+        Pipeline.feed(records, Pipeline.top_n(
+            2, lambda r: r['CoreHours'], Pipeline.dict_sink(report, ['CoreHours']),
+            largest=False))
+        self.assertEqual(report['CoreHours'], [0.0, 1.0])
+
+    def test_top_n_missing(self):
+        """Records without a numeric value are left out of top_n"""
+        report = defaultdict(list)
+        Pipeline.feed(records + [{'OIM_Site': 'D', 'CoreHours': None},
+                                 {'OIM_Site': 'E'},
+                                 {'OIM_Site': 'F', 'CoreHours': float('nan')}],
+                      Pipeline.top_n(10, 'CoreHours',
+                                     Pipeline.dict_sink(report, ['OIM_Site'])))
+        self.assertEqual(report['OIM_Site'], ['B', 'A', 'A', 'A', 'C'])
+
+
+class TestSinks(unittest.TestCase):
+    """Tests for the Pipeline sinks"""
+    def test_csv_sink(self):
+        """csv_sink writes a header and one line per record"""
+        f = io.StringIO()
+        Pipeline.feed(records[:2], Pipeline.csv_sink(f, ['OIM_Site',
+                                                         'CoreHours']))
+        self.assertEqual(f.getvalue().splitlines(),
+                         ['OIM_Site,CoreHours', 'A,1.0', 'B,5.0'])
+
+    def test_dataframe_sink(self):
+        """dataframe_sink collects records into DataFrame chunks"""
+        frames = []
+        Pipeline.feed(records, Pipeline.dataframe_sink(
+            frames, ['OIM_Site', 'CoreHours'], chunk_size=2))
+        self.assertEqual(len(frames), 1)
+        df = frames[0]
+        self.assertEqual(list(df.columns), ['OIM_Site', 'CoreHours'])
+        self.assertEqual(list(df['OIM_Site']), ['A', 'B', 'A', 'A', 'C'])
+        self.assertEqual(df['CoreHours'].sum(), 11.0)
+
+    def test_dataframe_sink_empty(self):
+        """No records still give a DataFrame with the columns"""
+        frames = []
+        Pipeline.feed([], Pipeline.dataframe_sink(frames, ['OIM_Site']))
+        self.assertEqual(len(frames[0]), 0)
+        self.assertEqual(list(frames[0].columns), ['OIM_Site'])
+
+
+if __name__ == '__main__':
+    unittest.main()
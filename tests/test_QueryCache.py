@@ -0,0 +1,72 @@
+"""Unit tests for QueryCache"""
+
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+from gracc_reporting.QueryCache import QueryCache
+
+body = {'query': {'range': {'EndTime': {'gte': '2024-01-01', 'lt': '2024-02-01'}}},
+        'aggs': {'OIM_Site': {'terms': {'field': 'OIM_Site'}}}}
+response = {'took': 10, 'timed_out': False,
+            '_shards': {'total': 1, 'successful': 1},
+            'aggregations': {'OIM_Site': {'buckets': [{'key': 'A',
+                                                       'doc_count': 1}]}}}
+
+
+class TestQueryCache(unittest.TestCase):
+    """Tests for QueryCache.QueryCache"""
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.cache = QueryCache(directory=self.directory)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_make_key_canonical(self):
+        """Key shouldn't depend on dict ordering, but should depend on the
+        index and host"""
+        reordered = {'aggs': body['aggs'], 'query': body['query']}
+        key = QueryCache.make_key(body, 'idx', 'host')
+        self.assertEqual(key, QueryCache.make_key(reordered, 'idx', 'host'))
+        self.assertNotEqual(key, QueryCache.make_key(body, 'idx2', 'host'))
+        self.assertNotEqual(key, QueryCache.make_key(body, 'idx', 'host2'))
+
+    def test_put_get(self):
+        """Get back what we put in"""
+        key = QueryCache.make_key(body, 'idx', 'host')
+        self.assertIsNone(self.cache.get(key))
+        self.cache.put(key, response)
+        self.assertDictEqual(self.cache.get(key), response)
+
+    def test_expired(self):
+        """Don't return expired entries"""
+        key = QueryCache.make_key(body, 'idx', 'host')
+        self.cache.put(key, response, ttl=-1)
+        self.assertIsNone(self.cache.get(key))
+        self.assertListEqual(os.listdir(self.directory), [])
+
+    def test_lru_eviction(self):
+        """Evict the least recently used entries past max_bytes"""
+        keys = [QueryCache.make_key(body, str(i), 'host') for i in range(3)]
+        for i, key in enumerate(keys):
+            self.cache.put(key, response)
+            past = time.time() - 100 + i
+            os.utime(os.path.join(self.directory, key + '.json.gz'),
+                     (past, past))
+
+        self.cache.get(keys[0])     # keys[1] is now least recently used
+        entry_size = os.path.getsize(
+            os.path.join(self.directory, keys[0] + '.json.gz'))
+        self.cache.max_bytes = entry_size * 2
+        self.cache.evict()
+
+        self.assertIsNotNone(self.cache.get(keys[0]))
+        self.assertIsNone(self.cache.get(keys[1]))
+        self.assertIsNotNone(self.cache.get(keys[2]))
+
+
+if __name__ == '__main__':
+    unittest.main()
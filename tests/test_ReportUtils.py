@@ -2,11 +2,17 @@
 
 import unittest
 import os
+import shutil
+import tempfile
+import time
+import types
 from shutil import copyfile
 
+from opensearchpy import Search
 import toml
 
 import gracc_reporting.ReportUtils as ReportUtils
+from gracc_reporting import ClientFactory
 
 CONFIG_FILE = 'tests/test_config.toml'
 BAD_CONFIG_FILE = 'tests/test_bad_config.toml'
@@ -165,8 +171,8 @@ class TestEstablishClient(TestReportUtilsBase):
         self.assertRaises(SystemExit, FakeVOReport, althost_key='invalid_key')
 
     def test_cluster_bad_status(self):
-        """Raise SystemExit if the cluster is in a state that's not 
-        in the config file as being 'OK'"""
+        """Raise UnhealthyClusterError on the first request if the cluster
+        is in a state that's not in the config file as being 'OK'"""
         _cfg = '/tmp/junk.toml'
         text = """
 [elasticsearch]
@@ -176,7 +182,9 @@ class TestEstablishClient(TestReportUtilsBase):
         with open(_cfg, 'a') as f:
             f.write(text)
                 
-        self.assertRaises(SystemExit, FakeVOReport, cfg_file=_cfg)
+        test_report = FakeVOReport(cfg_file=_cfg)
+        self.assertRaises(ClientFactory.UnhealthyClusterError,
+                          test_report.client.info)
 
 
 
@@ -225,6 +233,252 @@ class TestGetEmailInfo(TestReportUtilsBase):
         del test_report_test
 
 
+class TestLazyIndexPattern(unittest.TestCase):
+    """Unit tests for Reporter.indexpattern with check_indices"""
+    config = """
+[elasticsearch]
+    hostname = 'https://gracc.example.com/q'
+
+[email]
+    smtphost = 'smtp.example.com'
+    smtpport = 465
+    smtpuser = 'user'
+    smtppassword = 'password'
+    [email.from]
+        name = 'GRACC Operations'
+        email = 'nobody@example.com'
+    [email.test]
+        names = ['Test Recipient', ]
+        emails = ['nobody1@example.com', ]
+
+[lazytest]
+    index_pattern = 'lazy.test-%Y.%m.%d'
+    exact_indices = true
+    check_indices = true
+    to_names = ['test name', ]
+    to_emails = ['nobody2@example.com', ]
+"""
+
+    class FakeCat(object):
+        def __init__(self):
+            self.calls = 0
+
+        def indices(self, **kwargs):
+            self.calls += 1
+            return [{'index': 'lazy.test-2018.03.28'}]
+
+    class Report(ReportUtils.Reporter):
+        def query(self): pass
+        def run_report(self): pass
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.config_file = os.path.join(self.dir, 'config.toml')
+        with open(self.config_file, 'w') as f:
+            f.write(self.config)
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_no_listing_in_constructor(self):
+        """Indices are only listed when the index pattern is first used"""
+        report = self.Report('lazytest', self.config_file,
+                             '2018-03-28 06:30', '2018-03-29 06:30')
+        cat = self.FakeCat()
+        report.client = types.SimpleNamespace(cat=cat, transport=None)
+        self.assertEqual(cat.calls, 0)
+        self.assertEqual(report.indexpattern, 'lazy.test-2018.03.28')
+        self.assertEqual(report.indexpattern, 'lazy.test-2018.03.28')
+        self.assertEqual(cat.calls, 1)
+
+
+class TestApplyFilterPath(unittest.TestCase):
+    """Unit tests for Reporter._apply_filter_path.  Doesn't need a whole
+    Reporter, just its filter_path"""
+    def apply(self, s, filter_path=None):
+        report = types.SimpleNamespace(filter_path=filter_path)
+        return ReportUtils.Reporter._apply_filter_path(report, s)
+
+    def test_no_filter_path(self):
+        """Searches are unchanged without a filter_path"""
+        s = Search()
+        self.assertIs(self.apply(s), s)
+
+    def test_class_filter_path(self):
+        """The class filter_path gets the fields run_query checks"""
+        s = self.apply(Search(), ['aggregations'])
+        self.assertEqual(s._params['filter_path'],
+                         'aggregations,took,timed_out,_shards')
+
+    def test_search_filter_path(self):
+        """A Search's own filter_path wins over the class one"""
+        s = self.apply(Search().params(filter_path='hits.hits,took'),
+                       ['aggregations'])
+        self.assertEqual(s._params['filter_path'],
+                         'hits.hits,took,timed_out,_shards')
+
+
+class TestMergeFilterPath(unittest.TestCase):
+    """A narrow filter_path can't drop what the methods merging partial
+    responses need"""
+    config = """
+[elasticsearch]
+    hostname = 'https://gracc.example.com/q'
+
+[email]
+    smtphost = 'smtp.example.com'
+    smtpport = 465
+    smtpuser = 'user'
+    smtppassword = 'password'
+    [email.from]
+        name = 'GRACC Operations'
+        email = 'nobody@example.com'
+    [email.test]
+        names = ['Test Recipient', ]
+        emails = ['nobody1@example.com', ]
+
+[incremental]
+    directory = '{0}'
+
+[mergetest]
+    index_pattern = 'gracc.osg.raw-%Y.%m'
+    to_names = ['test name', ]
+    to_emails = ['nobody2@example.com', ]
+"""
+
+    class FilteringClient(object):
+        """Stand-in for opensearchpy.OpenSearch that leaves out whatever
+        filter_path doesn't match.  The first timeouts responses time
+        out"""
+        transport = types.SimpleNamespace(hosts=['fake'])
+
+        def __init__(self, timeouts=0):
+            self.timeouts = timeouts
+            self.calls = 0
+
+        def search(self, index, body, filter_path=None, **kwargs):
+            self.calls += 1
+            response = {
+                'took': 1, 'timed_out': self.calls <= self.timeouts,
+                '_shards': {'total': 1, 'successful': 1},
+                'hits': {'total': {'value': 1, 'relation': 'eq'}, 'hits': []},
+                'aggregations': {'VOName': {
+                    'doc_count_error_upper_bound': 0,
+                    'sum_other_doc_count': 0,
+                    'buckets': [{'key': 'vo1', 'doc_count': 1,
+                                 'CoreHours': {'value': 1.0}}]}}}
+            if filter_path is None:
+                return response
+            return self.filter(response, [path.split('.') for path
+                                          in filter_path.split(',')])
+
+        def filter(self, obj, paths):
+            if [] in paths:
+                return obj
+            if isinstance(obj, list):
+                return [self.filter(item, paths) for item in obj]
+            if not isinstance(obj, dict):
+                return obj
+            return {key: self.filter(value, [path[1:] for path in paths
+                                             if path[0] == key])
+                    for key, value in obj.items()
+                    if any(path[0] == key for path in paths)}
+
+    class Report(ReportUtils.Reporter):
+        filter_path = ['aggregations.VOName.buckets.key']
+
+        def query(self):
+            s = Search(using=self.fake_client, index=self.indexpattern)\
+                .filter('range', EndTime={'gte': self.start_time,
+                                          'lt': self.end_time})[0:0]
+            s.aggs.bucket('VOName', 'terms', field='VOName')\
+                .metric('CoreHours', 'sum', field='CoreHours')
+            return s
+
+        def run_report(self): pass
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.config_file = os.path.join(self.dir, 'config.toml')
+        with open(self.config_file, 'w') as f:
+            f.write(self.config.format(os.path.join(self.dir, 'partials')))
+        self.report = self.Report('mergetest', self.config_file,
+                                  '2018-03-28 06:30', '2018-03-29 06:30')
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def check(self, results, client):
+        bucket = results.VOName.buckets[0]
+        self.assertEqual(bucket.doc_count, client.calls - client.timeouts)
+        self.assertEqual(bucket.CoreHours.value,
+                         client.calls - client.timeouts)
+
+    def test_sliced(self):
+        """run_query_sliced merges windows with a narrow filter_path"""
+        client = self.report.fake_client = self.FilteringClient()
+        self.check(self.report.run_query_sliced(window='day'), client)
+
+    def test_incremental(self):
+        """run_query_incremental merges days with a narrow filter_path"""
+        client = self.report.fake_client = self.FilteringClient()
+        self.check(self.report.run_query_incremental(), client)
+
+    def test_adaptive(self):
+        """run_query_adaptive still sees the timeout and splits with a narrow
+        filter_path"""
+        client = self.report.fake_client = self.FilteringClient(timeouts=1)
+        self.check(self.report.run_query_adaptive(), client)
+        self.assertEqual(client.calls, 3)
+
+
+class TestPaginatedRunQuery(unittest.TestCase):
+    """Unit tests for Reporter.run_query with paginate=True"""
+    class PagingClient(object):
+        """Stand-in for opensearchpy.OpenSearch that returns a page of one
+        composite bucket per search, delay seconds after being asked"""
+        def __init__(self, pages, delay):
+            self.pages = pages
+            self.delay = delay
+            self.calls = 0
+
+        def search(self, index, body, **kwargs):
+            time.sleep(self.delay)
+            self.calls += 1
+            agg = {'buckets': []}
+            if self.calls <= self.pages:
+                agg['buckets'] = [{'key': {'VOName': 'vo{0}'.format(
+                    self.calls)}, 'doc_count': 1, 'CoreHours': {'value': 1.0}}]
+                agg['after_key'] = agg['buckets'][0]['key']
+            return {'took': 1, 'timed_out': False,
+                    '_shards': {'total': 1, 'successful': 1},
+                    'aggregations': {'VOName': agg}}
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        config_file = os.path.join(self.dir, 'config.toml')
+        with open(config_file, 'w') as f:
+            f.write(TestMergeFilterPath.config.format(self.dir))
+        self.report = TestMergeFilterPath.Report(
+            'mergetest', config_file, '2018-03-28 06:30', '2018-03-29 06:30')
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_span_covers_pages(self):
+        """The run_query span covers fetching the pages, not just making the
+        generator"""
+        client = self.report.fake_client = self.PagingClient(2, delay=0.05)
+        buckets = self.report.run_query(paginate=True, page_size=1)
+        self.assertEqual(client.calls, 0)
+        self.assertEqual(len(list(buckets)), 2)
+        spans = [record for record in self.report.timings.spans
+                 if record['name'] == 'run_query']
+        self.assertEqual(len(spans), 1)
+        self.assertEqual(spans[0]['buckets'], 2)
+        self.assertGreaterEqual(spans[0]['seconds'], 3 * client.delay)
+
+
 # Everything besides Reporter
 class TestUtilFuncs(unittest.TestCase):
     """Unit tests for ReportUtils module level functions"""
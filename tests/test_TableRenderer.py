@@ -0,0 +1,99 @@
+"""Unit tests for TableRenderer: output must match tabulate byte for byte"""
+
+import random
+import unittest
+from unittest import mock
+
+import numpy as np
+import pandas as pd
+import tabulate
+
+from gracc_reporting import TableRenderer
+
+header = ['Site', 'VO', 'CoreHours']
+alignments = [['left', 'left', 'right'], None, ['right', 'left', 'left']]
+
+
+def report_frame(content):
+    """Convert content the way TextUtils does"""
+    return pd.DataFrame.from_dict(content, orient='index').transpose()[header]
+
+
+def random_frame(n, seed=0):
+    rng = random.Random(seed)
+    return report_frame({
+        'Site': [rng.choice(['Site-1', 'S2', 'A_Long_Site_Name'])
+                 for _ in range(n)],
+        'VO': [rng.choice(['osg', 'cms', '', None]) for _ in range(n)],
+        'CoreHours': [rng.uniform(-1e7, 1e7) for _ in range(n)],
+    })
+
+
+# Tables the fast path renders itself
+fast_tables = [
+    report_frame({'Site': ['A', 'B<&>"\'', 'Total'], 'VO': ['x', 'y', ''],
+                  'CoreHours': [1234.5, 2.5, -0.4]}),
+    report_frame({'Site': ['A', 'B', 'C'], 'VO': ['1', '2', '3'],
+                  'CoreHours': [1, None, '1,234.7']}),
+    report_frame({'Site': ['A', 'B'], 'VO': [None, None],
+                  'CoreHours': [10 ** 20, 5]}),
+    report_frame({'Site': ['True', 'False'], 'VO': ['1e3', 'nan'],
+                  'CoreHours': ['  x ', 'inf']}),
+    report_frame({'Site': [' 12 ', '1_000'], 'VO': ['1,000', '2'],
+                  'CoreHours': [np.int64(4), 5.5]}),
+    pd.DataFrame({'Site': [1.5, 2.5], 'VO': [1, 2],
+                  'CoreHours': [True, False]}),
+    pd.DataFrame({'Site': np.array([1, 2], dtype=np.uint8),
+                  'VO': np.array([1, 2]), 'CoreHours': [np.nan, np.inf]}),
+    random_frame(500),
+]
+
+# Tables that have to go through tabulate
+slow_tables = [
+    pd.DataFrame({'Site': ['é', 'b'], 'VO': ['a\nb', 'c'],
+                  'CoreHours': [1, 2]}),
+    report_frame({'Site': [], 'VO': [], 'CoreHours': []}),
+    pd.DataFrame({'Site': ['a'], 'VO': ['b']}),
+]
+
+
+def expected(df, tablefmt, colalign):
+    return str(tabulate.tabulate(df, tablefmt=tablefmt, headers=header,
+                                 showindex=False, floatfmt=',.0f',
+                                 colalign=colalign))
+
+
+class TestRenderTable(unittest.TestCase):
+    """render_table matches tabulate exactly"""
+    def check(self, tables, fast):
+        for i, df in enumerate(tables):
+            for tablefmt in ('grid', 'html'):
+                for colalign in alignments:
+                    want = expected(df, tablefmt, colalign)
+                    with mock.patch('tabulate.tabulate',
+                                    wraps=tabulate.tabulate) as tab:
+                        got = TableRenderer.render_table(
+                            df, header, tablefmt, colalign, ',.0f')
+                    msg = 'table {0}, {1}, {2}'.format(i, tablefmt, colalign)
+                    self.assertEqual(got, want, msg)
+                    if fast and colalign is not None:
+                        self.assertFalse(tab.called, msg)
+
+    def test_fast_path(self):
+        """Tables with only numbers and strings skip tabulate"""
+        self.check(fast_tables, fast=True)
+
+    def test_fallback(self):
+        """Other tables are rendered by tabulate"""
+        self.check(slow_tables, fast=False)
+
+    def test_other_formats(self):
+        """Formats without a fast path go to tabulate"""
+        df = fast_tables[0]
+        self.assertEqual(
+            TableRenderer.render_table(df, header, 'pipe', None, ',.0f'),
+            expected(df, 'pipe', None))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,147 @@
+"""Unit tests for TextUtils"""
+
+import email
+import email.policy
+import gzip
+import io
+import unittest
+import zipfile
+from unittest import mock
+
+import gracc_reporting.TextUtils as TextUtils
+
+to_list = (['Test Recipient', ], ['nobody1@example.com', ])
+from_email = ('GRACC Operations', 'nobody@example.com')
+content = {'text': 'report', 'html': '<table></table>', 'csv': 'a,b\n'}
+
+
+class TestSharedSMTPSessions(unittest.TestCase):
+    """Tests for TextUtils.shared_smtp_sessions"""
+    def send(self):
+        TextUtils.sendEmail(to_list, 'subject', content, from_email,
+                            'smtp.example.com', 465, 'user', 'password')
+
+    @mock.patch('smtplib.SMTP_SSL')
+    def test_no_sharing(self, smtp):
+        """Connect, log in, and quit for every email by default"""
+        self.send()
+        self.send()
+        self.assertEqual(smtp.call_count, 2)
+        self.assertEqual(smtp.return_value.quit.call_count, 2)
+
+    @mock.patch('smtplib.SMTP_SSL')
+    def test_sharing(self, smtp):
+        """Reuse one session inside shared_smtp_sessions, and quit on exit"""
+        with TextUtils.shared_smtp_sessions():
+            self.send()
+            self.send()
+            self.assertEqual(smtp.return_value.quit.call_count, 0)
+        self.assertEqual(smtp.call_count, 1)
+        self.assertEqual(smtp.return_value.login.call_count, 1)
+        self.assertEqual(smtp.return_value.sendmail.call_count, 2)
+        self.assertEqual(smtp.return_value.quit.call_count, 1)
+
+
+class TestPrintAsTextTables(unittest.TestCase):
+    """Tests for TextUtils.printAsTextTables"""
+    header = ['Site', 'VO', 'CoreHours']
+    table = {'Site': ['A', 'B', 'Total'], 'VO': ['x', 'y', ''],
+             'CoreHours': [1234.5, 20.0, 1254.5]}
+
+    def test_matches_printAsTextTable(self):
+        """Every format matches what printAsTextTable gives separately"""
+        t = TextUtils.TextUtils(self.header)
+        rendered = t.printAsTextTables(['text', 'csv', 'html'], self.table)
+        for format_type in ('text', 'csv', 'html'):
+            self.assertEqual(rendered[format_type],
+                             t.printAsTextTable(format_type, self.table))
+        self.assertIn('1,234', rendered['text'])
+
+    def test_converts_once(self):
+        """The content is converted to a DataFrame once for all formats"""
+        t = TextUtils.TextUtils(self.header)
+        with mock.patch.object(t, 'toDataFrame',
+                               wraps=t.toDataFrame) as to_df:
+            t.printAsTextTables(['text', 'csv', 'html'], self.table)
+        self.assertEqual(to_df.call_count, 1)
+
+
+class TestAttachments(unittest.TestCase):
+    """Tests for attachment size handling in sendEmail"""
+    big = {'text': 'x' * 2000, 'html': '<table>' + 'y' * 5000 + '</table>',
+           'csv': 'a,b\n' + '1,2\n' * 2000}
+
+    def parts(self, msg):
+        return {part.get_filename(): part for part in msg.iter_attachments()}
+
+    def test_small(self):
+        """Nothing changes for small reports"""
+        msg = TextUtils.buildEmail(to_list, 'subject', content, from_email)
+        names = sorted(self.parts(msg))
+        self.assertTrue(names[0].endswith('.csv'))
+        self.assertTrue(names[1].endswith('.html'))
+        self.assertIsNotNone(msg.get_body(preferencelist=('html', )))
+
+    def test_gzip(self):
+        """Big attachments are gzipped"""
+        msg = TextUtils.buildEmail(to_list, 'subject', self.big, from_email,
+                                   compressThreshold=1000)
+        parts = self.parts(msg)
+        csv_name = [name for name in parts if '.csv' in name][0]
+        self.assertTrue(csv_name.endswith('.csv.gz'))
+        self.assertEqual(
+            gzip.decompress(parts[csv_name].get_content()).decode(),
+            self.big['csv'])
+
+    def test_zip(self):
+        """Big attachments can be zipped instead"""
+        msg = TextUtils.buildEmail(to_list, 'subject', self.big, from_email,
+                                   compressThreshold=1000, compression='zip')
+        parts = self.parts(msg)
+        csv_name = [name for name in parts if '.csv' in name][0]
+        self.assertTrue(csv_name.endswith('.csv.zip'))
+        with zipfile.ZipFile(io.BytesIO(parts[csv_name].get_content())) as z:
+            self.assertEqual(z.read(csv_name[:-4]).decode(), self.big['csv'])
+
+    def test_off_by_default(self):
+        """Big reports are sent as before unless size handling is asked for"""
+        msg = TextUtils.buildEmail(to_list, 'subject', self.big, from_email)
+        self.assertTrue(all(not name.endswith('.gz') for name in self.parts(msg)))
+        self.assertIsNotNone(msg.get_body(preferencelist=('html', )))
+
+    def test_inline_limit_bytes(self):
+        """The inline limit is in encoded bytes, not characters"""
+        text = {'text': '\u00e9' * 600, 'html': ''}
+        msg = TextUtils.buildEmail(to_list, 'subject', text, from_email,
+                                   inlineLimit=1000)
+        self.assertIsNone(msg.get_body(preferencelist=('html', )))
+
+    def test_inline_limit(self):
+        """Big text bodies are only included once"""
+        msg = TextUtils.buildEmail(to_list, 'subject', self.big, from_email,
+                                   inlineLimit=1000)
+        self.assertIsNone(msg.get_body(preferencelist=('html', )))
+        self.assertEqual(msg.get_body(preferencelist=('plain', )).get_content(),
+                         self.big['text'] + '\n')
+
+    @mock.patch('smtplib.SMTP_SSL')
+    def test_max_message_size(self, smtp):
+        """A summary is sent instead of a message that's too big"""
+        content = {'text': '\n'.join(str(i) for i in range(1000)),
+                   'html': 'z' * 100000, 'csv': 'a\n'}
+        with self.assertLogs('gracc_reporting.TextUtils', 'WARNING'):
+            TextUtils.sendEmail(to_list, 'subject', content, from_email,
+                                'smtp.example.com', 465, 'user', 'password',
+                                maxMessageSize=50000)
+        sent = email.message_from_string(
+            smtp.return_value.sendmail.call_args[0][2],
+            policy=email.policy.default)
+        self.assertEqual(list(sent.iter_attachments()), [])
+        body = sent.get_content()
+        self.assertIn('only a summary was sent', body)
+        self.assertIn('\n49\n', body)
+        self.assertNotIn('\n50\n', body)
+
+
+if __name__ == '__main__':
+    unittest.main()
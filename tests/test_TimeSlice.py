@@ -0,0 +1,150 @@
+"""Unit tests for TimeSlice"""
+
+import threading
+import unittest
+from datetime import datetime
+
+from dateutil import tz
+
+from gracc_reporting import TimeSlice, TimeUtils
+
+body = {
+    'query': {'bool': {'filter': [
+        {'range': {'EndTime': {'gte': '2024-01-01T00:00:00+00:00',
+                               'lt': '2024-03-01T00:00:00+00:00'}}},
+        {'term': {'ResourceType': 'Payload'}}]}},
+    'size': 0,
+    'aggs': {'OIM_Site': {'terms': {'field': 'OIM_Site'},
+                          'aggs': {'CoreHours': {'sum': {'field': 'CoreHours'}}}}}
+}
+
+jan = datetime(2024, 1, 1, tzinfo=tz.tzutc())
+feb = datetime(2024, 2, 1, tzinfo=tz.tzutc())
+mar = datetime(2024, 3, 1, tzinfo=tz.tzutc())
+
+
+class FakeClient(object):
+    """Stand-in for opensearchpy.OpenSearch that answers each month with
+    one bucket per site"""
+    def __init__(self):
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def search(self, index, body, **kwargs):
+        with self.lock:
+            self.calls.append((index, body))
+        gte = body['query']['bool']['filter'][0]['range']['EndTime']['gte']
+        hours = 1.0 if gte.startswith('2024-01') else 2.0
+        return {'took': 5, 'timed_out': False,
+                '_shards': {'total': 2, 'successful': 2, 'failed': 0},
+                'hits': {'total': {'value': 3, 'relation': 'eq'}, 'hits': []},
+                'aggregations': {'OIM_Site': {'buckets': [
+                    {'key': 'A', 'doc_count': 3,
+                     'CoreHours': {'value': hours}}]}}}
+
+
+class TestRetimeBody(unittest.TestCase):
+    """Tests for TimeSlice.retime_body"""
+    def test_retime_iso(self):
+        """Replace the range on EndTime with the window"""
+        new = TimeSlice.retime_body(body, jan, feb)
+        self.assertDictEqual(new['query']['bool']['filter'][0],
+                             {'range': {'EndTime': {'gte': jan.isoformat(),
+                                                    'lt': feb.isoformat()}}})
+        self.assertEqual(
+            body['query']['bool']['filter'][0]['range']['EndTime']['lt'],
+            '2024-03-01T00:00:00+00:00')
+
+    def test_retime_epoch_ms(self):
+        """Keep epoch millisecond bounds as epoch milliseconds"""
+        epoch_body = {'query': {'range': {'EndTime': {
+            'gte': 1704067200000, 'lt': 1709251200000,
+            'format': 'epoch_millis'}}}}
+        new = TimeSlice.retime_body(epoch_body, feb, mar)
+        self.assertDictEqual(new['query']['range']['EndTime'],
+                             {'gte': 1706745600000, 'lt': 1709251200000,
+                              'format': 'epoch_millis'})
+
+    def test_retime_epoch_second(self):
+        """Write epoch_second bounds in seconds"""
+        epoch_body = {'query': {'range': {'EndTime': {
+            'gte': 1704067200, 'lt': 1709251200, 'format': 'epoch_second'}}}}
+        new = TimeSlice.retime_body(epoch_body, jan, feb)
+        self.assertDictEqual(new['query']['range']['EndTime'],
+                             {'gte': 1704067200, 'lt': 1706745600,
+                              'format': 'epoch_second'})
+
+    def test_retime_custom_format(self):
+        """ISO bounds aren't sent with a range's own date format"""
+        custom_body = {'query': {'range': {'EndTime': {
+            'gte': '2024/01/01', 'lt': '2024/03/01', 'format': 'yyyy/MM/dd'}}}}
+        new = TimeSlice.retime_body(custom_body, feb, feb.replace(day=15))
+        self.assertDictEqual(new['query']['range']['EndTime'],
+                             {'gte': feb.isoformat(),
+                              'lt': feb.replace(day=15).isoformat()})
+        # Mixed with an original bound, the format takes both
+        new = TimeSlice.retime_body(custom_body, feb, mar)
+        self.assertDictEqual(new['query']['range']['EndTime'],
+                             {'gte': feb.isoformat(), 'lt': '2024/03/01',
+                              'format': 'yyyy/MM/dd||strict_date_optional_time'})
+
+    def test_keep_inclusive_bounds(self):
+        """The windows at the ends of the range keep its original bounds"""
+        lte_body = {'query': {'range': {'EndTime': {
+            'gt': '2024-01-01T00:00:00+00:00',
+            'lte': '2024-03-01T00:00:00+00:00'}}}}
+        first = TimeSlice.retime_body(lte_body, jan, feb)
+        self.assertDictEqual(first['query']['range']['EndTime'],
+                             {'gt': '2024-01-01T00:00:00+00:00',
+                              'lt': feb.isoformat()})
+        last = TimeSlice.retime_body(lte_body, feb, mar)
+        self.assertDictEqual(last['query']['range']['EndTime'],
+                             {'gte': feb.isoformat(),
+                              'lte': '2024-03-01T00:00:00+00:00'})
+
+    def test_no_range(self):
+        """Raise ValueError if there's no range on the time field"""
+        self.assertRaises(ValueError, TimeSlice.retime_body, body, jan, feb,
+                          'StartTime')
+
+
+class TestRangeEnd(unittest.TestCase):
+    """Tests for TimeSlice.range_end"""
+    def test_range_end(self):
+        """Parse the end of the range on EndTime"""
+        self.assertEqual(TimeSlice.range_end(body), mar)
+        epoch_body = {'query': {'range': {'EndTime': {
+            'gte': 1704067200, 'lte': 1709251200, 'format': 'epoch_second'}}}}
+        self.assertEqual(TimeSlice.range_end(epoch_body), mar)
+
+    def test_no_end(self):
+        """Open-ended and date math ranges have no known end"""
+        for end in ({'gte': 'now-1d'}, {'gte': 'now-1d', 'lt': 'now'}):
+            self.assertIsNone(TimeSlice.range_end(
+                {'query': {'range': {'EndTime': end}}}))
+        self.assertIsNone(TimeSlice.range_end({'query': {'match_all': {}}}))
+
+
+class TestRunSliced(unittest.TestCase):
+    """Tests for TimeSlice.run_sliced"""
+    def test_run_sliced(self):
+        """Query each month's index and merge the aggregations"""
+        client = FakeClient()
+        windows = TimeUtils.split_time_range(jan, mar, 'month')
+        result = TimeSlice.run_sliced(
+            client, body, windows,
+            lambda start, end: start.strftime('gracc.osg.raw-%Y.%m'),
+            max_workers=2)
+
+        self.assertListEqual(sorted(c[0] for c in client.calls),
+                             ['gracc.osg.raw-2024.01', 'gracc.osg.raw-2024.02'])
+        self.assertListEqual(result['aggregations']['OIM_Site']['buckets'],
+                             [{'key': 'A', 'doc_count': 6,
+                               'CoreHours': {'value': 3.0}}])
+        self.assertEqual(result['hits']['total']['value'], 6)
+        self.assertDictEqual(result['_shards'],
+                             {'total': 4, 'successful': 4, 'failed': 0})
+
+
+if __name__ == '__main__':
+    unittest.main()
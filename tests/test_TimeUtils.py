@@ -1,8 +1,10 @@
 """Unit tests for TimeUtils"""
 
 import unittest
-from datetime import datetime, date
+from datetime import datetime, date, timedelta
 
+import numpy as np
+import pandas as pd
 from dateutil import tz
 
 import gracc_reporting.TimeUtils as TimeUtils
@@ -91,6 +93,54 @@ class TestEpochToDatetime(unittest.TestCase):
                           TimeUtils.epoch_to_datetime, self.epoch_time,
                           'hours')
 
+class TestEpochToDatetimeArray(unittest.TestCase):
+    """Test TimeUtils.epoch_to_datetime_array"""
+    epochs = [1522253329, 1522253329.4, 1522253329.5, 1522253330.5, 0]
+
+    def test_matches_scalar(self):
+        """Same datetimes as epoch_to_datetime, element by element"""
+        for unit, factor in (('second', 1), ('millisecond', 1000)):
+            values = [e * factor for e in self.epochs]
+            result = TimeUtils.epoch_to_datetime_array(values, unit)
+            self.assertListEqual(
+                [t.to_pydatetime() for t in result],
+                [TimeUtils.epoch_to_datetime(v, unit) for v in values])
+
+    def test_missing_values(self):
+        """None and NaN become NaT, numeric strings are parsed"""
+        result = TimeUtils.epoch_to_datetime_array(
+            [None, float('nan'), '1522253329'])
+        self.assertTrue(pd.isna(result[0]) and pd.isna(result[1]))
+        self.assertEqual(result[2].to_pydatetime(),
+                         TimeUtils.epoch_to_datetime(1522253329))
+
+    def test_series(self):
+        """A Series keeps its index and name"""
+        values = pd.Series(np.array([1522253329000, 0]), index=['a', 'b'],
+                           name='EndTime')
+        result = TimeUtils.epoch_to_datetime_array(values, 'millisecond')
+        self.assertListEqual(list(result.index), ['a', 'b'])
+        self.assertEqual(result.name, 'EndTime')
+        self.assertEqual(str(result.dt.tz), 'UTC')
+
+    def test_unit_fail(self):
+        """Raise InvalidUnitError if invalid unit is passed in"""
+        self.assertRaises(TimeUtils.InvalidUnitError,
+                          TimeUtils.epoch_to_datetime_array, self.epochs,
+                          'hours')
+
+
+class TestParseCache(unittest.TestCase):
+    """Test that parse_datetime only parses each string once"""
+    def test_cached(self):
+        """Parsing the same string again is a cache hit"""
+        TimeUtils._parse_string.cache_clear()
+        first = TimeUtils.parse_datetime("2018-03-27 16:00:00", utc=True)
+        second = TimeUtils.parse_datetime("2018-03-27 16:00:00", utc=True)
+        self.assertEqual(first, second)
+        self.assertEqual(TimeUtils._parse_string.cache_info().hits, 1)
+
+
 class TestGetEpochTimeRangeUtcms(unittest.TestCase):
     """Test TimeUtils.get_epoch_time_range_utc_ms"""
     start = datetime(2018, 3, 27, 16, 8, 49)
@@ -115,5 +165,39 @@ class TestGetEpochTimeRangeUtcms(unittest.TestCase):
         self.assertTupleEqual(TimeUtils.get_epoch_time_range_utc_ms(self.start, self.end), answer)
 
 
+class TestSplitTimeRange(unittest.TestCase):
+    """Test TimeUtils.split_time_range"""
+    start = datetime(2023, 12, 15, tzinfo=tz.tzutc())
+    end = datetime(2024, 2, 10, tzinfo=tz.tzutc())
+
+    def test_month_windows(self):
+        """Split on UTC month boundaries, with partial first and last
+        windows"""
+        answer = [(self.start, datetime(2024, 1, 1, tzinfo=tz.tzutc())),
+                  (datetime(2024, 1, 1, tzinfo=tz.tzutc()),
+                   datetime(2024, 2, 1, tzinfo=tz.tzutc())),
+                  (datetime(2024, 2, 1, tzinfo=tz.tzutc()), self.end)]
+        self.assertListEqual(
+            TimeUtils.split_time_range(self.start, self.end, 'month'), answer)
+
+    def test_timedelta_windows(self):
+        """Split into fixed-length windows"""
+        windows = TimeUtils.split_time_range(self.start, self.end,
+                                             timedelta(days=7))
+        self.assertEqual(len(windows), 9)
+        self.assertEqual(windows[-1][1], self.end)
+
+    def test_empty_range(self):
+        """Return no windows if start == end"""
+        self.assertListEqual(
+            TimeUtils.split_time_range(self.start, self.start), [])
+
+    def test_bad_window(self):
+        """Raise InvalidUnitError for an unknown window"""
+        self.assertRaises(TimeUtils.InvalidUnitError,
+                          TimeUtils.split_time_range, self.start, self.end,
+                          'fortnight')
+
+
 if __name__ == '__main__':
     unittest.main()
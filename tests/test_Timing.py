@@ -0,0 +1,176 @@
+"""Unit tests for Timing"""
+
+import json
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+from gracc_reporting import Timing
+from gracc_reporting.Aggregations import count_buckets
+from gracc_reporting.ClientFactory import TimedJSONSerializer
+
+
+class TestTimings(unittest.TestCase):
+    """Tests for Timing.Timings and the module-level helpers"""
+    def setUp(self):
+        self.timings = Timing.Timings({'report': 'test', 'vo': 'osg'})
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_span(self):
+        """A span records its name, time and attributes"""
+        with self.timings.span('query', rows=3) as record:
+            record['bytes_in'] = 100
+        self.assertEqual(len(self.timings.spans), 1)
+        record = self.timings.spans[0]
+        self.assertEqual(record['name'], 'query')
+        self.assertIsNone(record['parent'])
+        self.assertEqual(record['rows'], 3)
+        self.assertEqual(record['bytes_in'], 100)
+        self.assertGreaterEqual(record['seconds'], 0)
+
+    def test_span_recorded_on_error(self):
+        """A span is recorded even if its block raises"""
+        with self.assertRaises(ValueError):
+            with self.timings.span('query'):
+                raise ValueError()
+        self.assertEqual(self.timings.spans[0]['name'], 'query')
+
+    def test_nesting_and_annotate(self):
+        """Nested spans know their parent, and annotate sets the innermost"""
+        with self.timings.active():
+            with Timing.span('outer'):
+                with Timing.span('inner'):
+                    Timing.annotate(buckets=5)
+                Timing.annotate(rows=2)
+        inner, outer = self.timings.spans
+        self.assertEqual(inner['parent'], 'outer')
+        self.assertEqual(inner['buckets'], 5)
+        self.assertEqual(outer['rows'], 2)
+        self.assertNotIn('rows', inner)
+
+    def test_iterate(self):
+        """iterate times getting the items, not the code between them"""
+        def items():
+            for i in range(3):
+                with Timing.span('fetch'):
+                    time.sleep(0.02)
+                yield i
+
+        with self.timings.span('report'):
+            for _ in self.timings.iterate('query', items(), count='buckets'):
+                Timing.annotate(rows=1)
+                time.sleep(0.05)
+        names = [record['name'] for record in self.timings.spans]
+        self.assertEqual(names, ['fetch', 'fetch', 'fetch', 'query', 'report'])
+        query, report = self.timings.spans[3:]
+        self.assertEqual(self.timings.spans[0]['parent'], 'query')
+        self.assertEqual(query['parent'], 'report')
+        self.assertEqual(query['buckets'], 3)
+        self.assertGreaterEqual(query['seconds'], 0.06)
+        self.assertLess(query['seconds'], 0.15)
+        self.assertNotIn('rows', query)
+        self.assertEqual(report['rows'], 1)
+
+    def test_module_span_without_active(self):
+        """Timing.span records nothing without an active Timings"""
+        with Timing.span('nothing', rows=1) as record:
+            Timing.annotate(rows=2)
+        self.assertEqual(record, {'rows': 1})
+        self.assertEqual(self.timings.spans, [])
+
+    def test_totals(self):
+        """totals sums the count and attributes of each phase"""
+        for rows in (1, 2, 3):
+            with self.timings.span('render', rows=rows):
+                pass
+        totals = self.timings.totals()
+        self.assertEqual(totals['render']['count'], 3)
+        self.assertEqual(totals['render']['rows'], 6)
+
+    def test_write_json_lines(self):
+        """Each span is appended once, with the labels"""
+        path = os.path.join(self.dir, 'timings.jsonl')
+        with self.timings.span('a'):
+            pass
+        self.timings.write_json_lines(path)
+        with self.timings.span('b'):
+            pass
+        self.timings.write_json_lines(path)
+        with open(path) as f:
+            lines = [json.loads(line) for line in f]
+        self.assertEqual([line['name'] for line in lines], ['a', 'b'])
+        self.assertEqual(lines[0]['report'], 'test')
+        self.assertEqual(lines[0]['vo'], 'osg')
+
+    def test_prometheus(self):
+        """Per-phase totals are written in the Prometheus text format"""
+        with self.timings.span('query', buckets=4, server_seconds=0.5):
+            pass
+        text = self.timings.prometheus_text()
+        self.assertIn('# TYPE gracc_report_phase_seconds gauge', text)
+        self.assertIn('gracc_report_phase_count{report="test",vo="osg",'
+                      'phase="query"} 1.0', text)
+        self.assertIn('gracc_report_phase_buckets{report="test",vo="osg",'
+                      'phase="query"} 4.0', text)
+        self.assertNotIn('phase_rows', text)
+
+        path = os.path.join(self.dir, 'test.prom')
+        self.timings.write_prometheus(path)
+        with open(path) as f:
+            self.assertIn('gracc_report_last_run_timestamp_seconds', f.read())
+        self.assertEqual(os.listdir(self.dir), ['test.prom'])
+
+    def test_timed(self):
+        """timed records a span per call and exports once afterwards"""
+        class Report(object):
+            exported = 0
+
+            def __init__(self):
+                self.timings = Timing.Timings()
+
+            @Timing.timed('run', export=True)
+            def run(self):
+                with Timing.span('step'):
+                    pass
+
+            def export_timings(self):
+                self.exported += 1
+
+        report = Report()
+        report.run()
+        self.assertEqual([s['name'] for s in report.timings.spans],
+                         ['step', 'run'])
+        self.assertEqual(report.exported, 1)
+
+    def test_serializer(self):
+        """TimedJSONSerializer records serialize and deserialize spans"""
+        serializer = TimedJSONSerializer()
+        with self.timings.active():
+            body = serializer.dumps({'a': 1})
+            self.assertEqual(serializer.loads(body), {'a': 1})
+        dumps, loads = self.timings.spans
+        self.assertEqual(dumps['name'], 'serialize')
+        self.assertEqual(dumps['bytes_out'], len(body))
+        self.assertEqual(loads['name'], 'deserialize')
+        self.assertEqual(loads['bytes_in'], len(body))
+
+
+class TestCountBuckets(unittest.TestCase):
+    """Tests for Aggregations.count_buckets"""
+    def test_count_buckets(self):
+        """Buckets are counted at every level, keyed or not"""
+        aggs = {'vo': {'buckets': [
+                    {'key': 'a', 'site': {'buckets': [{'key': 1}, {'key': 2}]}},
+                    {'key': 'b', 'site': {'buckets': []}}]},
+                'keyed': {'buckets': {'x': {'doc_count': 1}}},
+                'total': {'value': 10}}
+        self.assertEqual(count_buckets(aggs), 5)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,82 @@
+"""Unit tests for the benchmark suite's data generators and regression
+check"""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from benchmarks import bench_startup, datagen, suite
+
+
+class TestDatagen(unittest.TestCase):
+    """Tests for the synthetic data generators"""
+    def test_report_content(self):
+        """Report content has every column, and is reproducible"""
+        content = datagen.report_content(10)
+        self.assertEqual(list(content), datagen.REPORT_HEADER)
+        self.assertTrue(all(len(column) == 10 for column in content.values()))
+        self.assertEqual(content, datagen.report_content(10))
+
+    def test_generators(self):
+        """The generators give n values of the right shape"""
+        self.assertEqual(len(datagen.core_hours(5)), 5)
+        self.assertEqual(len(datagen.timestamps(5)), 5)
+        self.assertTrue(all(e % 1000 == 0 for e in datagen.epochs(5)))
+        self.assertTrue(all(start < end
+                            for start, end in datagen.time_ranges(5)))
+
+
+class TestSuite(unittest.TestCase):
+    """Tests for running cases and checking them against baselines"""
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, 'baselines.json')
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_cases_run(self):
+        """Every case runs at the smallest size"""
+        results = suite.run_cases(suite.CASES, ['1k'], 1.)
+        self.assertEqual(len(results), len(suite.CASES))
+
+    def test_save_and_load(self):
+        """Saved baselines are merged with the existing ones"""
+        suite.save_baselines({'a@1k': {'seconds': 1., 'relative': 0.5}},
+                             self.path)
+        suite.save_baselines({'b@1k': {'seconds': 1., 'relative': 2.}},
+                             self.path)
+        self.assertEqual(suite.load_baselines(self.path),
+                         {'a@1k': 0.5, 'b@1k': 2.})
+
+    def test_find_regressions(self):
+        """Only cases over the threshold, and not too small to time, regress"""
+        baselines = {'fast@1k': 0.1, 'slow@1k': 0.1, 'tiny@1k': 0.0001}
+        results = {'fast@1k': {'seconds': 0.15, 'relative': 0.15},
+                   'slow@1k': {'seconds': 0.25, 'relative': 0.25},
+                   'tiny@1k': {'seconds': 0.001, 'relative': 0.001},
+                   'new@1k': {'seconds': 1., 'relative': 1.}}
+        regressions = suite.find_regressions(results, baselines, 2.)
+        self.assertEqual([key for key, _ in regressions], ['slow@1k'])
+        self.assertAlmostEqual(regressions[0][1], 2.5)
+
+
+class TestStartup(unittest.TestCase):
+    """Tests for the startup budget check"""
+    def test_no_heavy_imports(self):
+        """Importing ReportUtils and constructing a Reporter doesn't import
+        pandas, opensearchpy, etc."""
+        tmpdir = tempfile.mkdtemp()
+        try:
+            config_file = os.path.join(tmpdir, 'startupbench.toml')
+            with open(config_file, 'w') as f:
+                f.write(bench_startup.CONFIG)
+            _, _, imported = bench_startup.bench_startup(config_file, 1)
+        finally:
+            shutil.rmtree(tmpdir)
+        self.assertEqual(imported, [])
+
+
+if __name__ == '__main__':
+    unittest.main()